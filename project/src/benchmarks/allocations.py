@@ -0,0 +1,117 @@
+"""
+Measure the memory allocated per message hop of a flooding solve, with and without
+copying messages between agents of the same container.
+
+Every delivered message is kept alive until the end of the solve, so the copies the
+container makes per hop are counted even though the agents drop them right away.
+
+Run from the `src` directory:
+
+    python -m benchmarks.allocations --runs 5
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import tracemalloc
+from typing import Any
+
+import mango
+from pandapower import runpp
+
+import solver
+from core import create_test_network, reset_switch_count, to_components
+from solver.agents import Agent
+from solver.container import cancel_handlers, create_container
+from solver.measurements import ConnectivitySnapshot
+from solver.topology import cached_topology
+
+MODES = {"copied": True, "shared": False}
+"Whether the container copies messages between its agents, by mode."
+
+Delivery = tuple[int, Any, dict[str, Any]]
+"Priority, content and meta of a message put into the inbox of an agent."
+
+
+class KeepingInbox(asyncio.Queue[Delivery]):
+    """
+    Inbox of an agent keeping the content of every message delivered to it alive.
+    """
+    delivered: list[Any]
+
+    def __init__(self, delivered: list[Any]):
+        super().__init__()
+        self.delivered = delivered
+
+    def put_nowait(self, item: Delivery):
+        _, content, _ = item
+        self.delivered.append(content)
+        super().put_nowait(item)
+
+
+async def flood(agents: dict[str, Agent], copy: bool) -> tuple[int, int]:
+    """
+    Run the agents in a local container until every agent resolved.
+
+    :param copy: whether the container copies messages between its agents
+    :return: number of delivered messages and bytes allocated while running
+    """
+    container = create_container(
+        "local", solver.ADDRESS, copy_internal_messages=copy
+    )
+    delivered: list[Any] = []
+    for aid, agent in agents.items():
+        container.register(agent, aid)
+        # the container puts the copies it makes into the inbox
+        agent.inbox = KeepingInbox(delivered)
+
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    async with mango.activate(container):
+        await asyncio.gather(*(agent.resolved.wait() for agent in agents.values()))
+        await cancel_handlers(agents.values())
+        allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(delivered), allocated - start
+
+
+def measure(copy: bool, seed: int) -> tuple[int, int]:
+    """
+    Solve the test network with the line failure selected by `seed` by flooding.
+
+    :return: number of delivered messages and bytes allocated while running the agents
+    """
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        net = create_test_network()
+        runpp(net)
+        switches, _ = to_components(net)
+        bus_measurements = ConnectivitySnapshot(net).measurements()
+        agents = solver.create_agents(cached_topology(net), bus_measurements, switches)
+        result = asyncio.run(flood(agents, copy))
+    reset_switch_count()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="line failures per mode")
+    args = parser.parse_args()
+
+    totals = {mode: [0, 0] for mode in MODES}
+    for seed in range(args.runs):
+        for mode, copy in MODES.items():
+            messages, allocated = measure(copy, seed)
+            totals[mode][0] += messages
+            totals[mode][1] += allocated
+
+    print(f"{'mode':>6}  {'messages':>8}  {'allocated':>10}  {'per hop':>9}")
+    for mode, (messages, allocated) in totals.items():
+        per_hop = allocated / messages
+        print(f"{mode:>6}  {messages:>8}  {allocated / 1024:7.0f}KiB  {per_hop:7.0f}B")
+
+
+if __name__ == "__main__":
+    main()
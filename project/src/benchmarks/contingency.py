@@ -0,0 +1,254 @@
+"""
+Solve every single line failure of the test grid and the additional grids.
+
+Run from the `src` directory:
+
+    python -m benchmarks.contingency --output contingency.csv --baseline baseline.csv
+
+The test grid is solved with the random line failure undone and the reserve switches
+open.
+Reserve lines behind an open switch are no cases, as their failure disconnects nothing.
+"""
+
+import argparse
+import contextlib
+import dataclasses
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import pandas as pd
+from pandapower import pandapowerNet, runpp
+
+import solver
+from core import create_test_network, evaluate, reset_switch_count, to_components
+from solver.container import Transport
+from solver.trace_analysis import load_trace
+from template import create_additional_networks
+
+TEST_GRID = "test"
+"Name of the grid of `core.create_test_network`."
+
+BASE_PORT = 6000
+"Port of the container of the first case, every case gets its own port."
+
+KEYS = ["grid", "line"]
+
+
+@dataclass(frozen=True, slots=True)
+class Case:
+    grid: str
+    line: int
+    "Index of the failed line in `net.line`."
+    port: int
+
+
+@dataclass(frozen=True, slots=True)
+class CaseResult:
+    grid: str
+    line: int
+    switches: int
+    "Number of switching actions."
+    connected: bool
+    "Whether all busses were connected again."
+    messages: int
+    bytes: int
+    "Total pickled size of all messages."
+    wall_time: float
+    "Wall time of `solver.solve` in seconds."
+
+
+def create_grid(grid: str) -> pandapowerNet:
+    """
+    Create a grid without any line failure.
+    """
+    if grid == TEST_GRID:
+        with contextlib.redirect_stdout(io.StringIO()):
+            net = create_test_network()
+        # undo the random line failure only, the reserve lines stay switched open
+        (failed,) = net.line.index[~net.line.in_service]
+        net.line.loc[failed, "in_service"] = True
+        return net
+    index = int(grid.removeprefix("additional-"))
+    return create_additional_networks()[index]
+
+
+def grids() -> list[str]:
+    return [TEST_GRID] + [
+        f"additional-{index}" for index in range(len(create_additional_networks()))
+    ]
+
+
+def case_lines(net: pandapowerNet) -> list[int]:
+    """
+    Lines in service whose failure is a case, i.e. all but the reserve lines behind an
+    open switch.
+    """
+    switch = net.switch
+    reserve = set(switch.element[(switch.et == "l") & ~switch.closed.astype(bool)])
+    return [
+        int(index)
+        for index in net.line.index[net.line.in_service]
+        if index not in reserve
+    ]
+
+
+def cases() -> list[Case]:
+    """
+    One case per line of every grid, see `case_lines`.
+    """
+    lines = []
+    for grid in grids():
+        lines += [(grid, line) for line in case_lines(create_grid(grid))]
+    return [
+        Case(grid, line, BASE_PORT + index) for index, (grid, line) in enumerate(lines)
+    ]
+
+
+def run_case(case: Case, transport: Transport, backups: bool) -> CaseResult:
+    """
+    Solve the failure of a single line and collect the trace statistics.
+
+    :param backups: precompute backup routes on the grid before the failure, this is 
+        not part of the wall time
+    """
+    net = create_grid(case.grid)
+    with (
+        contextlib.redirect_stdout(io.StringIO()),
+        tempfile.TemporaryDirectory() as directory,
+    ):
+        backup_routes = None
+        if backups:
+            runpp(net)
+            switches, bus_measurements = to_components(net)
+            backup_routes = solver.precompute_backups(
+                switches,
+                bus_measurements,
+                net,
+                transport=transport,
+                address=("localhost", case.port),
+            )
+        net.line.loc[case.line, "in_service"] = False
+        runpp(net)
+        switches, bus_measurements = to_components(net)
+        trace = os.path.join(directory, "transfers.jsonl")
+        reset_switch_count()
+        start = time.perf_counter()
+        solver.solve(
+            switches,
+            bus_measurements,
+            net,
+            backups=backup_routes,
+            transport=transport,
+            address=("localhost", case.port),
+            draw=False,
+            trace=trace,
+        )
+        wall_time = time.perf_counter() - start
+        switch_count, connected = evaluate(net)
+        records = load_trace([trace])
+    return CaseResult(
+        grid=case.grid,
+        line=case.line,
+        switches=switch_count,
+        connected=bool(connected),
+        messages=len(records),
+        bytes=sum(record.bytes for record in records),
+        wall_time=wall_time,
+    )
+
+
+def run_cases(
+    cases: list[Case], transport: Transport, backups: bool, workers: None | int
+) -> pd.DataFrame:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                run_case,
+                cases,
+                [transport] * len(cases),
+                [backups] * len(cases),
+                chunksize=1,
+            )
+        )
+    return pd.DataFrame([dataclasses.asdict(result) for result in results])
+
+
+def compare(results: pd.DataFrame, baseline: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join the results with the baseline, `_baseline` columns hold the baseline values.
+    """
+    return results.merge(baseline, on=KEYS, how="left", suffixes=("", "_baseline"))
+
+
+def print_summary(results: pd.DataFrame):
+    print(
+        f"{'grid':>14}  {'cases':>5}  {'connected':>9}  {'switches':>8}  "
+        f"{'messages':>8}  {'bytes':>9}  {'median':>9}  {'max':>9}"
+    )
+    for grid, table in results.groupby("grid"):
+        median = table.wall_time.median() * 1000
+        maximum = table.wall_time.max() * 1000
+        print(
+            f"{grid:>14}  {len(table):>5}  {table.connected.sum():>9}  "
+            f"{table.switches.sum():>8}  {table.messages.sum():>8}  "
+            f"{table.bytes.sum():>9}  {median:7.1f}ms  {maximum:7.1f}ms"
+        )
+
+
+def print_comparison(comparison: pd.DataFrame):
+    missing = comparison.connected_baseline.isna()
+    if missing.any():
+        print(f"{missing.sum()} cases are not part of the baseline")
+    comparison = comparison[~missing]
+
+    changed = comparison[
+        (comparison.connected != comparison.connected_baseline.astype(bool))
+        | (comparison.switches != comparison.switches_baseline)
+    ]
+    for row in changed.itertuples():
+        print(
+            f"{row.grid} line {row.line}: "
+            f"connected {bool(row.connected_baseline)} -> {row.connected}, "
+            f"switches {int(row.switches_baseline)} -> {row.switches}"
+        )
+
+    print(f"{'':>9}  {'baseline':>10}  {'current':>10}  {'change':>7}")
+    for column in ["messages", "bytes", "wall_time"]:
+        before = comparison[f"{column}_baseline"].sum()
+        after = comparison[column].sum()
+        change = (after / before - 1) * 100 if before else 0.0
+        print(f"{column:>9}  {before:>10.4g}  {after:>10.4g}  {change:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="contingency.csv", help="CSV results table")
+    parser.add_argument("--baseline", help="CSV results table to compare against")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="processes, defaults to CPU count"
+    )
+    parser.add_argument(
+        "--transport", choices=["local", "tcp"], default="tcp", help="transport"
+    )
+    parser.add_argument(
+        "--backups",
+        action="store_true",
+        help="precompute backup routes before every failure",
+    )
+    args = parser.parse_args()
+
+    results = run_cases(cases(), args.transport, args.backups, args.workers)
+    results.to_csv(args.output, index=False)
+    print_summary(results)
+
+    if args.baseline is not None and os.path.exists(args.baseline):
+        print()
+        print_comparison(compare(results, pd.read_csv(args.baseline)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Synthetic grids for benchmarks.
+"""
+
+import random
+
+import pandapower as pp
+from pandapower import pandapowerNet
+
+LINE_TYPE = "NA2XS2Y 1x95 RM/25 12/20 kV"
+
+
+def radial_size(depth: int, branching: int) -> int:
+    """Number of busses of a radial grid, see `create_radial_network`."""
+    return sum(branching**level for level in range(depth + 1))
+
+
+def create_radial_network(
+    depth: int,
+    branching: int,
+    reserve_lines: None | int = None,
+    seed: int = 0,
+) -> pandapowerNet:
+    """
+    Create a radial medium voltage grid with randomly placed reserve lines.
+
+    The external grid feeds the root bus `0`, every bus up to `depth` levels below
+    the root feeds `branching` busses of the next level, each with a small load.
+    The busses are numbered level by level, so bus `i` feeds the busses
+    `i * branching + 1` to `i * branching + branching` via the lines with the index
+    of the fed bus minus one.
+    Failing line `0` therefore disconnects the whole first subtree of the root.
+
+    Reserve lines connect random pairs of busses from different subtrees of the root
+    and are switched off by an open line switch, like the reserve lines of
+    `core.create_test_network`.
+
+    :param reserve_lines: number of reserve lines, by default one per ten busses
+    :param seed: seed of the placement of the reserve lines
+    """
+    size = radial_size(depth, branching)
+    net = pp.create_empty_network()
+    # create all elements at once, creating them one by one is slow for large grids
+    buses = pp.create_buses(net, size, vn_kv=20.0)
+    pp.create_ext_grid(net, bus=buses[0], vm_pu=1.02, name="Grid Connection")
+    fed = buses[1:]
+    feeding = (fed - 1) // branching
+    pp.create_loads(net, fed, p_mw=0.01, q_mvar=0.002)
+    pp.create_lines(net, feeding, fed, 0.1, LINE_TYPE)
+
+    if branching < 2:
+        # there is only a single subtree
+        return net
+
+    # subtree of the root every bus belongs to
+    subtrees: dict[int, int] = {}
+    for bus, parent in zip(fed, feeding):
+        subtrees[bus] = bus if parent == 0 else subtrees[parent]
+
+    if reserve_lines is None:
+        reserve_lines = size // 10
+    rng = random.Random(seed)
+    from_buses: list[int] = []
+    to_buses: list[int] = []
+    while len(from_buses) < reserve_lines:
+        from_bus, to_bus = rng.sample(range(1, size), 2)
+        if subtrees[from_bus] != subtrees[to_bus]:
+            from_buses.append(from_bus)
+            to_buses.append(to_bus)
+    lines = pp.create_lines(net, from_buses, to_buses, 0.5, LINE_TYPE)
+    pp.create_switches(
+        net, to_buses, lines, "l", closed=False, name="Reserve Line Switch"
+    )
+    return net
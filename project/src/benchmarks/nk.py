@@ -0,0 +1,225 @@
+"""
+Solve k simultaneous random line failures of the test grid.
+
+Every case is solved in each mode: independently, in verified rounds, with a 
+negotiated joint plan and in verified rounds ranking down infeasible options.
+
+Run from the `src` directory:
+
+    python -m benchmarks.nk --failures 3 --cases 20
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import os
+import random
+import tempfile
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from pandapower import pandapowerNet, runpp
+
+import solver
+from benchmarks.contingency import TEST_GRID, case_lines, create_grid
+from core import evaluate, reset_switch_count, to_components
+from solver.container import Transport
+from solver.feasibility import MAX_LOADING, MIN_VM_PU
+from solver.trace_analysis import load_trace
+
+MODES: dict[str, dict[str, Any]] = {
+    "independent": {"verify": False, "negotiate": False},
+    "rounds": {"verify": True, "negotiate": False},
+    "negotiated": {"verify": False, "negotiate": True},
+    "both": {"verify": True, "negotiate": True},
+    "prechecked": {"verify": True, "negotiate": False, "precheck": True},
+}
+"Keyword arguments of `solver.solve` of every mode."
+
+
+@dataclass(frozen=True, slots=True)
+class NkResult:
+    lines: tuple[int, ...]
+    "Indices of the failed lines in `net.line`."
+    mode: str
+    "Key of `MODES`."
+    switches: int
+    "Number of switching actions."
+    connected: bool
+    "Whether all busses were connected again."
+    disconnected: int
+    "Number of busses disconnected by the failures."
+    feasible: bool
+    "Whether closing every switch reconnects all busses."
+    violations: int
+    "Number of branches and busses the switching pushed beyond their limits."
+    messages: int
+    wall_time: float
+    "Wall time of `solver.solve` in seconds."
+
+
+def failures(
+    net: pandapowerNet, k: int, cases: int, seed: int
+) -> list[tuple[int, ...]]:
+    """
+    `k` distinct random lines per case, chosen from the single line failures of
+    `benchmarks.contingency`, see `case_lines`.
+    """
+    lines = case_lines(net)
+    rng = random.Random(seed)
+    return [tuple(sorted(rng.sample(lines, k))) for _ in range(cases)]
+
+
+def fail(grid: pandapowerNet, lines: tuple[int, ...]) -> pandapowerNet:
+    """
+    Copy of the grid with the lines out of service, loading the grid takes seconds.
+    """
+    net = copy.deepcopy(grid)
+    net.line.loc[list(lines), "in_service"] = False
+    return net
+
+
+def violations(net: pandapowerNet) -> set[tuple[str, int]]:
+    """
+    Branches loaded above `MAX_LOADING` and busses below `MIN_VM_PU` in the last power 
+    flow.
+    """
+    overloaded = {
+        (table, int(index))
+        for table in ["line", "trafo"]
+        for index in net[f"res_{table}"].index[
+            net[f"res_{table}"].loading_percent > MAX_LOADING * 100
+        ]
+    }
+    undervoltage = {
+        ("bus", int(index))
+        for index in net.res_bus.index[net.res_bus.vm_pu < MIN_VM_PU]
+    }
+    return overloaded | undervoltage
+
+
+def is_feasible(grid: pandapowerNet, lines: tuple[int, ...]) -> bool:
+    net = fail(grid, lines)
+    net.switch["closed"] = True
+    runpp(net)
+    return not net.res_bus.vm_pu.isna().any()
+
+
+def run_case(
+    grid: pandapowerNet, lines: tuple[int, ...], transport: Transport, mode: str
+) -> NkResult:
+    net = fail(grid, lines)
+    with (
+        contextlib.redirect_stdout(io.StringIO()),
+        tempfile.TemporaryDirectory() as directory,
+    ):
+        runpp(net)
+        disconnected = int(net.res_bus.vm_pu.isna().sum())
+        violated = violations(net)
+        switches, bus_measurements = to_components(net)
+        trace = os.path.join(directory, "transfers.jsonl")
+        reset_switch_count()
+        start = time.perf_counter()
+        solver.solve(
+            switches,
+            bus_measurements,
+            net,
+            transport=transport,
+            draw=False,
+            trace=trace,
+            **MODES[mode],
+        )
+        wall_time = time.perf_counter() - start
+        switch_count, connected = evaluate(net)
+        violated = violations(net) - violated
+        messages = len(load_trace([trace]))
+    return NkResult(
+        lines=lines,
+        mode=mode,
+        switches=switch_count,
+        connected=bool(connected),
+        disconnected=disconnected,
+        feasible=is_feasible(grid, lines),
+        violations=len(violated),
+        messages=messages,
+        wall_time=wall_time,
+    )
+
+
+def print_summary(results: list[NkResult]):
+    print(
+        f"{'mode':>11}  {'cases':>5}  {'feasible':>8}  {'connected':>9}  "
+        f"{'switches':>8}  {'violations':>10}  {'messages':>8}  {'mean':>9}  "
+        f"{'max':>9}"
+    )
+    for mode in MODES:
+        samples = [result for result in results if result.mode == mode]
+        if not samples:
+            continue
+        wall_times = [result.wall_time * 1000 for result in samples]
+        print(
+            f"{mode:>11}  {len(samples):>5}  "
+            f"{sum(result.feasible for result in samples):>8}  "
+            f"{sum(result.connected for result in samples):>9}  "
+            f"{sum(result.switches for result in samples):>8}  "
+            f"{sum(result.violations for result in samples):>10}  "
+            f"{sum(result.messages for result in samples):>8}  "
+            f"{sum(wall_times) / len(samples):7.1f}ms  {max(wall_times):7.1f}ms"
+        )
+
+
+def compare(results: Iterable[NkResult], mode: str, baseline: str):
+    """
+    Switches saved and messages spent by a mode on the cases both modes reconnected.
+    """
+    by_case = {(result.lines, result.mode): result for result in results}
+    cases = [
+        (by_case[lines, mode], by_case[lines, baseline])
+        for lines, result_mode in by_case
+        if result_mode == mode
+        and (lines, baseline) in by_case
+        and by_case[lines, mode].connected
+        and by_case[lines, baseline].connected
+    ]
+    saved = sum(base.switches - result.switches for result, base in cases)
+    overhead = sum(result.messages - base.messages for result, base in cases)
+    print(
+        f"{mode} vs. {baseline} on {len(cases)} cases both reconnected: "
+        f"{saved} switches saved, {overhead} additional messages"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--failures", type=int, default=3, help="failed lines (k)")
+    parser.add_argument("--cases", type=int, default=20, help="random cases")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the failures")
+    parser.add_argument(
+        "--transport", choices=["local", "tcp"], default="local", help="transport"
+    )
+    args = parser.parse_args()
+
+    grid = create_grid(TEST_GRID)
+    # the first power flow compiles pandapower's numba functions
+    runpp(copy.deepcopy(grid))
+    results = []
+    for lines in failures(grid, args.failures, args.cases, args.seed):
+        for mode in MODES:
+            result = run_case(grid, lines, args.transport, mode)
+            results.append(result)
+            if result.feasible and not result.connected:
+                print(
+                    f"lines {result.lines} ({mode}): "
+                    f"{result.disconnected} busses disconnected, not all reconnected"
+                )
+    print_summary(results)
+    compare(results, "negotiated", "independent")
+    compare(results, "negotiated", "rounds")
+    compare(results, "prechecked", "rounds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Measure how solving a line failure scales with the grid size on synthetic grids.
+
+Run from the `src` directory:
+
+    python -m benchmarks.scaling --branching 3 --depths 4 5 6 7 8 --plot scaling.png
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from dataclasses import dataclass
+
+from matplotlib.figure import Figure
+from pandapower import runpp
+
+import solver
+from benchmarks.grids import create_radial_network, radial_size
+from core import reset_switch_count, to_components
+from solver.container import Transport
+from solver.trace_analysis import load_trace
+
+FAILED_LINE = 0
+"Line feeding the first subtree of the root, see `create_radial_network`."
+
+
+@dataclass(frozen=True, slots=True)
+class ScalingResult:
+    depth: int
+    buses: int
+    messages: int
+    wall_time: float
+    "Wall time of `solver.solve` in seconds."
+    peak_memory: int
+    "Peak resident set size of the solving process in KiB."
+    solve_memory: int
+    "Growth of the peak resident set size while solving in KiB."
+
+
+def run_size(
+    depth: int, branching: int, transport: Transport, routing: bool, election: bool
+) -> ScalingResult:
+    """
+    Solve the failure of `FAILED_LINE` in a radial grid.
+
+    Meant to run in a fresh process, so the peak memory belongs to this grid alone.
+    """
+    net = create_radial_network(depth, branching)
+    net.line.loc[FAILED_LINE, "in_service"] = False
+    with (
+        contextlib.redirect_stdout(io.StringIO()),
+        tempfile.TemporaryDirectory() as directory,
+    ):
+        runpp(net)
+        switches, bus_measurements = to_components(net)
+        trace = os.path.join(directory, "transfers.jsonl")
+        reset_switch_count()
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        solver.solve(
+            switches,
+            bus_measurements,
+            net,
+            routing=routing,
+            election=election,
+            measurement_snapshot=True,
+            transport=transport,
+            draw=False,
+            trace=trace,
+        )
+        wall_time = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        messages = len(load_trace([trace]))
+    return ScalingResult(
+        depth=depth,
+        buses=len(net.bus),
+        messages=messages,
+        wall_time=wall_time,
+        peak_memory=after,
+        solve_memory=after - before,
+    )
+
+
+def run_sizes(
+    depths: list[int],
+    branching: int,
+    transport: Transport,
+    routing: bool,
+    election: bool,
+    timeout: float,
+) -> list[ScalingResult]:
+    """
+    Solve one grid per depth, each in its own process.
+
+    Stops at the first grid that takes longer than `timeout` seconds, larger grids
+    would only take longer.
+    """
+    results = []
+    for depth in sorted(depths):
+        with multiprocessing.Pool(1) as pool:
+            pending = pool.apply_async(
+                run_size, (depth, branching, transport, routing, election)
+            )
+            try:
+                result = pending.get(timeout)
+            except multiprocessing.TimeoutError:
+                buses = radial_size(depth, branching)
+                print(f"{buses} busses timed out after {timeout:.0f}s, stopping")
+                break
+        results.append(result)
+        print_result(result)
+    return results
+
+
+def print_header():
+    print(
+        f"{'depth':>5}  {'busses':>6}  {'messages':>8}  {'wall time':>10}  "
+        f"{'peak memory':>11}  {'solving':>9}"
+    )
+
+
+def print_result(result: ScalingResult):
+    print(
+        f"{result.depth:>5}  {result.buses:>6}  {result.messages:>8}  "
+        f"{result.wall_time * 1000:8.1f}ms  {result.peak_memory / 1024:9.1f}MB  "
+        f"{result.solve_memory / 1024:7.1f}MB"
+    )
+
+
+def plot(results: list[ScalingResult], path: str):
+    """Plot latency, message count and peak memory against the number of busses."""
+    figure = Figure(figsize=(12, 4), layout="constrained")
+    buses = [result.buses for result in results]
+    metrics = [
+        ("wall time [s]", [result.wall_time for result in results]),
+        ("messages", [result.messages for result in results]),
+        ("peak memory [MB]", [result.peak_memory / 1024 for result in results]),
+    ]
+    for axes, (label, values) in zip(figure.subplots(1, len(metrics)), metrics):
+        axes.loglog(buses, values, marker="o")
+        axes.set_xlabel("busses")
+        axes.set_ylabel(label)
+        axes.grid(True, which="both", alpha=0.3)
+    figure.savefig(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--branching", type=int, default=3, help="busses fed by every bus"
+    )
+    parser.add_argument(
+        "--depths",
+        type=int,
+        nargs="+",
+        default=[4, 5, 6, 7, 8],
+        help="levels below the root, 4 to 8 span about 100 to 10k busses",
+    )
+    parser.add_argument(
+        "--transport", choices=["local", "tcp"], default="local", help="transport"
+    )
+    parser.add_argument("--routing", action="store_true", help="distance-vector routing")
+    parser.add_argument("--election", action="store_true", help="island leader election")
+    parser.add_argument(
+        "--timeout", type=float, default=600, help="seconds per grid before stopping"
+    )
+    parser.add_argument("--plot", default="scaling.png", help="plot of the results")
+    args = parser.parse_args()
+
+    print_header()
+    results = run_sizes(
+        args.depths,
+        args.branching,
+        args.transport,
+        args.routing,
+        args.election,
+        args.timeout,
+    )
+    if results:
+        plot(results, args.plot)
+
+
+if __name__ == "__main__":
+    main()
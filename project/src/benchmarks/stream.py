@@ -0,0 +1,117 @@
+"""
+Compare handling a stream of line failures with the agent service and with one solve each.
+
+Run from the `src` directory:
+
+    python -m benchmarks.stream --failures 20
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import statistics
+import time
+
+from pandapower import runpp
+
+import solver
+from benchmarks.contingency import TEST_GRID, create_grid
+from core import to_components
+from solver.container import Transport
+from solver.service import SolverService
+
+
+def failures(count: int, seed: int) -> list[int]:
+    """Random in service lines of the test grid."""
+    line = create_grid(TEST_GRID).line
+    lines = [int(index) for index in line.index[line.in_service]]
+    rng = random.Random(seed)
+    return [rng.choice(lines) for _ in range(count)]
+
+
+def measure_solve(lines: list[int], transport: Transport) -> list[float]:
+    """
+    Solve every failure on a fresh grid.
+
+    :return: wall time of every failure in seconds, including the power flow
+    """
+    timings = []
+    for line in lines:
+        net = create_grid(TEST_GRID)
+        net.line.loc[line, "in_service"] = False
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            runpp(net)
+            switches, bus_measurements = to_components(net)
+            solver.solve(
+                switches,
+                bus_measurements,
+                net,
+                transport=transport,
+                draw=False,
+                trace=None,
+            )
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def measure_service(
+    lines: list[int], transport: Transport
+) -> tuple[float, list[float], list[float]]:
+    """
+    Fail and restore every line in turn with a single service.
+
+    :return: setup time, wall times of the failures and of the restorations in seconds
+    """
+    net = create_grid(TEST_GRID)
+    service = SolverService(net, transport=transport)
+    start = time.perf_counter()
+    await service.start()
+    setup = time.perf_counter() - start
+    failed, restored = [], []
+    for line in lines:
+        start = time.perf_counter()
+        await service.fail_line(line)
+        failed.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        await service.restore_line(line)
+        restored.append(time.perf_counter() - start)
+    await service.shutdown()
+    return setup, failed, restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--failures", type=int, default=20, help="failed lines")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the failures")
+    parser.add_argument(
+        "--transport", choices=["local", "tcp"], default="tcp", help="transport"
+    )
+    args = parser.parse_args()
+
+    lines = failures(args.failures, args.seed)
+    # the first power flow compiles pandapower's numba functions
+    runpp(create_grid(TEST_GRID))
+    with contextlib.redirect_stdout(io.StringIO()):
+        setup, failed, restored = asyncio.run(measure_service(lines, args.transport))
+    solved = measure_solve(lines, args.transport)
+
+    print(f"{'mode':>11}  {'setup':>9}  {'median':>9}  {'mean':>9}  {'total':>9}")
+    for mode, mode_setup, samples in [
+        ("solve", 0.0, solved),
+        ("failure", setup, failed),
+        ("restoration", 0.0, restored),
+    ]:
+        median = statistics.median(samples) * 1000
+        mean = statistics.mean(samples) * 1000
+        total = (mode_setup + sum(samples)) * 1000
+        print(
+            f"{mode:>11}  {mode_setup * 1000:7.1f}ms  {median:7.1f}ms  "
+            f"{mean:7.1f}ms  {total:7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare the end-to-end solve latency of the local and the TCP transport.
+
+Run from the `src` directory:
+
+    python -m benchmarks.transport --runs 20
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+
+from pandapower import runpp
+
+import solver
+from core import create_test_network, reset_switch_count, to_components
+from solver.container import Transport
+
+TRANSPORTS: tuple[Transport, ...] = ("local", "tcp")
+
+
+def measure(transport: Transport, seed: int) -> float:
+    """
+    Solve the test network with the line failure selected by `seed`.
+
+    :return: wall time of `solver.solve` in seconds
+    """
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        net = create_test_network()
+        runpp(net)
+        switches, bus_measurements = to_components(net)
+        start = time.perf_counter()
+        solver.solve(switches, bus_measurements, net, transport=transport, draw=False)
+        elapsed = time.perf_counter() - start
+    reset_switch_count()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--runs", type=int, default=20, help="line failures per transport"
+    )
+    args = parser.parse_args()
+
+    # interleave transports to spread out noise over both equally
+    timings: dict[Transport, list[float]] = {transport: [] for transport in TRANSPORTS}
+    for seed in range(args.runs):
+        for transport in TRANSPORTS:
+            timings[transport].append(measure(transport, seed))
+
+    print(f"{'transport':>9}  {'median':>9}  {'mean':>9}  {'max':>9}")
+    for transport, samples in timings.items():
+        median = statistics.median(samples) * 1000
+        mean = statistics.mean(samples) * 1000
+        maximum = max(samples) * 1000
+        print(f"{transport:>9}  {median:7.1f}ms  {mean:7.1f}ms  {maximum:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
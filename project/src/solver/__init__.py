@@ -1,22 +1,41 @@
 import asyncio
-import json
 import logging
+import multiprocessing
+import multiprocessing.process
+import multiprocessing.synchronize
+import queue
+import time
 import types
+from collections.abc import Sequence
 from typing import Any
 
 import mango
 import mango.container
 import mango.container.core
-import matplotlib.pyplot as plt
-import networkx as nx
-from core import BusMeasurement, Switch, evaluate
-from pandapower import pandapowerNet, topology
+from pandapower import pandapowerNet
 
+from core import BusMeasurement, Switch, evaluate
 from solver.agents import Agent, BusAgent, SwitchAgent
-from solver.ids import MessageId, SwitchId
+from solver.backups import BackupRoutes
+from solver.container import Transport, cancel_handlers, create_container
+from solver.feasibility import FeasibilityCheck
+from solver.ids import BusId, CounterIdSource, SwitchId, set_id_source
+from solver.measurements import ConnectivitySnapshot
 from solver.messages import Message
+from solver.rendering import LAYOUT_CACHE, TopologyRenderer
+from solver.sharding import partition_topology, shard_address
+from solver.topology import CompactTopology, agent_id, cached_topology
+from solver.tracing import MessageTracer, dump_payload, shard_trace_path
+from solver.verification import PowerFlowVerifier
 
 ADDRESS = ("localhost", 5555)
+SHARD_TIMEOUT = 600
+"""
+Seconds a sharded solve may take, after that the shard processes are terminated.
+A shard process that exits without reporting fails the solve right away.
+"""
+SHARD_POLL_INTERVAL = 0.1
+"Seconds between checks whether a shard process exited without reporting."
 log = logging.getLogger(__name__)
 
 
@@ -24,173 +43,301 @@ def solve(
     switches: list[Switch], 
     bus_measurements: list[BusMeasurement], 
     net: pandapowerNet,
+    *,
+    routing: bool = False,
+    election: bool = False,
+    option_limit: None | int = None,
+    max_in_flight: None | int = None,
+    adaptive_timeout: bool = False,
+    measurement_snapshot: bool = False,
+    verify: bool = False,
+    backups: None | BackupRoutes = None,
+    negotiate: bool = False,
+    precheck: bool = False,
+    transport: Transport = "tcp",
+    address: tuple[str, int] = ADDRESS,
+    draw: bool = False,
+    layout_cache: None | str = LAYOUT_CACHE,
+    shards: int = 1,
+    trace: None | str = None,
+    trace_sample_rate: float = 1.0,
+    trace_payload: bool = False,
 ) -> None:
     """
     Solve the line failure by creating a communication topology, creating agents and
     running the multi-agent system.
-    """
-    open_network = topology.create_nxgraph(net)
-    closed_network = topology.create_nxgraph(net, respect_switches=False)
 
-    communication_topology = create_communication_topology(open_network, closed_network)
-    communication_topology = map_busmeasurements_and_switches_to_nodes(
+    :param routing: use distance-vector routing instead of flooding 
+        `ReachConnectionRequest`s from every disconnected bus
+    :param election: elect one leader per disconnected island to search for an option
+    :param option_limit: maximum number of options per `ReachConnectionResponse`
+    :param max_in_flight: maximum number of concurrent sends per agent fan-out to 
+        agents in other containers, `None` for no limit, sends within a container are 
+        always sequential
+    :param adaptive_timeout: derive response timeouts from measured response times
+    :param measurement_snapshot: read the bus connectivity from a 
+        `ConnectivitySnapshot` of `net`, which replaces the given `bus_measurements`, 
+        so only set this if they measure `net`
+    :param verify: verify switching actions with batched power flows and let bus 
+        agents search again if switching did not reconnect them or found no option 
+        before other islands were reconnected, not supported for sharded execution
+    :param backups: backup routes precomputed by `precompute_backups` on the network 
+        before the failure, islands next to a failed line with a backup route skip 
+        searching
+    :param negotiate: let the searching bus agents agree on a joint plan with few 
+        switches, searching across other disconnected islands, implies `election`
+    :param precheck: rank down options that a `FeasibilityCheck` predicts to overload 
+        a branch or drop a bus below its minimum voltage
+    :param transport: `"local"` delivers messages in memory, `"tcp"` runs a TCP 
+        container on `address`
+    :param address: address of the container, e.g. to run multiple solves at once
+    :param draw: render the communication topology before and after switching to 
+        `agent_topology.png` and `agent_topology_after.png` in the background
+    :param layout_cache: directory of the cached topology layouts, `None` disables 
+        caching
+    :param shards: number of processes the agents are distributed over, each process 
+        runs its own TCP container on consecutive ports starting at `address`
+    :param trace: path of the JSON lines message trace, `None` disables tracing
+    :param trace_sample_rate: fraction of message ids to trace
+    :param trace_payload: include the messages and agents in the trace, which is 
+        required to replay it with `solver.replay`
+    """
+    if shards > 1 and transport != "tcp":
+        msg = f"sharded execution requires the tcp transport, got {transport}"
+        raise ValueError(msg)
+    if shards > 1 and verify:
+        msg = "verification is not supported for sharded execution"
+        raise ValueError(msg)
+
+    snapshot = None
+    if measurement_snapshot:
+        snapshot = ConnectivitySnapshot(net)
+        bus_measurements = snapshot.measurements()
+
+    communication_topology = cached_topology(net)
+
+    feasibility = None
+    if precheck:
+        feasibility = FeasibilityCheck(net, communication_topology.switches)
+
+    verifier = None
+    if verify:
+        verifier = PowerFlowVerifier(net, snapshot, feasibility=feasibility)
+        switches = verifier.wrap(switches)
+
+    graph = None
+    if draw or shards > 1:
+        # partitioning and rendering work on networkx graphs
+        graph = communication_topology.to_networkx(bus_measurements, switches)
+
+    partitions = [set(communication_topology.nodes)]
+    if graph is not None and shards > 1:
+        partitions = partition_topology(graph, shards)
+
+    renderer = None
+    if graph is not None and draw:
+        renderer = TopologyRenderer(graph, cache=layout_cache)
+        renderer.snapshot("agent_topology.png")
+        if len(partitions) == 1:
+            # forking the shard processes is unsafe while the worker runs
+            renderer.start()
+
+    addresses = {
+        node: shard_address(address, shard)
+        for shard, partition in enumerate(partitions)
+        for node in partition
+    }
+
+    agents = create_agents(
         communication_topology,
-        net,
         bus_measurements,
         switches,
+        addresses=addresses,
+        routing=routing,
+        election=election,
+        option_limit=option_limit,
+        max_in_flight=max_in_flight,
+        adaptive_timeout=adaptive_timeout,
+        backups=backups,
+        negotiate=negotiate,
+        feasibility=feasibility,
     )
+    if verifier is not None:
+        verifier.agents = [
+            agent for agent in agents.values() if isinstance(agent, BusAgent)
+        ]
 
-    draw_graph(communication_topology)
+    tracer = None
+    if trace is not None:
+        tracer = MessageTracer(
+            trace, sample_rate=trace_sample_rate, payload=trace_payload
+        )
 
-    agents = create_agents(communication_topology)
-    asyncio.run(run_container(agents))
+    if len(partitions) > 1:
+        shard_aids = [
+            [agent_id(node) for node in partition]
+            for partition in partitions
+        ]
+        run_shards(agents, shard_aids, tracer, address=address)
+    elif tracer is None:
+        asyncio.run(
+            run_container(
+                agents, transport=transport, address=address, verifier=verifier
+            )
+        )
+    else:
+        if tracer.payload:
+            annotate_agents(tracer, agents)
+        with tracer:
+            asyncio.run(
+                run_container(
+                    agents,
+                    transport=transport,
+                    address=address,
+                    tracer=tracer,
+                    verifier=verifier,
+                )
+            )
 
+    if renderer is not None:
+        renderer.snapshot("agent_topology_after.png")
+        renderer.close()
 
-def create_communication_topology(
-    open_network: nx.Graph, closed_network: nx.Graph
-) -> nx.Graph:
+
+def precompute_backups(
+    switches: list[Switch], 
+    bus_measurements: list[BusMeasurement], 
+    net: pandapowerNet,
+    *,
+    max_in_flight: None | int = None,
+    transport: Transport = "tcp",
+    address: tuple[str, int] = ADDRESS,
+) -> BackupRoutes:
     """
-    Creates a communication topology based on the network with open and closed switches.
+    Precompute the backup route of every bus for a failure of any line next to it.
 
-    For every edge present in the `closed_network` that is not present in the 
-    `open_network`, a node is added to the communication topology. 
-    Edges are added between this node and the nodes connected by the edge in the 
-    `closed_network`. 
-    All other edges and nodes are taken from the `open_network`.
+    Meant to run in steady state, i.e. on the network before any line failed, the 
+    result is passed to `solve` once a line failed.
+    The routes are computed by the agents in a single pass over the network, see 
+    `BusAgent.precompute_backups`, and assume a radial network.
 
-    :param open_network: network without switchable lines
-    :param closed_network: network with switchable lines
-    :return: communication topology graph
+    :param max_in_flight: maximum number of concurrent sends per agent fan-out
+    :param transport: transport of the container
+    :param address: address of the container
     """
-
-    # create empty graph and add nodes and edges from open network
-    communication_topology = nx.Graph()
-    communication_topology.add_nodes_from(("bus", node) for node in open_network.nodes)
-    communication_topology.add_edges_from(
-        (("bus", u), ("bus", v), data) for u, v, data in open_network.edges(data=True)
+    communication_topology = cached_topology(net)
+    agents = create_agents(
+        communication_topology,
+        bus_measurements,
+        switches,
+        addresses={node: address for node in communication_topology.nodes},
+        max_in_flight=max_in_flight,
+        precompute=True,
     )
+    asyncio.run(run_container(agents, transport=transport, address=address))
+    return BackupRoutes.from_agents(agents)
 
-    # edges which are present in the closed, but not in the open network are switch edges
-    switch_edges = closed_network.edges - open_network.edges
-    # for each switch edge, add a node to the communication topology and connect it to
-    # the buses connected by the switchable line
-    for u, v, info in switch_edges:
-        switch_node = ("switch", info[1])
-        communication_topology.add_node(switch_node)
-        communication_topology.add_edge(("bus", u), switch_node)
-        communication_topology.add_edge(("bus", v), switch_node)
-
-    return communication_topology
 
-
-def map_busmeasurements_and_switches_to_nodes(
-    communication_topology: nx.Graph,
-    net: pandapowerNet,
+def create_agents(
+    communication_topology: CompactTopology,
     bus_measurements: list[BusMeasurement],
     switches: list[Switch],
-) -> nx.Graph:
-    """
-    BusMeasurements and Switches are associated with the correct node in the communication
-    topology.
-    """
-
-    # iterate over net.switch to associate each switch with each index in the list of 
-    # switches
-    element_to_switch_index: dict[int, int] = {}
-    for index, _ in net.switch.iterrows():
-        if not net.switch.loc[index, "closed"]:
-            # element is part of a node's name in the graph created by 
-            # topology.create_nxgraph(net, respect_switches=False)
-            element = net.switch.loc[index, "element"]
-            element_to_switch_index[element] = len(element_to_switch_index)
-
-    # iterate over net.bus to associate each bus with each index in the list of 
-    # BusMeasurements
-    bus_to_bus_index: dict[int, int] = {}
-    for index, _ in net.bus.iterrows():
-        bus_to_bus_index[index] = len(bus_to_bus_index)
-
-    # use the data dictionary associated with each node to store the correct 
-    # BusMeasurement or the correct Switch
-    for node, data in communication_topology.nodes(data=True):
-        if node[0] == "bus":
-            bus = node[1]
-            bus_index = bus_to_bus_index[bus]
-            communication_topology.nodes[node]["bus_measurement"] = bus_measurements[
-                bus_index
-            ]
-        elif node[0] == "switch":
-            element = node[1]
-            switch_index = element_to_switch_index[element]
-            communication_topology.nodes[node]["switch"] = switches[switch_index]
-
-    return communication_topology
-
-
-def create_agents(communication_topology: nx.Graph) -> dict[str, Agent]:
+    *,
+    addresses: None | dict[Any, Any] = None,
+    routing: bool = False,
+    election: bool = False,
+    option_limit: None | int = None,
+    max_in_flight: None | int = None,
+    adaptive_timeout: bool = False,
+    precompute: bool = False,
+    backups: None | BackupRoutes = None,
+    negotiate: bool = False,
+    feasibility: None | FeasibilityCheck = None,
+) -> dict[str, Agent]:
     """
     Creates the agents of the multi-agent system, with there being one agent per
     node in the communication topology.
 
+    :param addresses: protocol address of the container of each node, nodes without 
+        an address are placed at `ADDRESS`
+    :param routing: whether bus agents use distance-vector routing
+    :param election: whether bus agents elect island leaders
+    :param option_limit: maximum number of options bus agents keep per response
+    :param max_in_flight: maximum number of concurrent sends per agent fan-out
+    :param adaptive_timeout: whether bus agents use adaptive response timeouts
+    :param precompute: whether the agents precompute backup routes instead of resolving
+    :param backups: precomputed backup routes of the bus agents
+    :param negotiate: whether bus agents negotiate a joint plan
+    :param feasibility: check shared by the bus agents to rank down options
     :return: dictionary with agent_ids serving as keys and Agents as values
     """
-
-    # add agent_id and agent_address to the data dictionary associated with each node
-    for node, data in communication_topology.nodes(data=True):
-        agent_id = f"{node[0]}-{node[1]}-agent"
-        communication_topology.nodes[node]["agent_id"] = agent_id
-        communication_topology.nodes[node]["agent_address"] = mango.AgentAddress(
-            ADDRESS, agent_id
+    nodes = communication_topology.nodes
+    agent_ids = [agent_id(node) for node in nodes]
+    agent_addresses = [
+        mango.AgentAddress(
+            ADDRESS if addresses is None else addresses.get(node, ADDRESS), aid
         )
+        for node, aid in zip(nodes, agent_ids)
+    ]
 
-    # add neighbors, i.e., a list of neighboring AgentAddresses to the data dictionary
-    # of each node
-    for node in communication_topology.nodes:
-        neighboring_nodes = communication_topology.neighbors(node)
-        neighbors = [
-            communication_topology.nodes[neighbor]["agent_address"]
-            for neighbor in neighboring_nodes
-        ]
-        communication_topology.nodes[node]["neighbors"] = neighbors
-
-    # create all agents by using the data dictionaries associated with each node
     agents: dict[str, Agent] = {}
-    for node, data in communication_topology.nodes(data=True):
-        if node[0] == "bus":
-            neighbors = communication_topology.nodes[node].get("neighbors")
-            bus_measurement = communication_topology.nodes[node].get("bus_measurement")
-            bus_agent = BusAgent(neighbors=set(neighbors), bus=bus_measurement)
-            agent_id = communication_topology.nodes[node].get("agent_id")
-            agents[agent_id] = bus_agent
-        elif node[0] == "switch":
-            neighbors = communication_topology.nodes[node].get("neighbors")
-            switch = communication_topology.nodes[node].get("switch")
-            switch_agent = SwitchAgent(
-                neighbors=set(neighbors), switch=switch, sid=SwitchId()
+    bus_count = len(communication_topology.buses)
+    # number switches densely to allow encoding options as bitmasks
+    sids = {aid: SwitchId(i) for i, aid in enumerate(agent_ids[bus_count:])}
+    for i, aid in enumerate(agent_ids):
+        neighbors = {
+            agent_addresses[neighbor]
+            for neighbor in communication_topology.neighbors(i)
+        }
+        if i < bus_count:
+            component = communication_topology.bus_components[i]
+            backup = None
+            if backups is not None:
+                neighbor_aids = {neighbor.aid for neighbor in neighbors}
+                backup = backups.backup(aid, neighbor_aids, sids)
+            agents[aid] = BusAgent(
+                neighbors=neighbors,
+                bus=bus_measurements[component],
+                bid=BusId(),
+                routing=routing,
+                election=election,
+                option_limit=option_limit,
+                max_in_flight=max_in_flight,
+                adaptive_timeout=adaptive_timeout,
+                precompute=precompute,
+                backup_decides=backups is not None,
+                backup=backup,
+                negotiate=negotiate,
+                feasibility=feasibility,
+            )
+        else:
+            component = communication_topology.switch_components[i - bus_count]
+            agents[aid] = SwitchAgent(
+                neighbors=neighbors,
+                switch=switches[component],
+                sid=sids[aid],
+                max_in_flight=max_in_flight,
+                precompute=precompute,
             )
-            agent_id = communication_topology.nodes[node].get("agent_id")
-            agents[agent_id] = switch_agent
 
     return agents
 
 
 def trace_container_messages(
     container: mango.container.core.Container,
-) -> dict[MessageId, list[tuple[str, str, Message]]]:
+    tracer: MessageTracer,
+):
     """
     Apply a proxy function to the `send_message` method of a Mango `Container` to trace 
     container messages.
 
-    This creates a proxy function which will insert the message to be sent in a 
-    dictionary in order to read out a full tracing of all messages sent in the 
-    container.
+    This creates a proxy function which will record the message to be sent in the 
+    `tracer`.
+    The trace id of the record is passed along in the message meta, so the receiver 
+    can link its own sends to this one.
     The proxy function than normally calls the original `send_message`.
-
-    :return: dictionary mapping message IDs to a list of tuples containing the sender, receiver and message.
     """
 
-    transfers: dict[MessageId, list[tuple[str, str, Message]]] = {}
-
     # proxy original send_message to get message content
     original_send_message = container.send_message
 
@@ -201,87 +348,250 @@ def trace_container_messages(
         sender_id: None | str = None,
         **kwargs,
     ) -> bool:
-        nonlocal transfers
-
-        mid = content.mid
-        if mid not in transfers:
-            transfers[mid] = []
-        transfers[mid].append((sender_id, receiver_addr.aid, content))
+        trace_id = tracer.record(sender_id, receiver_addr.aid, content)
+        if trace_id is not None:
+            kwargs["trace_id"] = trace_id
         return await original_send_message(content, receiver_addr, sender_id, **kwargs)
 
     container.send_message = types.MethodType(proxy_send_message, container)
-    return transfers
 
 
-async def run_container(agents: dict[str, Agent]):
+def annotate_agents(tracer: MessageTracer, agents: dict[str, Agent]):
+    """
+    Describe the agents in the trace, so the trace can be replayed by `solver.replay`.
+
+    The `BusMeasurement`s and `Switch`es are reduced to their current state.
+    The `FeasibilityCheck` is not recorded, replayed bus agents rank options without 
+    it.
+    """
+    for aid, agent in agents.items():
+        record = {
+            "agent": aid,
+            "kind": type(agent).__name__,
+            "neighbors": sorted(neighbor.aid for neighbor in agent.neighbors),
+            "max_in_flight": agent.max_in_flight,
+        }
+        if isinstance(agent, BusAgent):
+            record["bid"] = dump_payload(agent.bid)
+            record["connected"] = bool(agent.bus.connected)
+            record["routing"] = agent.routing
+            record["election"] = agent.election
+            record["option_limit"] = agent.option_limit
+            record["adaptive_timeout"] = agent.adaptive_timeout
+            record["backup_decides"] = agent.backup_decides
+            record["backup"] = dump_payload(agent.backup)
+            record["negotiate"] = agent.negotiate
+        elif isinstance(agent, SwitchAgent):
+            record["sid"] = dump_payload(agent.sid)
+            record["closed"] = bool(agent.switch.is_switched())
+        tracer.annotate(record)
+
+
+async def run_container(
+    agents: dict[str, Agent],
+    transport: Transport = "tcp",
+    address: tuple[str, int] = ADDRESS,
+    tracer: None | MessageTracer = None,
+    verifier: None | PowerFlowVerifier = None,
+):
     """
     Run the multi-agent system.
     :param agents: dictionary of the system's agents
+    :param transport: transport of the container the agents are registered in
+    :param address: address of the container
+    :param tracer: tracer recording every message sent in the container
+    :param verifier: verifier of the switching actions, the system only stops once 
+        every switching action was verified and every agent is still resolved
     """
-    container = mango.create_tcp_container(addr=ADDRESS, copy_internal_messages=True)
-    transfers = trace_container_messages(container)
+    # messages are immutable, therefore they can be shared instead of copied
+    container = create_container(transport, address, copy_internal_messages=False)
+    if tracer is not None:
+        trace_container_messages(container, tracer)
 
     for aid, agent in agents.items():
         container.register(agent, aid)
 
     async with mango.activate(container):
-        async with asyncio.TaskGroup() as tg:
-            for agent in agents.values():
-                # wait until all agents have been re-connected to the grid
-                # (or have established that there is no solution)
-                tg.create_task(agent.resolved.wait())
-
-    # write traced container messages to file
-    with open("transfers.toml", "w") as f:
-        for mid, transfers in transfers.items():
-            f.write(f"[{mid}]\n")
-            f.write("transfers = [\n")
-            for transfer in transfers:
-                sender = json.dumps(transfer[0])
-                receiver = json.dumps(transfer[1])
-                message = json.dumps(repr(transfer[2]))
-                f.write(f"  [{sender:>17}, {receiver:>17}, {message}],\n")
-            f.write("]\n\n")
-
-
-def draw_graph(topology: nx.Graph):
-    def node_color(node: Any, nodedata: Any) -> str:
-        """
-        Select a color for every node.
-
-        - Connected busses: green
-        - Disconnected busses: red
-        - Switches: blue
-
-        Raises an exception if the graph contained a node of unknown type.
-        """
-        if node[0] == "bus" and nodedata.get("bus_measurement").connected:
-            return "#4CAF50"
-        elif node[0] == "bus":
-            return "#E53935"
-        elif node[0] == "switch":
-            return "#1E88E5"
-        else:
-            msg = f"unknown node type: {node[0]}"
-            raise Exception(msg)
-
-    pos = nx.nx_pydot.graphviz_layout(topology)
-    nx.draw(
-        topology,
-        pos,
-        with_labels=True,
-        labels={node: node[1] for node in topology.nodes.keys()},
-        node_color=[
-            node_color(node, nodedata) for node, nodedata in topology.nodes.items()
-        ],
-        edge_color="gray",
-        node_size=300,
-        font_size=10,
+        batches = 0
+        while True:
+            async with asyncio.TaskGroup() as tg:
+                for agent in agents.values():
+                    # wait until all agents have been re-connected to the grid
+                    # (or have established that there is no solution)
+                    tg.create_task(agent.resolved.wait())
+            if verifier is None:
+                break
+            # verifying may let agents search again
+            await verifier.flush()
+            if not all(agent.resolved.is_set() for agent in agents.values()):
+                continue
+            if verifier.batches == batches:
+                break
+            # an island may have found no option before the last power flow 
+            # reconnected its neighboring island, let it search again
+            batches = verifier.batches
+            verifier.publish()
+
+        await cancel_handlers(agents.values())
+
+
+def run_shards(
+    agents: dict[str, Agent],
+    shard_aids: list[list[str]],
+    tracer: None | MessageTracer = None,
+    address: tuple[str, int] = ADDRESS,
+    timeout: float = SHARD_TIMEOUT,
+):
+    """
+    Run the multi-agent system distributed over one process per shard.
+
+    The processes are forked, so every shard inherits the agents including their 
+    `BusMeasurement`s and `Switch`es.
+    Switching in a shard only changes the copy of the network in that process, 
+    therefore each shard reports its switched switches back and they are switched 
+    again here on the original network.
+
+    :param agents: dictionary of the system's agents
+    :param shard_aids: agent ids of every shard
+    :param tracer: tracer template, every shard traces into its own file derived from 
+        the path of the tracer
+    :param address: address of the container of the first shard, the other shards 
+        use the following ports
+    :param timeout: seconds until the shard processes are terminated, waiting for 
+        each other times out as well
+    :raises RuntimeError: if a shard process failed or did not report in time
+    """
+    context = multiprocessing.get_context("fork")
+    started = context.Barrier(len(shard_aids), timeout=timeout)
+    finished = context.Barrier(len(shard_aids), timeout=timeout)
+    switched = context.Queue()
+
+    processes = [
+        context.Process(
+            target=run_shard_process,
+            args=(shard, agents, aids, started, finished, switched, tracer, address),
+        )
+        for shard, aids in enumerate(shard_aids)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        reported = collect_shard_reports(processes, switched, timeout)
+    except RuntimeError:
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+
+    for aids in reported:
+        for aid in aids:
+            agent = agents[aid]
+            assert isinstance(agent, SwitchAgent)
+            agent.switch.switch(True)
+
+
+def collect_shard_reports(
+    processes: Sequence[multiprocessing.process.BaseProcess],
+    switched: multiprocessing.Queue,
+    timeout: float,
+) -> list[list[str]]:
+    """
+    Wait until every shard process reported its switched switch agents.
+
+    :raises RuntimeError: if a shard process exited without reporting, e.g. because it 
+        raised, or not every shard process reported within `timeout` seconds
+    """
+    deadline = time.monotonic() + timeout
+    reported: list[list[str]] = []
+    while len(reported) < len(processes):
+        try:
+            reported.append(switched.get(timeout=SHARD_POLL_INTERVAL))
+            continue
+        except queue.Empty:
+            pass
+        exitcodes = [process.exitcode for process in processes]
+        if any(exitcode not in (None, 0) for exitcode in exitcodes):
+            msg = f"shard process failed, exit codes: {exitcodes}"
+            raise RuntimeError(msg)
+        if time.monotonic() > deadline:
+            msg = f"shard processes did not finish within {timeout} seconds"
+            raise RuntimeError(msg)
+    return reported
+
+
+def run_shard_process(
+    shard: int,
+    agents: dict[str, Agent],
+    aids: list[str],
+    started: multiprocessing.synchronize.Barrier,
+    finished: multiprocessing.synchronize.Barrier,
+    switched: multiprocessing.Queue,
+    tracer: None | MessageTracer,
+    address: tuple[str, int] = ADDRESS,
+):
+    """
+    Entry point of a shard process, reports the ids of all switched switch agents.
+    """
+    # ids from different shards must not collide
+    set_id_source(CounterIdSource(origin=shard + 1))
+    shard_agents = {aid: agents[aid] for aid in aids}
+    if tracer is None:
+        asyncio.run(
+            run_shard(shard, shard_agents, started, finished, address=address)
+        )
+    else:
+        # every shard traces into its own file with its own trace ids
+        tracer = tracer.derive(shard_trace_path(tracer.path, shard), shard + 1)
+        if tracer.payload:
+            annotate_agents(tracer, shard_agents)
+        with tracer:
+            asyncio.run(
+                run_shard(
+                    shard, shard_agents, started, finished, tracer, address=address
+                )
+            )
+    switched.put([
+        aid
+        for aid, agent in shard_agents.items()
+        if isinstance(agent, SwitchAgent) and agent.switch.is_switched()
+    ])
+
+
+async def run_shard(
+    shard: int,
+    agents: dict[str, Agent],
+    started: multiprocessing.synchronize.Barrier,
+    finished: multiprocessing.synchronize.Barrier,
+    tracer: None | MessageTracer = None,
+    address: tuple[str, int] = ADDRESS,
+):
+    """
+    Run the agents of one shard in their own TCP container.
+
+    Agents immediately send messages to other shards when they are ready, therefore 
+    every container has to be started before any agent gets ready.
+    Agents also forward messages for agents of other shards, therefore a container may 
+    only shut down after every shard resolved.
+    """
+    container = create_container(
+        "tcp", shard_address(address, shard), copy_internal_messages=False
     )
+    if tracer is not None:
+        trace_container_messages(container, tracer)
+
+    for aid, agent in agents.items():
+        container.register(agent, aid)
+
+    await container.start()
+    await asyncio.to_thread(started.wait)
+    container.on_ready()
+
+    async with asyncio.TaskGroup() as tg:
+        for agent in agents.values():
+            tg.create_task(agent.resolved.wait())
+    await asyncio.to_thread(finished.wait)
 
-    plt.savefig(
-        "agent_topology.png",
-        dpi=300,
-        bbox_inches="tight",
-    )  # Save with high resolution
-    plt.close()
+    await cancel_handlers(agents.values())
+    await container.shutdown()
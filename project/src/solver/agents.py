@@ -1,21 +1,93 @@
-from asyncio import Event, TimeoutError
-from typing import Any, Iterable
 import asyncio
+import functools
+import operator
+from asyncio import Event
+from collections import Counter
+from collections.abc import Awaitable, Callable, Iterable
+from dataclasses import replace
+from typing import Any
 
 import mango
+
 from core import BusMeasurement, Switch
 
-from .ids import MessageId, SwitchId
+from .feasibility import FeasibilityCheck
+from .ids import BusId, MessageId, SwitchId
 from .messages import (
+    BackupAdvertisement,
+    IslandDecision,
+    IslandElection,
+    PlanAnnouncement,
+    QuiescenceProbe,
+    QuiescenceReport,
     ReachConnectionRequest,
     ReachConnectionResponse,
+    RouteAdvertisement,
+    RoutesSettled,
     SwitchMessage,
     SwitchRequest,
 )
-from .util import ZeroBarrier
+from .switch_set import SwitchSet, minimal_options
+from .tracing import trace_cause
+from .util import RttEstimator, ZeroBarrier
 
 Neighbors = set[mango.AgentAddress]
 
+RESPONSE_TIMEOUT = 10
+"""
+Seconds to wait for all responses to a `ReachConnectionRequest` before answering with 
+intermediate results.
+With adaptive timeouts this is used until a response that passed on the request was 
+measured from every target.
+"""
+
+MIN_RESPONSE_TIMEOUT = 0.05
+"Lower bound for adaptive response timeouts in seconds."
+
+WAVE_TIMEOUT_FACTOR = 4
+"""
+Adaptive response timeouts never fall below this multiple of the longest wave of 
+`ReachConnectionRequest`s a bus agent completed so far.
+"""
+
+CONVERGING_MESSAGES = (RouteAdvertisement, IslandElection)
+"""
+Messages counted by every agent to detect when no more of them are on their way, see 
+`Agent.wait_for_quiescence`.
+"""
+
+DECISION_TIMEOUT = 2 * RESPONSE_TIMEOUT
+"""
+Seconds a bus agent waits for the decision of its island leader before searching 
+itself, e.g. because the leader crashed.
+In routing mode also the seconds a bus agent waits for `RoutesSettled` before 
+selecting its current route.
+"""
+
+BACKUP_SETTLE_TIMEOUT = 0.5
+"""
+Seconds without a `BackupAdvertisement` after which a bus agent stops precomputing, 
+only reached in meshed parts of the network where some advertisements never complete.
+"""
+
+BACKUP_DECISION_TIMEOUT = 1
+"""
+Seconds a disconnected bus agent waits for the precomputed decision of its island 
+before searching itself.
+"""
+
+NEGOTIATION_TIMEOUT = 0.5
+"""
+Seconds a bus agent without an option waits for another island to announce its plan 
+before giving up, only used with negotiation.
+"""
+
+VERIFY_RETRIES = 1
+"""
+Number of times a bus agent searches again if a power flow shows that switching its 
+option did not reconnect it.
+"""
+
 
 class Agent(mango.Agent):
     """
@@ -29,6 +101,24 @@ class Agent(mango.Agent):
 
     neighbors: Neighbors
     seen_messages: set[MessageId]
+    max_in_flight: None | int
+    """
+    Maximum number of concurrent sends of one fan-out to agents in other containers, 
+    `None` for no limit.
+    """
+    sent_updates: Counter[mango.AgentAddress]
+    "Number of `CONVERGING_MESSAGES` sent to each neighbor."
+    received_updates: Counter[mango.AgentAddress]
+    "Number of `CONVERGING_MESSAGES` of each neighbor whose handler completed."
+    pending_probes: dict[
+        MessageId, tuple[ZeroBarrier, QuiescenceReport, set[mango.AgentAddress]]
+    ]
+    "Barrier, merged report and neighbors outside the wave of every pending probe."
+    detectors: dict[bool, BusId]
+    """
+    Smallest origin of the `QuiescenceProbe`s passed on, separately for bridged and 
+    unbridged waves.
+    """
 
     resolved: Event
     """
@@ -38,11 +128,30 @@ class Agent(mango.Agent):
     working.
     """
 
-    def __init__(self, *, neighbors: Neighbors):
+    def __init__(self, *, neighbors: Neighbors, max_in_flight: None | int = None):
         super().__init__()
         self.neighbors = neighbors
+        self.max_in_flight = max_in_flight
         self.resolved = Event()
         self.seen_messages = set()
+        self.sent_updates = Counter()
+        self.received_updates = Counter()
+        self.pending_probes = {}
+        self.detectors = {}
+
+    def reset(self):
+        """
+        Forget the last line failure, so the agent can handle the next one.
+
+        Only needed for agents that outlive a single failure, see 
+        `solver.service.SolverService`.
+        The counters of sent and received updates keep growing, only their sums are 
+        compared.
+        """
+        self.seen_messages.clear()
+        self.resolved.clear()
+        self.pending_probes.clear()
+        self.detectors.clear()
 
     def log(self, *msg):
         """
@@ -65,7 +174,12 @@ class Agent(mango.Agent):
 
         This allows using async message handlers without having to call
         `schedule_instant_task` everywhere in the derived agents.
+        The scheduled handlers inherit the trace id of the message as their 
+        `trace_cause`.
+        Handlers of `CONVERGING_MESSAGES` count the message as received once they 
+        completed, so a message being handled still counts as on its way.
         """
+        trace_cause.set(meta.get("trace_id"))
         match content:
             case ReachConnectionRequest():
                 self.schedule_instant_task(
@@ -79,6 +193,38 @@ class Agent(mango.Agent):
                 self.schedule_instant_task(self.handle_switch_request(content, meta))
             case SwitchMessage():
                 self.schedule_instant_task(self.handle_switch_message(content, meta))
+            case RouteAdvertisement():
+                self.schedule_instant_task(
+                    self.count_received(
+                        self.handle_route_advertisement(content, meta), meta
+                    )
+                )
+            case IslandElection():
+                self.schedule_instant_task(
+                    self.count_received(self.handle_island_election(content, meta), meta)
+                )
+            case IslandDecision():
+                self.schedule_instant_task(self.handle_island_decision(content, meta))
+            case BackupAdvertisement():
+                self.schedule_instant_task(
+                    self.handle_backup_advertisement(content, meta)
+                )
+            case PlanAnnouncement():
+                self.schedule_instant_task(
+                    self.handle_plan_announcement(content, meta)
+                )
+            case QuiescenceProbe():
+                self.schedule_instant_task(self.handle_quiescence_probe(content, meta))
+            case QuiescenceReport():
+                self.schedule_instant_task(self.handle_quiescence_report(content, meta))
+            case RoutesSettled():
+                self.schedule_instant_task(self.handle_routes_settled(content, meta))
+
+    async def count_received(self, handler: Awaitable[None], meta: dict[str, Any]):
+        try:
+            await handler
+        finally:
+            self.received_updates[mango.sender_addr(meta)] += 1
 
     async def handle_reach_connection_request(
         self,
@@ -100,15 +246,213 @@ class Agent(mango.Agent):
         self, message: SwitchMessage, meta: dict[str, Any]
     ): ...
 
+    async def handle_route_advertisement(
+        self, advertisement: RouteAdvertisement, meta: dict[str, Any]
+    ): ...
+
+    async def handle_island_election(
+        self, election: IslandElection, meta: dict[str, Any]
+    ): ...
+
+    async def handle_island_decision(
+        self, decision: IslandDecision, meta: dict[str, Any]
+    ): ...
+
+    async def handle_backup_advertisement(
+        self, advertisement: BackupAdvertisement, meta: dict[str, Any]
+    ): ...
+
+    async def handle_plan_announcement(
+        self, announcement: PlanAnnouncement, meta: dict[str, Any]
+    ): ...
+
+    async def handle_routes_settled(
+        self, announcement: RoutesSettled, meta: dict[str, Any]
+    ): ...
+
+    async def send_messages(
+        self, message: Any, targets: Iterable[mango.AgentAddress]
+    ):
+        """
+        Send the message to all targets.
+
+        Targets in other containers are sent to concurrently, this way a fan-out takes 
+        as long as the slowest send instead of the sum of all sends.
+        If `max_in_flight` is set, at most that many of these sends are running at 
+        once, with `1` sending sequentially.
+        Targets in the same container are sent to sequentially, as delivering to them 
+        never waits and concurrent sends would only add scheduling overhead.
+        """
+        targets = list(targets)
+        if isinstance(message, CONVERGING_MESSAGES):
+            self.sent_updates.update(targets)
+        remote = []
+        for target in targets:
+            if target.protocol_addr == self.addr.protocol_addr:
+                await self.send_message(message, target)
+            else:
+                remote.append(target)
+
+        if self.max_in_flight == 1:
+            for target in remote:
+                await self.send_message(message, target)
+            return
+
+        if self.max_in_flight is None:
+            await asyncio.gather(
+                *(self.send_message(message, target) for target in remote)
+            )
+            return
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def send(target: mango.AgentAddress):
+            async with semaphore:
+                await self.send_message(message, target)
+
+        await asyncio.gather(*(send(target) for target in remote))
+
     async def broadcast_message(self, message: Any):
-        for neighbor in self.neighbors:
-            await self.send_message(message, neighbor)
+        await self.send_messages(message, self.neighbors)
 
     async def propagate_message(self, message: Any, meta: dict[str, Any]):
         sender = mango.sender_addr(meta)
         other_neighbors = [n for n in self.neighbors if n != sender]
-        for neighbor in other_neighbors:
-            await self.send_message(message, neighbor)
+        await self.send_messages(message, other_neighbors)
+
+    def joins_wave(self, probe: QuiescenceProbe) -> bool:
+        """
+        Whether this agent passes the probe on instead of only reporting what it sent to 
+        the prober.
+        """
+        return True
+
+    async def wait_for_quiescence(self, origin: BusId, bridged: bool) -> bool:
+        """
+        Wait until no `CONVERGING_MESSAGES` are on their way to the agents taking part 
+        in waves of `QuiescenceProbe`s anymore.
+
+        This repeats waves of probes summing up the sent and received counters of these 
+        agents, until two complete waves in a row found the same sums and as many 
+        messages received as sent.
+        A single wave may see a message received by an agent visited late but not its 
+        sending by an agent visited early.
+        As the counters only grow, two waves with the same sums saw every counter 
+        unchanged in between, so all messages sent were handled at that point and 
+        no agent was about to send another one, see Mattern's four counter method.
+
+        The waves only spread across disconnected bus agents, and across switch agents 
+        if `bridged`, see `joins_wave`.
+        Agents outside answer with the messages they sent to the prober, so every 
+        message received by an agent taking part is counted as sent as well.
+        Messages are only sent in reaction to others, except for the initial messages 
+        of an agent, which therefore have to be sent before an agent waits.
+
+        When several bus agents wait at once, only the waves of the smallest `origin` 
+        spread across all agents, the others die out where they meet it.
+
+        :return: `False` if the waves died out, the agent with the smallest origin 
+            detects quiescence instead
+        """
+        previous = None
+        while True:
+            detector = self.detectors.get(bridged)
+            if detector is not None and detector < origin:
+                return False
+            self.detectors[bridged] = origin
+            report = await self.count_updates(origin, bridged)
+            if report.extinct:
+                return False
+            counters = (report.sent, report.received)
+            settled = report.complete and report.sent == report.received
+            if settled and counters == previous:
+                return True
+            previous = counters if report.complete else None
+
+    async def count_updates(self, origin: BusId, bridged: bool) -> QuiescenceReport:
+        """
+        Sum up the counters of all agents taking part in a wave of `QuiescenceProbe`s.
+
+        Like `BusAgent.send_reach_connection_requests_wait_for_response`, the wave 
+        terminates once every probe was answered, a lost report marks the wave as 
+        incomplete after `RESPONSE_TIMEOUT` seconds.
+        """
+        probe = QuiescenceProbe(mid=MessageId(), origin=origin, bridged=bridged)
+        self.seen_messages.add(probe.mid)
+        return await self.send_quiescence_probes(probe, self.neighbors)
+
+    async def send_quiescence_probes(
+        self, probe: QuiescenceProbe, targets: Iterable[mango.AgentAddress]
+    ) -> QuiescenceReport:
+        barrier = ZeroBarrier()
+        targets = list(targets)
+        for _ in targets:
+            barrier.push()
+        report = QuiescenceReport(mid=probe.mid, sent=0, received=0)
+        self.pending_probes[probe.mid] = (barrier, report, set())
+        await self.send_messages(probe, targets)
+        try:
+            await asyncio.wait_for(barrier.wait(), timeout=RESPONSE_TIMEOUT)
+            complete = True
+        except TimeoutError:
+            self.log("quiescence probe timed out, counters are incomplete")
+            complete = False
+        _, report, outside = self.pending_probes.pop(probe.mid)
+        # the counters are read after the wave behind this agent terminated, messages 
+        # to agents outside the wave are not counted by them
+        own = QuiescenceReport(
+            mid=probe.mid,
+            sent=sum(
+                count
+                for neighbor, count in self.sent_updates.items()
+                if neighbor not in outside
+            ),
+            received=self.received_updates.total(),
+            complete=complete,
+        )
+        return report.merge(own)
+
+    async def handle_quiescence_probe(self, probe, meta):
+        sender = mango.sender_addr(meta)
+        if not self.joins_wave(probe):
+            report = QuiescenceReport(
+                mid=probe.mid,
+                sent=self.sent_updates[sender],
+                received=0,
+                outside=True,
+            )
+            await self.send_message(report, sender)
+            return
+
+        if probe.mid in self.seen_messages:
+            report = QuiescenceReport(mid=probe.mid, sent=0, received=0)
+            await self.send_message(report, sender)
+            return
+
+        detector = self.detectors.get(probe.bridged)
+        if detector is not None and detector < probe.origin:
+            report = QuiescenceReport(
+                mid=probe.mid, sent=0, received=0, complete=False, extinct=True
+            )
+            await self.send_message(report, sender)
+            return
+
+        self.detectors[probe.bridged] = probe.origin
+        self.seen_messages.add(probe.mid)
+        other_neighbors = [n for n in self.neighbors if n != sender]
+        report = await self.send_quiescence_probes(probe, other_neighbors)
+        await self.send_message(report, sender)
+
+    async def handle_quiescence_report(self, report, meta):
+        if report.mid not in self.pending_probes:
+            self.log(f"Dropping late report to timed out probe {report.mid}.")
+            return
+
+        barrier, pending, outside = self.pending_probes[report.mid]
+        if report.outside:
+            outside.add(mango.sender_addr(meta))
+        self.pending_probes[report.mid] = (barrier, pending.merge(report), outside)
+        barrier.pop()
 
 
 class BusAgent(Agent):
@@ -120,74 +464,583 @@ class BusAgent(Agent):
     `on_ready` it checks if it is connected and if not, it starts resolving the problem
     by sending a `ReachConnectionRequest` if it has any members to find a way to connect
     with the rest of the network again.
+
+    In routing mode the agents instead build a distance-vector table: connected busses 
+    advertise an empty route and every bus only passes on routes that improved its own.
+    A disconnected bus then answers from its table once no further update is on its 
+    way, see `wait_for_routes`.
+
+    With island election the disconnected busses first elect the bus with the smallest 
+    id of their island, only that leader searches for an option, see `elect_leader`.
+
+    With precomputed backup routes the bus next to the failed line already knows the 
+    option of its island and decides for the island right away, see 
+    `precompute_backups`.
+
+    With negotiation the islands agree on a joint plan growing outwards from the 
+    connected busses, see `negotiate_option`.
+    Negotiation implies island election, only the leader negotiates for its island.
+
+    With a feasibility check options predicted to overload the network are only 
+    chosen if no other option is left, see `FeasibilityCheck`.
     """
 
     bus: BusMeasurement
     pending_requests: dict[MessageId, tuple[ZeroBarrier, ReachConnectionResponse]]
+    request_sent_at: dict[MessageId, float]
+    response_causes: dict[MessageId, None | int]
+    "Trace id of the last response received to a pending request."
+    adaptive_timeout: bool
+    response_times: dict[mango.AgentAddress, RttEstimator]
+    """
+    Estimated response time per hop of each neighbor, only used with adaptive 
+    timeouts.
+    """
+    response_hops: dict[mango.AgentAddress, int]
+    "Most hops a request passed behind each neighbor, only used with adaptive timeouts."
+    longest_wave: float
+    "Seconds of the longest completed wave of requests sent by this bus."
     requested_switches: set[SwitchId]
+    switched_switches: set[SwitchId]
+    "Switches that were reported as switched by a `SwitchMessage`."
+    forwarded_switches: set[SwitchId]
+    """
+    Switches this bus sent or passed on a `SwitchRequest` for, further requests for the 
+    same switch are dropped.
+    """
+    switched_option: bool
+    "Whether this bus resolved because every switch of its option was switched."
+    retries: int
+    "Remaining searches after a power flow did not confirm the connection."
+    found_no_option: bool
+    "Whether this bus resolved because no option was found."
+
+    bid: BusId
+    election: bool
+    leader: None | BusId
+    "Smallest bus id known in this island, only used with island election."
+    decided: Event
+    decision: None | SwitchSet
+    "Option chosen by the island leader, only valid once `decided` is set."
 
-    def __init__(self, *, neighbors: Neighbors, bus: BusMeasurement):
-        super().__init__(neighbors=neighbors)
+    option_limit: None | int
+    "Maximum number of options kept per `ReachConnectionResponse`, `None` for no limit."
+
+    negotiate: bool
+    plan: None | SwitchSet
+    "Switches this bus committed to, only used with negotiation."
+    planned_switches: SwitchSet
+    "Switches other busses announced to switch, only used with negotiation."
+    plan_announced: Event
+
+    feasibility: None | FeasibilityCheck
+    "Check ranking down options that violate the network limits, shared by all busses."
+
+    routing: bool
+    route: None | SwitchSet
+    "Best known switches to reach a connected bus, only used in routing mode."
+    routes_settled: Event
+
+    precompute: bool
+    "Whether this agent precomputes backup routes in steady state instead of resolving."
+    backups: dict[mango.AgentAddress, SwitchSet]
+    """
+    Switches reconnecting this bus if the line to a neighbor fails, only computed while 
+    precomputing.
+    """
+    backup_cuts: dict[mango.AgentAddress, SwitchSet]
+    "Switches advertised by every neighbor, only used while precomputing."
+    backup_switches: set[mango.AgentAddress]
+    "Neighbors that advertised as switch agents."
+    backup_updated: Event
+    backup_decides: bool
+    """
+    Whether backup routes were precomputed, so a disconnected bus waits for the decision 
+    of its island before searching itself.
+    """
+    backup: None | SwitchSet
+    """
+    Precomputed option for the failed line next to this bus, empty if no switch 
+    reconnects this bus.
+    """
+
+    def __init__(
+        self,
+        *,
+        neighbors: Neighbors,
+        bus: BusMeasurement,
+        bid: BusId,
+        max_in_flight: None | int = None,
+        routing: bool = False,
+        election: bool = False,
+        option_limit: None | int = None,
+        adaptive_timeout: bool = False,
+        precompute: bool = False,
+        backup_decides: bool = False,
+        backup: None | SwitchSet = None,
+        negotiate: bool = False,
+        feasibility: None | FeasibilityCheck = None,
+    ):
+        super().__init__(neighbors=neighbors, max_in_flight=max_in_flight)
         self.bus = bus
         self.pending_requests = {}
+        self.request_sent_at = {}
+        self.response_causes = {}
+        self.adaptive_timeout = adaptive_timeout
+        self.response_times = {}
+        self.response_hops = {}
+        self.longest_wave = 0
         self.requested_switches = set()
+        self.switched_switches = set()
+        self.forwarded_switches = set()
+        self.switched_option = False
+        self.retries = VERIFY_RETRIES
+        self.found_no_option = False
+        self.bid = bid
+        # a single bus negotiates for every island, so the island commits to one plan
+        self.election = election or negotiate
+        self.leader = None
+        self.decided = Event()
+        self.decision = None
+        self.option_limit = option_limit
+        self.negotiate = negotiate
+        self.plan = None
+        self.planned_switches = SwitchSet()
+        self.plan_announced = Event()
+        self.feasibility = feasibility
+        self.routing = routing
+        self.route = None
+        self.routes_settled = Event()
+        self.precompute = precompute
+        self.backups = {}
+        self.backup_cuts = {}
+        self.backup_switches = set()
+        self.backup_updated = Event()
+        self.backup_decides = backup_decides
+        self.backup = backup
+
+    def reset(self):
+        super().reset()
+        self.pending_requests.clear()
+        self.request_sent_at.clear()
+        self.response_causes.clear()
+        # the measured response times stay valid across failures
+        self.requested_switches.clear()
+        self.switched_switches.clear()
+        self.forwarded_switches.clear()
+        self.switched_option = False
+        self.retries = VERIFY_RETRIES
+        self.found_no_option = False
+        self.leader = None
+        self.decided.clear()
+        self.decision = None
+        self.plan = None
+        self.planned_switches = SwitchSet()
+        self.plan_announced.clear()
+        self.route = None
+        self.routes_settled.clear()
+        self.backup = None
 
     def on_ready(self):
-        if self.bus.connected:
+        if self.precompute:
+            self.schedule_instant_task(self.precompute_backups())
+            self.log("Precomputing backup routes...")
+        elif self.bus.connected:
             self.resolved.set()
             self.log("I am connected.")
+            if self.routing:
+                self.route = SwitchSet()
+                advertisement = RouteAdvertisement(
+                    mid=MessageId(), switches=self.route
+                )
+                self.schedule_instant_task(self.broadcast_message(advertisement))
         elif not self.neighbors:
             self.resolved.set()
             self.log("No solution available.")
         else:
+            self.schedule_instant_task(self.resolve())
+            self.log("Resolving connection issue...")
 
-            async def resolve():
-                """
-                Try to resolve the connection issue.
-
-                Resolve the connection issue by first sending out
-                `ReachConnectionRequest`s across the network.
-                When all responses reached us back again, we can determine the best
-                option and either report that no option was found to send request to
-                all the necessary switches to reconnect again.
-                """
-                request = ReachConnectionRequest(
-                    mid=MessageId(), bridged=False, switches=set()
-                )
-                targets = self.neighbors
-                response = await self.send_reach_connection_requests_wait_for_response(
-                    request, targets
+    def joins_wave(self, probe: QuiescenceProbe) -> bool:
+        # connected busses are not part of any island
+        return not self.bus.connected
+
+    async def resolve(self):
+        """
+        Try to resolve the connection issue.
+
+        With island election enabled only the elected leader of the island searches for 
+        an option and shares its decision with the rest of the island, every other bus 
+        just waits for that decision.
+        If no decision arrives within `DECISION_TIMEOUT` seconds, the bus searches 
+        itself.
+
+        With precomputed backup routes the bus next to the failed line shares its backup 
+        the same way.
+        If no decision arrives within `BACKUP_DECISION_TIMEOUT` seconds, e.g. because no 
+        backup was precomputed for this failure, the island searches as usual.
+        """
+        if self.backup is not None:
+            self.log(f"Selecting backup route: {self.backup}.")
+            await self.decide(self.backup or None)
+            return
+        if self.backup_decides:
+            try:
+                await asyncio.wait_for(self.decided.wait(), BACKUP_DECISION_TIMEOUT)
+            except TimeoutError:
+                self.log("No backup route decided, searching...")
+            else:
+                await self.accept_decision(self.decision)
+                return
+
+        leading = False
+        if self.election:
+            leading = await self.elect_leader()
+        if self.election and not leading:
+            self.log("Waiting for decision of the island leader...")
+            try:
+                await asyncio.wait_for(self.decided.wait(), DECISION_TIMEOUT)
+            except TimeoutError:
+                self.log("No decision of the island leader, searching...")
+            else:
+                await self.accept_decision(self.decision)
+                return
+
+        if self.negotiate:
+            option = await self.negotiate_option()
+        else:
+            option = await self.find_option()
+        if leading:
+            await self.decide(option)
+            return
+        if self.plan is not None:
+            await self.announce_plan()
+        await self.request_switches(option)
+
+    async def decide(self, option: None | SwitchSet):
+        """
+        Share the option with the island and request its switches.
+
+        With negotiation the plan is only announced after the decision, so the rest of 
+        the island committed to it before a nested island searches through it.
+        """
+        self.log("Sharing decision with island.")
+        await self.broadcast_message(
+            IslandDecision(mid=MessageId(), leader=self.bid, switches=option)
+        )
+        if self.plan is not None:
+            await self.announce_plan()
+        await self.request_switches(option)
+
+    async def find_option(self) -> None | SwitchSet:
+        """
+        Find the best option to reconnect this bus.
+        """
+        option = BusAgent.best_option(await self.find_options(), self.feasibility)
+        self.log(f"Selecting best option: {option}.")
+        return option
+
+    async def find_options(self) -> frozenset[SwitchSet]:
+        """
+        Find the options to reconnect this bus.
+
+        In routing mode this waits until no route advertisement is on its way anymore 
+        and the route is the only option, see `wait_for_routes`.
+        As every bus of an island only passes on strictly better routes without adding 
+        switches between busses, all busses of an island settle on the same route.
+
+        Otherwise `ReachConnectionRequest`s are sent out across the network.
+        When all responses reached us back again, we know the options.
+        """
+        if self.routing:
+            await self.wait_for_routes()
+            self.log(f"Selecting route: {self.route}.")
+            return frozenset() if self.route is None else frozenset([self.route])
+
+        request = ReachConnectionRequest(
+            mid=MessageId(), bridged=False, switches=SwitchSet()
+        )
+        targets = self.neighbors
+        response = await self.send_reach_connection_requests_wait_for_response(
+            request, targets
+        )
+        self.log(f"Received final response: {response}.")
+        return response.switches
+
+    async def negotiate_option(self) -> None | SwitchSet:
+        """
+        Find an option and commit to it as part of the joint plan of all islands.
+
+        Islands next to connected busses find their options first.
+        The leader of an island chooses the option adding the fewest switches to the 
+        plans announced so far and commits to it.
+        Its decision commits the rest of the island to the same plan, see 
+        `handle_island_decision`, only then the plan is announced, see `decide`.
+        From then on it answers searches as reached via its planned switches, so a 
+        nested island behind it finds an option including these switches, although 
+        they are not switched yet.
+        A bus without an option searches again whenever another plan was announced, 
+        until none was announced for `NEGOTIATION_TIMEOUT` seconds.
+
+        This way the plan grows outwards from the connected busses like a spanning 
+        tree, every island adds a single switch if possible and no power flow is needed 
+        in between.
+        Options failing the feasibility check are only chosen as a last resort.
+        """
+        while True:
+            options = await self.find_options()
+            if options:
+                break
+            try:
+                await asyncio.wait_for(self.plan_announced.wait(), NEGOTIATION_TIMEOUT)
+            except TimeoutError:
+                self.log("No plan announced, giving up.")
+                return None
+            self.plan_announced.clear()
+            self.log("Plan announced, searching again...")
+
+        planned = self.planned_switches
+        infeasible = BusAgent.infeasible(self.feasibility)
+        self.plan = min(
+            options,
+            key=lambda option: (
+                infeasible(option),
+                len(option | planned),
+                option.sort_key,
+            ),
+        )
+        self.log(f"Selecting negotiated option: {self.plan}.")
+        return self.plan
+
+    async def announce_plan(self):
+        await self.broadcast_message(
+            PlanAnnouncement(mid=MessageId(), switches=self.plan)
+        )
+
+    async def elect_leader(self) -> bool:
+        """
+        Elect the leader of the island this bus belongs to.
+
+        Every bus starts as its own leader candidate and only passes on smaller 
+        candidates.
+        Switch and connected bus agents drop the election messages, so the minimum 
+        spreads exactly across the disconnected island.
+        A bus reached by the election before starting itself joins with its own id, 
+        so the election is over once no election message is on its way anymore.
+
+        Only the waves detecting this of the smallest id spread across the whole island, 
+        see `wait_for_quiescence`, and they never cross a switch.
+        Therefore the leader learns that it won, while every other bus only learns of 
+        the leader by its `IslandDecision`.
+
+        :return: whether this bus leads its island
+        """
+        if self.leader is None or self.bid < self.leader:
+            self.leader = self.bid
+            await self.broadcast_message(
+                IslandElection(mid=MessageId(), leader=self.leader)
+            )
+        detected = await self.wait_for_quiescence(self.bid, bridged=False)
+        leading = detected and self.leader == self.bid
+        if leading:
+            self.log("Elected island leader.")
+        return leading
+
+    async def wait_for_routes(self):
+        """
+        Wait until no route advertisement is on its way anymore.
+
+        The waves detecting this spread across the disconnected busses and the switches 
+        between them, as routes of other islands may still improve the route of this 
+        one, see `wait_for_quiescence`.
+        The bus whose waves spread across all of them announces the settled routes with 
+        `RoutesSettled`, the other busses wait for that announcement.
+        If none arrives within `DECISION_TIMEOUT` seconds, the current route is used.
+        """
+        if self.routes_settled.is_set():
+            return
+        if await self.wait_for_quiescence(self.bid, bridged=True):
+            self.routes_settled.set()
+            await self.broadcast_message(RoutesSettled(mid=MessageId()))
+            return
+        try:
+            await asyncio.wait_for(self.routes_settled.wait(), DECISION_TIMEOUT)
+        except TimeoutError:
+            self.log("Routes not settled in time, selecting the current route.")
+
+    async def accept_decision(self, option: None | SwitchSet):
+        """
+        Accept the decision of the island leader.
+
+        The leader already requested the switches, therefore this bus only waits for 
+        the switches that weren't already reported as switched.
+        """
+        if option is None:
+            self.found_no_option = True
+            self.resolved.set()
+            self.log("No solution found.")
+            return
+        self.requested_switches.update(
+            sid for sid in option if sid not in self.switched_switches
+        )
+        if not self.requested_switches:
+            self.switched_option = True
+            self.resolved.set()
+            self.log("I am connected.")
+
+    async def request_switches(self, option: None | SwitchSet):
+        """
+        Request all switches of the selected option or resolve if there is none.
+
+        Switches already reported as switched are not requested again, e.g. when 
+        another island chose the same switch.
+        Switches another request already passed this bus for are waited for without 
+        sending another request.
+        """
+        if option is None:
+            self.found_no_option = True
+            self.resolved.set()
+            self.log("No solution found.")
+            return
+        pending = [sid for sid in option if sid not in self.switched_switches]
+        if not pending:
+            self.switched_option = True
+            self.resolved.set()
+            self.log("I am connected.")
+            return
+        self.requested_switches.update(pending)
+        requested = [sid for sid in pending if sid not in self.forwarded_switches]
+        self.forwarded_switches.update(requested)
+        for sid in requested:
+            self.log(f"Broadcasting best option to {sid}")
+        await asyncio.gather(
+            *(
+                self.broadcast_message(SwitchRequest(mid=MessageId(), sid=sid))
+                for sid in requested
+            )
+        )
+
+    def verify_connection(self):
+        """
+        React to the connectivity refreshed by a power flow after switching.
+
+        A bus connected by the power flow is resolved, even if it is still waiting for 
+        switches.
+        A bus which resolved because its option was switched but is still not connected
+        searches again, at most `VERIFY_RETRIES` times.
+
+        A bus which found no option searches again after every power flow, as the 
+        switching actions verified by it may have reconnected a neighboring island.
+        This way islands only reachable across other disconnected islands are resolved
+        in rounds with multiple line failures.
+        Every power flow follows a switching action, so this ends once no search finds 
+        another switch to close.
+        """
+        if self.bus.connected:
+            if not self.resolved.is_set():
+                self.requested_switches.clear()
+                self.resolved.set()
+                self.log("Power flow confirmed connection.")
+            return
+
+        if self.found_no_option:
+            self.found_no_option = False
+            self.resolved.clear()
+            self.log("Searching again after switching elsewhere...")
+            self.schedule_instant_task(self.retry())
+            return
+
+        if not self.switched_option or self.retries <= 0:
+            return
+        self.retries -= 1
+        self.switched_option = False
+        self.resolved.clear()
+        self.log("Power flow shows no connection, searching again...")
+        self.schedule_instant_task(self.retry())
+
+    async def precompute_backups(self):
+        """
+        Precompute the switches reconnecting this bus if the line to any neighbor fails.
+
+        This is a single pass of message passing over the radial network: every agent 
+        advertises to a neighbor once all other neighbors advertised to it, starting at 
+        the leaves and the switch agents.
+        The advertisement to a neighbor holds the open switches leading out of this 
+        side of the line to that neighbor, which is exactly the backup of this bus for a 
+        failure of that line, see `BackupAdvertisement`.
+        This way every line is only advertised once in each direction.
+
+        In meshed parts some neighbors never advertise, those lines get no backup.
+        """
+        await self.advertise_backups()
+        while len(self.backup_cuts) < len(self.neighbors):
+            try:
+                await asyncio.wait_for(
+                    self.backup_updated.wait(), timeout=BACKUP_SETTLE_TIMEOUT
                 )
-                self.log(f"Received final response: {response}.")
-                option = BusAgent.best_option(response.switches)
-                self.log(f"Selecting best option: {option}.")
-                if option is None:
-                    self.resolved.set()
-                    self.log("No solution found.")
-                    return
-                for sid in option:
-                    self.requested_switches.add(sid)
-                    self.log(f"Broadcasting best option to {sid}")
-                    await self.broadcast_message(
-                        SwitchRequest(mid=MessageId(), sid=sid)
-                    )
+            except TimeoutError:
+                self.log("Backup routes incomplete, network is meshed.")
+                break
+            self.backup_updated.clear()
+        self.resolved.set()
 
-            self.schedule_instant_task(resolve())
-            self.log("Resolving connection issue...")
+    async def advertise_backups(self):
+        """
+        Advertise to every bus neighbor whose backup can be computed by now.
+        """
+        for neighbor in self.neighbors:
+            if neighbor in self.backups or neighbor in self.backup_switches:
+                continue
+            cuts = [cut for n, cut in self.backup_cuts.items() if n != neighbor]
+            if len(cuts) < len(self.neighbors) - 1:
+                continue
+            cut = functools.reduce(operator.xor, cuts, SwitchSet())
+            self.backups[neighbor] = cut
+            await self.send_message(
+                BackupAdvertisement(mid=MessageId(), switches=cut, from_switch=False),
+                neighbor,
+            )
+
+    async def retry(self):
+        """
+        Search for an option again, without electing a leader again.
+        """
+        option = await self.find_option()
+        await self.request_switches(option)
 
     @staticmethod
-    def best_option(options: set[frozenset[SwitchId]]) -> None | frozenset[SwitchId]:
+    def best_option(
+        options: Iterable[SwitchSet], feasibility: None | FeasibilityCheck = None
+    ) -> None | SwitchSet:
         """
         Search for the best option give a set of options.
 
+        Options failing the feasibility check are ranked below all others.
         An option is preferred if it shorter than another one.
-        Then the IDs are used to get the best response.
-        IDs have an order but that order itself is irrelevant as each switch is equally
-        good to enable again.
+        Then the bitmasks are used to get the best response.
+        Bitmasks have an order but that order itself is irrelevant as each switch is 
+        equally good to enable again.
         We just need to make sure that every agent decides on the same switch.
+        As the check is shared and deterministic, this holds with it as well.
+        """
+        return min(options, key=BusAgent.rank(feasibility), default=None)
+
+    @staticmethod
+    def rank(feasibility: None | FeasibilityCheck) -> Callable[[SwitchSet], Any]:
+        """
+        Ranking key of the options, smaller keys are better options, see `best_option`.
         """
-        sorted_options = sorted(options, key=lambda s: (len(s), sorted(s)))
-        return sorted_options[0] if sorted_options else None
+        infeasible = BusAgent.infeasible(feasibility)
+        return lambda option: (infeasible(option), option.sort_key)
+
+    @staticmethod
+    def infeasible(feasibility: None | FeasibilityCheck) -> Callable[[SwitchSet], bool]:
+        """
+        Ranking key of an option that is `True` if it fails the feasibility check.
+        """
+        if feasibility is None:
+            return lambda option: False
+        return lambda option: not feasibility.feasible(option)
 
     async def send_reach_connection_requests_wait_for_response(
         self,
@@ -198,39 +1051,107 @@ class BusAgent(Agent):
         Send a `ReachConnectionRequest` to all targets and wait for their responses and 
         merging them.
 
+        The requests spread as a diffusing computation: every request is answered by 
+        exactly one response, either immediately by dead ends and agents that are 
+        already engaged in this request or after all of their own requests were 
+        answered.
+        Therefore the `ZeroBarrier` counting the outstanding responses detects 
+        termination and the timeout is only a safety net for lost messages.
+        With adaptive timeouts the safety net follows the measured response times of 
+        the targets instead of waiting `RESPONSE_TIMEOUT` seconds.
+
         The merging behavior is implemented in the `handle_reach_connection_response` 
         method. 
+        Before returning, options dominated by a better ranked option are dropped and 
+        at most `option_limit` options are kept, so responses stay small on the way 
+        back.
+        Options are ranked like in `best_option`, so options failing the feasibility 
+        check are dropped first and do not dominate their feasible supersets.
         """
         barrier = ZeroBarrier()
         response = ReachConnectionResponse.from_request(request, False)
         self.pending_requests[request.mid] = (barrier, response)
-        for target in targets:
+        self.seen_messages.add(request.mid)
+        targets = list(targets)
+        for _ in targets:
             barrier.push()
-            await self.send_message(request, target)
+        loop = asyncio.get_running_loop()
+        self.request_sent_at[request.mid] = loop.time()
+        await self.send_messages(request, targets)
 
         # wait for all sent request to return with a response
         try:
-            await asyncio.wait_for(barrier.wait(), timeout=10)
-            del self.pending_requests[request.mid]
+            timeout = self.response_timeout(targets)
+            await asyncio.wait_for(barrier.wait(), timeout=timeout)
+            wave = loop.time() - self.request_sent_at[request.mid]
+            self.longest_wave = max(self.longest_wave, wave)
         except TimeoutError:
             self.log("response timed out, will respond with intermediate results")
-        return response
+        # late responses to a timed out request are dropped
+        _, response = self.pending_requests.pop(request.mid)
+        del self.request_sent_at[request.mid]
+
+        # the last response decided the outcome of this request
+        cause = self.response_causes.pop(request.mid, None)
+        if cause is not None:
+            trace_cause.set(cause)
+        return replace(
+            response,
+            switches=minimal_options(
+                response.switches,
+                self.option_limit,
+                key=BusAgent.rank(self.feasibility),
+            ),
+        )
+
+    def response_timeout(self, targets: Iterable[mango.AgentAddress]) -> float:
+        """
+        Timeout for the responses of all targets.
+
+        With adaptive timeouts the response time per hop of every target is scaled by 
+        one more hop than any request passed behind it so far.
+        The timeout never falls below `WAVE_TIMEOUT_FACTOR` times the longest wave 
+        completed so far, as a later wave may explore a deeper part of the network.
+        """
+        if not self.adaptive_timeout:
+            return RESPONSE_TIMEOUT
+        timeout = MIN_RESPONSE_TIMEOUT
+        for target in targets:
+            if target not in self.response_times:
+                return RESPONSE_TIMEOUT
+            hops = self.response_hops[target] + 1
+            timeout = max(timeout, self.response_times[target].timeout * hops)
+        timeout = max(timeout, WAVE_TIMEOUT_FACTOR * self.longest_wave)
+        return min(timeout, RESPONSE_TIMEOUT)
 
     async def handle_reach_connection_request(self, request, meta):
         sender = mango.sender_addr(meta)
 
-        # we are connected, tell that the requester
+        # we are connected, tell that the requester, unless the request passed no 
+        # switch: then a power flow connected us after it was sent and its requester 
+        # is connected as well
         if self.bus.connected:
-            response = ReachConnectionResponse.from_request(request, True)
+            reached = bool(request.switches)
+            response = ReachConnectionResponse.from_request(request, reached)
             await self.send_message(response, sender)
             return
 
         # we have seen that message, do not further propagate
-        if request.mid in self.pending_requests:
+        if request.mid in self.seen_messages:
             response = ReachConnectionResponse.from_request(request, False)
             await self.send_message(response, sender)
             return
 
+        # we are not connected yet but committed to switches reconnecting us, reaching 
+        # us requires them as well
+        if self.plan is not None:
+            switches = request.switches | self.plan
+            response = ReachConnectionResponse.from_request(
+                replace(request, switches=switches), True
+            )
+            await self.send_message(response, sender)
+            return
+
         # the request bridged over a switch but we aren't connected, return this as a 
         # dead end
         if request.bridged:
@@ -246,28 +1167,59 @@ class BusAgent(Agent):
 
         # the response handler will update the response we have,
         # therefore we can just send that one
+        if other_neighbors:
+            response = replace(response, hops=response.hops + 1)
         await self.send_message(response, sender)
 
     async def handle_reach_connection_response(self, response, meta):
         mid = response.mid
-        assert mid in self.pending_requests, "got response to no request"
+        if mid not in self.pending_requests:
+            self.log(f"Dropping late response to timed out request {mid}.")
+            return
 
+        # responses answered right away, e.g. by dead ends, say nothing about the time 
+        # a request takes to explore a part of the network
+        if self.adaptive_timeout and response.hops > 0:
+            sender = mango.sender_addr(meta)
+            if sender not in self.response_times:
+                self.response_times[sender] = RttEstimator(
+                    RESPONSE_TIMEOUT, 0, RESPONSE_TIMEOUT
+                )
+            rtt = asyncio.get_running_loop().time() - self.request_sent_at[mid]
+            self.response_times[sender].sample(rtt / response.hops)
+            self.response_hops[sender] = max(
+                self.response_hops.get(sender, 0), response.hops
+            )
+
+        self.response_causes[mid] = trace_cause.get()
         zero_barrier, pending_response = self.pending_requests[mid]
         # merge pending response with received response
-        pending_response.reached = pending_response.reached or response.reached
-        pending_response.switches.update(response.switches)
+        self.pending_requests[mid] = (zero_barrier, pending_response.merge(response))
         zero_barrier.pop()
 
     async def handle_switch_request(self, request, meta):
-        if request.mid not in self.seen_messages:
+        if request.mid in self.seen_messages:
+            return
+        self.seen_messages.add(request.mid)
+        if request.sid in self.switched_switches:
+            # the `SwitchMessage` of another request for this switch already passed
+            return
+        if not self.negotiate:
+            # with negotiation every bus only waits for the switches of its own plan
             self.requested_switches.add(request.sid)
-            self.seen_messages.add(request.mid)
-            await self.broadcast_message(request)
+        # a single request per switch reaches the switch agent, islands choosing the
+        # same switch share it
+        if request.sid in self.forwarded_switches:
+            return
+        self.forwarded_switches.add(request.sid)
+        await self.broadcast_message(request)
 
     async def handle_switch_message(self, message, meta):
+        self.switched_switches.add(message.sid)
         if message.sid in self.requested_switches:
             self.requested_switches.remove(message.sid)
             if not self.requested_switches:
+                self.switched_option = True
                 self.resolved.set()
                 self.log("I am connected.")
 
@@ -275,10 +1227,86 @@ class BusAgent(Agent):
             self.seen_messages.add(message.mid)
             await self.broadcast_message(message)
 
+    async def handle_route_advertisement(self, advertisement, meta):
+        # connected busses already know the best possible route
+        if self.bus.connected:
+            return
+
+        # only improvements are passed on, this lets the tables converge
+        route = advertisement.switches
+        if self.route is not None and route.sort_key >= self.route.sort_key:
+            return
+
+        self.route = route
+        await self.propagate_message(
+            RouteAdvertisement(mid=MessageId(), switches=route), meta
+        )
+
+    async def handle_island_election(self, election, meta):
+        # connected busses are not part of any island
+        if self.bus.connected:
+            return
+
+        if self.leader is None:
+            # join the election as if it was started by ourselves
+            self.leader = self.bid
+            if self.bid < election.leader:
+                await self.broadcast_message(
+                    IslandElection(mid=MessageId(), leader=self.bid)
+                )
+                return
+        if election.leader >= self.leader:
+            return
+
+        self.leader = election.leader
+        await self.propagate_message(
+            IslandElection(mid=MessageId(), leader=self.leader), meta
+        )
+
+    async def handle_routes_settled(self, announcement, meta):
+        if self.bus.connected or announcement.mid in self.seen_messages:
+            return
+
+        self.seen_messages.add(announcement.mid)
+        self.routes_settled.set()
+        await self.propagate_message(announcement, meta)
+
+    async def handle_island_decision(self, decision, meta):
+        if self.bus.connected or decision.mid in self.seen_messages:
+            return
+
+        self.seen_messages.add(decision.mid)
+        self.decision = decision.switches
+        # commit right away, a nested island may already search through this bus
+        if self.negotiate and self.plan is None:
+            self.plan = decision.switches
+        self.decided.set()
+        await self.propagate_message(decision, meta)
+
+    async def handle_plan_announcement(self, announcement, meta):
+        # connected busses do not need any plan
+        if self.bus.connected or announcement.mid in self.seen_messages:
+            return
+
+        self.seen_messages.add(announcement.mid)
+        self.planned_switches |= announcement.switches
+        self.plan_announced.set()
+        await self.propagate_message(announcement, meta)
+
+    async def handle_backup_advertisement(self, advertisement, meta):
+        sender = mango.sender_addr(meta)
+        self.backup_cuts[sender] = advertisement.switches
+        if advertisement.from_switch:
+            self.backup_switches.add(sender)
+        self.backup_updated.set()
+        await self.advertise_backups()
+
 
 class SwitchAgent(Agent):
     switch: Switch
     sid: SwitchId
+    precompute: bool
+    "Whether this agent advertises its switch to precompute backup routes."
 
     def __init__(
         self,
@@ -286,19 +1314,34 @@ class SwitchAgent(Agent):
         neighbors: Neighbors,
         switch: Switch,
         sid: SwitchId,
+        max_in_flight: None | int = None,
+        precompute: bool = False,
     ):
-        super().__init__(neighbors=neighbors)
+        super().__init__(neighbors=neighbors, max_in_flight=max_in_flight)
         self.switch = switch
         self.sid = sid
+        self.precompute = precompute
 
         assert len(self.neighbors) == 2, "switch connects more than two busses"
 
         # all switches are happy with their initial state
         self.resolved.set()
 
+    def reset(self):
+        super().reset()
+        self.resolved.set()
+
+    def on_ready(self):
+        if self.precompute:
+            advertisement = BackupAdvertisement(
+                mid=MessageId(), switches=SwitchSet.of([self.sid]), from_switch=True
+            )
+            self.schedule_instant_task(self.broadcast_message(advertisement))
+
     async def handle_reach_connection_request(self, request, meta):
-        request.switches.add(self.sid)
-        request.bridged = True
+        request = replace(
+            request, switches=request.switches.with_switch(self.sid), bridged=True
+        )
         await self.propagate_message(request, meta)
 
     async def handle_reach_connection_response(self, response, meta):
@@ -308,6 +1351,11 @@ class SwitchAgent(Agent):
         if request.sid != self.sid:
             return await self.broadcast_message(request)
 
+        # both busses may pass on the same request
+        if request.mid in self.seen_messages:
+            return
+        self.seen_messages.add(request.mid)
+
         if not self.switch.is_switched():
             self.switch.switch(True)
             self.log("Performing switching action.")
@@ -319,3 +1367,23 @@ class SwitchAgent(Agent):
         if message.mid not in self.seen_messages:
             self.seen_messages.add(message.mid)
             await self.broadcast_message(message)
+
+    async def handle_plan_announcement(self, announcement, meta):
+        if announcement.mid not in self.seen_messages:
+            self.seen_messages.add(announcement.mid)
+            await self.propagate_message(announcement, meta)
+
+    async def handle_routes_settled(self, announcement, meta):
+        if announcement.mid not in self.seen_messages:
+            self.seen_messages.add(announcement.mid)
+            await self.propagate_message(announcement, meta)
+
+    def joins_wave(self, probe: QuiescenceProbe) -> bool:
+        return probe.bridged
+
+    async def handle_route_advertisement(self, advertisement, meta):
+        # passing the advertisement across the switch requires switching it
+        switches = advertisement.switches.with_switch(self.sid)
+        await self.propagate_message(
+            RouteAdvertisement(mid=MessageId(), switches=switches), meta
+        )
@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+from typing import Self
+
+from .agents import Agent, BusAgent, SwitchAgent
+from .ids import SwitchId
+from .switch_set import SwitchSet
+
+
+@dataclass(frozen=True, slots=True)
+class BackupRoutes:
+    """
+    Backup routes precomputed in steady state, see `solver.precompute_backups`.
+
+    Routes are stored by agent id, which stays the same when a line fails, unlike the
+    densely numbered switch ids.
+    """
+    routes: dict[str, dict[str, None | str]]
+    """
+    Agent id of the best switch reconnecting every bus agent if the line to a
+    neighboring bus agent fails, `None` if no switch does.
+    """
+
+    @classmethod
+    def from_agents(cls, agents: dict[str, Agent]) -> Self:
+        switch_aids = {
+            agent.sid: aid
+            for aid, agent in agents.items()
+            if isinstance(agent, SwitchAgent)
+        }
+        routes: dict[str, dict[str, None | str]] = {}
+        for aid, agent in agents.items():
+            if not isinstance(agent, BusAgent):
+                continue
+            routes[aid] = {}
+            for neighbor, cut in agent.backups.items():
+                option = BusAgent.best_option(SwitchSet.of([sid]) for sid in cut)
+                routes[aid][neighbor.aid] = (
+                    None if option is None else switch_aids[next(iter(option))]
+                )
+        return cls(routes)
+
+    def backup(
+        self, aid: str, neighbors: set[str], sids: dict[str, SwitchId]
+    ) -> None | SwitchSet:
+        """
+        Backup of a bus agent after a line failure.
+
+        The failed line is the one to the single neighbor the agent lost since the
+        backup routes were computed.
+        If it lost several neighbors or none, nothing was precomputed for this failure.
+        If no switch reconnects the agent, the backup is empty.
+
+        :param neighbors: agent ids of the current neighbors of the agent
+        :param sids: current switch id of every switch agent
+        """
+        routes = self.routes.get(aid, {})
+        lost = [neighbor for neighbor in routes if neighbor not in neighbors]
+        if len(lost) != 1:
+            return None
+        switch = routes[lost[0]]
+        if switch is None:
+            return SwitchSet()
+        if switch not in sids:
+            return None
+        return SwitchSet.of([sids[switch]])
@@ -0,0 +1,213 @@
+import asyncio
+import dataclasses
+import functools
+import logging
+from collections.abc import Iterable
+from typing import Any, Literal
+
+import mango
+import mango.container.core
+from mango.messages.codecs import JSON
+from mango.util.clock import AsyncioClock
+
+from .ids import BusId, MessageId, SwitchId
+from .messages import (
+    BackupAdvertisement,
+    IslandDecision,
+    IslandElection,
+    Message,
+    PlanAnnouncement,
+    QuiescenceProbe,
+    QuiescenceReport,
+    ReachConnectionRequest,
+    ReachConnectionResponse,
+    RouteAdvertisement,
+    RoutesSettled,
+    SwitchMessage,
+    SwitchRequest,
+)
+from .switch_set import SwitchSet
+
+Transport = Literal["local", "tcp"]
+log = logging.getLogger(__name__)
+
+
+class LocalContainer(mango.container.core.Container):
+    """
+    Container which delivers messages between its own agents only.
+
+    All agents of the solver live in one process, therefore no messages ever have to 
+    leave the container.
+    Unlike the TCP container, this container never opens a socket and needs no free 
+    port, messages are directly put into the inbox of the receiving agent.
+    """
+
+    def __init__(self, addr: Any, copy_internal_messages: bool = False):
+        super().__init__(
+            addr=addr,
+            name=str(addr),
+            codec=None,
+            clock=AsyncioClock(),
+            copy_internal_messages=copy_internal_messages,
+        )
+
+    async def send_message(
+        self,
+        content: Any,
+        receiver_addr: mango.AgentAddress,
+        sender_id: None | str = None,
+        **kwargs,
+    ) -> bool:
+        if receiver_addr.protocol_addr != self.addr:
+            log.warning(
+                "local container cannot send message from %s to %s",
+                sender_id,
+                receiver_addr,
+            )
+            return False
+
+        meta = dict(kwargs)
+        meta["sender_id"] = sender_id
+        meta["sender_addr"] = self.addr
+        meta["receiver_id"] = receiver_addr.aid
+        meta["network_protocol"] = "local"
+        return self._send_internal_message(
+            content, receiver_addr.aid, default_meta=meta
+        )
+
+
+MESSAGE_TYPES: list[type[Message]] = [
+    ReachConnectionRequest,
+    ReachConnectionResponse,
+    SwitchRequest,
+    SwitchMessage,
+    RouteAdvertisement,
+    IslandElection,
+    IslandDecision,
+    BackupAdvertisement,
+    PlanAnnouncement,
+    QuiescenceProbe,
+    QuiescenceReport,
+    RoutesSettled,
+]
+"Messages sent between the agents, every one is registered with `create_codec`."
+
+
+def create_codec() -> JSON:
+    """
+    JSON codec that can encode every message of `MESSAGE_TYPES`.
+
+    Only the registered types are decoded, unlike pickling, a peer connecting to a 
+    TCP container cannot make it run arbitrary code.
+    Messages between agents of the same container are never encoded.
+    """
+    codec = JSON()
+    for message_type in MESSAGE_TYPES:
+        codec.add_serializer(
+            message_type,
+            _dump_message,
+            functools.partial(_load_message, message_type),
+        )
+    for id_type in [MessageId, BusId, SwitchId]:
+        codec.add_serializer(id_type, lambda id: id.key, id_type)
+    codec.add_serializer(SwitchSet, lambda switches: switches.mask, SwitchSet)
+    codec.add_serializer(frozenset, list, frozenset)
+    return codec
+
+
+def _dump_message(message: Message) -> dict[str, Any]:
+    return {
+        field.name: getattr(message, field.name)
+        for field in dataclasses.fields(message)
+    }
+
+
+def _load_message(message_type: type[Message], fields: dict[str, Any]) -> Message:
+    return message_type(**fields)
+
+
+def create_container(
+    transport: Transport,
+    addr: Any,
+    copy_internal_messages: bool = False,
+) -> mango.container.core.Container:
+    """
+    Create a container for the given transport.
+
+    TCP containers use the codec of `create_codec` to be able to send messages to 
+    agents in other containers.
+
+    :param transport: `"local"` for in-memory delivery only, `"tcp"` for a TCP container
+    :param addr: address of the container, for TCP a `(host, port)` tuple
+    """
+    match transport:
+        case "local":
+            return LocalContainer(addr, copy_internal_messages=copy_internal_messages)
+        case "tcp":
+            return mango.create_tcp_container(
+                addr=addr,
+                codec=create_codec(),
+                copy_internal_messages=copy_internal_messages,
+            )
+        case _:
+            msg = f"unknown transport: {transport}"
+            raise ValueError(msg)
+
+
+async def cancel_handlers(agents: Iterable[mango.Agent]):
+    """
+    Cancel all message handlers still running after every agent resolved.
+
+    Agents may still forward messages after every agent resolved.
+    Mango cancels these handlers on shutdown as well, but fails if handlers finish 
+    while it cancels the others.
+    Therefore cancel them beforehand, until no agent schedules any new handler.
+    Handlers cancelled before they started never ran their coroutine, which is closed 
+    to not warn about it never being awaited.
+    """
+    agents = list(agents)
+    while True:
+        scheduled = [
+            (task, coro)
+            for agent in agents
+            for _, task, coro, _ in agent.scheduler._scheduled_tasks
+            if not task.done()
+        ]
+        if not scheduled:
+            return
+        for task, _ in scheduled:
+            task.cancel()
+        await asyncio.gather(*(task for task, _ in scheduled), return_exceptions=True)
+        for _, coro in scheduled:
+            # suspendable tasks wrap the coroutine
+            getattr(coro, "_coro", coro).close()
+
+
+async def drain(
+    container: mango.container.core.Container, agents: Iterable[mango.Agent]
+):
+    """
+    Cancel all message handlers and drop all undelivered messages until every agent is 
+    idle.
+
+    Agents that handle more than one line failure must not receive messages of the 
+    last failure, e.g. a late `SwitchRequest` would switch the wrong switch once the 
+    switches were numbered again.
+    Messages still in transit over TCP are not covered.
+    """
+    agents = list(agents)
+    while True:
+        await cancel_handlers(agents)
+        dropped = 0
+        inboxes = [agent.inbox for agent in agents]
+        if container.inbox is not None:
+            inboxes.append(container.inbox)
+        for inbox in inboxes:
+            while not inbox.empty():
+                inbox.get_nowait()
+                inbox.task_done()
+                dropped += 1
+        if not dropped:
+            return
+        # let the dropped messages' deliveries finish before checking again
+        await asyncio.sleep(0)
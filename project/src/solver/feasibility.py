@@ -0,0 +1,322 @@
+import math
+from collections import deque
+
+import numpy as np
+from pandapower import pandapowerNet
+
+from .switch_set import SwitchSet
+
+MAX_LOADING = 1.0
+"Maximum loading of a line or transformer relative to its rating."
+
+MIN_VM_PU = 0.9
+"Minimum voltage of a bus in per unit."
+
+
+class FeasibilityCheck:
+    """
+    Estimate whether switching an option keeps the network within its limits, without
+    running a power flow.
+
+    `core.evaluate` runs an AC power flow, which does not converge if an option
+    overloads the network far enough.
+    Instead of one AC power flow per candidate option, this linearizes the power flow
+    of the radial network (LinDistFlow): every reconnected bus is fed along a single
+    path, each branch carries the loads behind it and the voltage drops by
+    `(r * p + x * q) / vn²` along the path.
+    Flows and voltages of the connected busses are taken from the last power flow,
+    switching an option only adds the loads it reconnects along the feeder to the
+    external grid.
+
+    The branch data and the feeding path of every connected bus are vectorized into
+    arrays on the first check of an epoch, checking an option only walks the affected
+    feeder and the results are cached per option.
+    Running a new power flow does not update the check, call `invalidate` to start a
+    new epoch.
+    Lines, two-winding transformers and bus-bus switches are modelled, meshes are
+    treated as if radial.
+    """
+    net: pandapowerNet
+    switch_lines: np.ndarray
+    "Index in `net.line` of the switchable line of every switch id."
+    max_loading: float
+    min_vm_pu: float
+    epoch: int
+    "Incremented on every `invalidate`."
+
+    _loaded: bool
+    _switch_branches: np.ndarray
+    "Branch of the switchable line of every switch id."
+    _from: np.ndarray
+    _to: np.ndarray
+    _r: np.ndarray
+    "Resistance of every branch in ohm."
+    _x: np.ndarray
+    "Reactance of every branch in ohm."
+    _vn: np.ndarray
+    "Voltage level of the impedance of every branch in kV."
+    _rating: np.ndarray
+    "Rated apparent power of every branch in MVA."
+    _p: np.ndarray
+    "Active power of every branch in the last power flow in MW."
+    _q: np.ndarray
+    "Reactive power of every branch in the last power flow in Mvar."
+    _load_p: np.ndarray
+    "Active power demand of every bus in MW."
+    _load_q: np.ndarray
+    "Reactive power demand of every bus in Mvar."
+    _vm: np.ndarray
+    "Voltage of every bus in the last power flow in per unit, `nan` if disconnected."
+    _adjacency: list[list[tuple[int, int]]]
+    "Neighboring bus and branch of every bus via closed branches."
+    _feeder: np.ndarray
+    "Branch feeding every connected bus from the external grid, `-1` for none."
+    _parent: np.ndarray
+    "Bus on the other side of the feeding branch, `-1` for none."
+    _cache: dict[int, bool]
+
+    def __init__(
+        self,
+        net: pandapowerNet,
+        switch_lines: np.ndarray,
+        max_loading: float = MAX_LOADING,
+        min_vm_pu: float = MIN_VM_PU,
+    ):
+        """
+        :param switch_lines: index in `net.line` of the switchable line of every switch
+            id, e.g. `CompactTopology.switches`
+        """
+        self.net = net
+        self.switch_lines = switch_lines
+        self.max_loading = max_loading
+        self.min_vm_pu = min_vm_pu
+        self.epoch = 0
+        self._loaded = False
+        self._cache = {}
+
+    def invalidate(self):
+        """Start a new epoch, the results are loaded again on the next check."""
+        self.epoch += 1
+        self._loaded = False
+        self._cache.clear()
+
+    def _load(self):
+        net = self.net
+        buses = net.bus.index
+        vn_bus = net.bus.vn_kv.to_numpy(dtype=float)
+        self._vm = np.full(len(buses), np.nan)
+        positions = buses.get_indexer(net.res_bus.index)
+        found = positions >= 0
+        self._vm[positions[found]] = net.res_bus.vm_pu.to_numpy(dtype=float)[found]
+
+        self._load_p = np.zeros(len(buses))
+        self._load_q = np.zeros(len(buses))
+        for table, sign in [(net.load, 1), (net.sgen, -1)]:
+            active = table[table.in_service.to_numpy(dtype=bool)]
+            at = buses.get_indexer(active.bus)
+            scaling = active.scaling.to_numpy(dtype=float)
+            np.add.at(self._load_p, at, sign * scaling * active.p_mw.to_numpy(float))
+            np.add.at(self._load_q, at, sign * scaling * active.q_mvar.to_numpy(float))
+
+        switch = net.switch
+        open_switch = ~switch.closed.to_numpy(dtype=bool)
+
+        def opened(et: str) -> np.ndarray:
+            return switch.element.to_numpy()[open_switch & (switch.et == et).to_numpy()]
+
+        line = net.line
+        parallel = line.parallel.to_numpy(dtype=float)
+        line_from = buses.get_indexer(line.from_bus)
+        line_vn = vn_bus[line_from]
+        line_p, line_q = self._results(net, "res_line", "p_from_mw", "q_from_mvar")
+        line_closed = line.in_service.to_numpy(dtype=bool) & ~np.isin(
+            line.index, opened("l")
+        )
+
+        trafo = net.trafo
+        sn = trafo.sn_mva.to_numpy(dtype=float)
+        vn_lv = trafo.vn_lv_kv.to_numpy(dtype=float)
+        z = trafo.vk_percent.to_numpy(dtype=float) / 100 * vn_lv**2 / sn
+        trafo_r = trafo.vkr_percent.to_numpy(dtype=float) / 100 * vn_lv**2 / sn
+        trafo_p, trafo_q = self._results(net, "res_trafo", "p_hv_mw", "q_hv_mvar")
+        trafo_parallel = trafo.parallel.to_numpy(dtype=float)
+        trafo_closed = trafo.in_service.to_numpy(dtype=bool) & ~np.isin(
+            trafo.index, opened("t")
+        )
+
+        bus_switch = switch[~open_switch & (switch.et == "b").to_numpy()]
+
+        self._from = np.concatenate(
+            [
+                line_from,
+                buses.get_indexer(trafo.hv_bus),
+                buses.get_indexer(bus_switch.bus),
+            ]
+        )
+        self._to = np.concatenate(
+            [
+                buses.get_indexer(line.to_bus),
+                buses.get_indexer(trafo.lv_bus),
+                buses.get_indexer(bus_switch.element),
+            ]
+        )
+        self._r = np.concatenate(
+            [
+                line.r_ohm_per_km.to_numpy(float) * line.length_km.to_numpy(float)
+                / parallel,
+                trafo_r / trafo_parallel,
+                np.zeros(len(bus_switch)),
+            ]
+        )
+        self._x = np.concatenate(
+            [
+                line.x_ohm_per_km.to_numpy(float) * line.length_km.to_numpy(float)
+                / parallel,
+                np.sqrt(np.maximum(z**2 - trafo_r**2, 0)) / trafo_parallel,
+                np.zeros(len(bus_switch)),
+            ]
+        )
+        self._vn = np.concatenate(
+            [line_vn, vn_lv, vn_bus[buses.get_indexer(bus_switch.bus)]]
+        )
+        self._rating = np.concatenate(
+            [
+                math.sqrt(3)
+                * line_vn
+                * line.max_i_ka.to_numpy(float)
+                * line.df.to_numpy(float)
+                * parallel,
+                sn * trafo_parallel,
+                np.full(len(bus_switch), np.inf),
+            ]
+        )
+        self._p = np.concatenate([line_p, trafo_p, np.zeros(len(bus_switch))])
+        self._q = np.concatenate([line_q, trafo_q, np.zeros(len(bus_switch))])
+        closed = np.concatenate(
+            [line_closed, trafo_closed, np.ones(len(bus_switch), dtype=bool)]
+        )
+        self._switch_branches = line.index.get_indexer(self.switch_lines)
+
+        self._adjacency = [[] for _ in range(len(buses))]
+        for branch in np.flatnonzero(closed):
+            from_bus, to_bus = int(self._from[branch]), int(self._to[branch])
+            self._adjacency[from_bus].append((to_bus, int(branch)))
+            self._adjacency[to_bus].append((from_bus, int(branch)))
+
+        # feeding paths of the connected busses, breadth first from the external grids
+        self._feeder = np.full(len(buses), -1)
+        self._parent = np.full(len(buses), -1)
+        slack = buses.get_indexer(net.ext_grid.bus[net.ext_grid.in_service])
+        visited = np.zeros(len(buses), dtype=bool)
+        visited[slack] = True
+        queue = deque(int(bus) for bus in slack)
+        while queue:
+            bus = queue.popleft()
+            for neighbor, branch in self._adjacency[bus]:
+                if visited[neighbor] or np.isnan(self._vm[neighbor]):
+                    continue
+                visited[neighbor] = True
+                self._feeder[neighbor] = branch
+                self._parent[neighbor] = bus
+                queue.append(neighbor)
+        self._loaded = True
+
+    @staticmethod
+    def _results(
+        net: pandapowerNet, table: str, p: str, q: str
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Absolute power flow of every element, zero without results."""
+        element = net[table.removeprefix("res_")]
+        results = net[table].reindex(element.index)
+        return (
+            np.nan_to_num(np.abs(results[p].to_numpy(dtype=float))),
+            np.nan_to_num(np.abs(results[q].to_numpy(dtype=float))),
+        )
+
+    def feasible(self, option: SwitchSet) -> bool:
+        """
+        Whether switching the option keeps every branch below `max_loading` and every
+        bus above `min_vm_pu`.
+
+        Branches and busses already violating their limit in the last power flow are
+        not held against the option.
+        """
+        if not self._loaded:
+            self._load()
+        if option.mask not in self._cache:
+            self._cache[option.mask] = self._check(option)
+        return self._cache[option.mask]
+
+    def _check(self, option: SwitchSet) -> bool:
+        candidates = self._switch_branches[[sid.index for sid in option]]
+        adjacency: dict[int, list[tuple[int, int]]] = {}
+        for branch in candidates:
+            from_bus, to_bus = int(self._from[branch]), int(self._to[branch])
+            adjacency.setdefault(from_bus, []).append((to_bus, int(branch)))
+            adjacency.setdefault(to_bus, []).append((from_bus, int(branch)))
+
+        # feeding tree of the reconnected busses, rooted at connected busses
+        parent: dict[int, tuple[int, int]] = {}
+        order = []
+        roots = [bus for bus in adjacency if not np.isnan(self._vm[bus])]
+        queue = deque(roots)
+        while queue:
+            bus = queue.popleft()
+            for neighbor, branch in self._adjacency[bus] + adjacency.get(bus, []):
+                if not np.isnan(self._vm[neighbor]) or neighbor in parent:
+                    continue
+                parent[neighbor] = (bus, branch)
+                order.append(neighbor)
+                queue.append(neighbor)
+
+        # loads behind every branch of the tree
+        p = {bus: self._load_p[bus] for bus in order}
+        q = {bus: self._load_q[bus] for bus in order}
+        added_p = dict.fromkeys(roots, 0.0)
+        added_q = dict.fromkeys(roots, 0.0)
+        for bus in reversed(order):
+            upstream, branch = parent[bus]
+            if not self._within_rating(branch, p[bus], q[bus]):
+                return False
+            target_p, target_q = (p, q) if upstream in p else (added_p, added_q)
+            target_p[upstream] += p[bus]
+            target_q[upstream] += q[bus]
+
+        # the loads are additionally fed along the feeder of every root
+        delta_p = np.zeros(len(self._r))
+        delta_q = np.zeros(len(self._r))
+        for root in roots:
+            bus = root
+            while self._feeder[bus] >= 0:
+                delta_p[self._feeder[bus]] += added_p[root]
+                delta_q[self._feeder[bus]] += added_q[root]
+                bus = self._parent[bus]
+        touched = np.flatnonzero((delta_p != 0) | (delta_q != 0))
+        limit = self.max_loading * self._rating[touched]
+        loading = np.hypot(
+            self._p[touched] + delta_p[touched], self._q[touched] + delta_q[touched]
+        )
+        overloaded = np.hypot(self._p[touched], self._q[touched]) > limit
+        if np.any((loading > limit) & ~overloaded):
+            return False
+
+        drop = (self._r * delta_p + self._x * delta_q) / self._vn**2
+        vm = {}
+        for root in roots:
+            bus, vm[root] = root, self._vm[root]
+            while self._feeder[bus] >= 0:
+                vm[root] -= drop[self._feeder[bus]]
+                bus = self._parent[bus]
+            if vm[root] < self.min_vm_pu <= self._vm[root]:
+                return False
+        for bus in order:
+            upstream, branch = parent[bus]
+            vm[bus] = vm[upstream] - (
+                self._r[branch] * p[bus] + self._x[branch] * q[bus]
+            ) / self._vn[branch] ** 2
+            if vm[bus] < self.min_vm_pu:
+                return False
+        return True
+
+    def _within_rating(self, branch: int, p: float, q: float) -> bool:
+        return math.hypot(p, q) <= self.max_loading * self._rating[branch]
@@ -1,6 +1,79 @@
+import contextlib
+import itertools
 import uuid
-from typing import Self
+from collections.abc import Iterator
 from functools import total_ordering
+from typing import Protocol, Self
+
+SEQUENCE_BITS = 32
+"Number of low bits of a counter based ID key used for the sequence number."
+
+
+class IdSource(Protocol):
+    """Source of the integer keys that make IDs unique."""
+
+    def __call__(self) -> int: ...
+
+
+class UuidIdSource:
+    """
+    Random 32 bit keys derived from `uuid.uuid4`.
+
+    This is unique across processes without any coordination but comparatively slow.
+    """
+
+    def __call__(self) -> int:
+        return uuid.uuid4().int >> (128 - SEQUENCE_BITS)
+
+
+class CounterIdSource:
+    """
+    Monotonic keys packed as `(origin, sequence)`.
+
+    The sequence is a simple counter, the origin distinguishes multiple sources, e.g. 
+    one per process, which would otherwise generate the same keys.
+    """
+    __slots__ = ("_origin", "_sequence")
+
+    _origin: int
+    _sequence: itertools.count
+
+    def __init__(self, origin: int = 0):
+        self._origin = origin << SEQUENCE_BITS
+        self._sequence = itertools.count()
+
+    def __call__(self) -> int:
+        return self._origin | next(self._sequence)
+
+
+_id_source: IdSource = CounterIdSource()
+
+
+def set_id_source(source: IdSource):
+    """
+    Replace the source used for all IDs created from now on.
+
+    IDs from different sources are only guaranteed to be unique if the sources are, 
+    e.g. counter sources need distinct origins.
+    """
+    global _id_source
+    _id_source = source
+
+
+@contextlib.contextmanager
+def use_id_source(source: IdSource) -> Iterator[None]:
+    """
+    Use the source for all IDs created within the context.
+
+    Afterwards the previous source is used again, e.g. for the next solve of the same 
+    process.
+    """
+    previous = _id_source
+    set_id_source(source)
+    try:
+        yield
+    finally:
+        set_id_source(previous)
 
 
 @total_ordering
@@ -10,12 +83,31 @@ class Id:
 
     Comparing two IDs of different types will throw an `IncompatibleIdError` to ensure 
     that no two ID types are used in the same location.
+
+    Internally every ID is an integer key from the current `IdSource`, which keeps 
+    comparing and hashing IDs cheap.
     """
-    _value: str
+    __slots__ = ("_key", "_prefix")
+
+    _prefix: str
+    _key: int
 
-    def __init__(self, prefix: str):
-        unique = str(uuid.uuid4()).split("-")[0]
-        self._value = f"{prefix}-{unique}"
+    def __init__(self, prefix: str, key: None | int = None):
+        self._prefix = prefix
+        self._key = _id_source() if key is None else key
+
+    @property
+    def _value(self) -> str:
+        origin = self._key >> SEQUENCE_BITS
+        sequence = self._key & ((1 << SEQUENCE_BITS) - 1)
+        if origin:
+            return f"{self._prefix}-{origin}.{sequence}"
+        return f"{self._prefix}-{sequence}"
+
+    @property
+    def key(self) -> int:
+        """Integer key of this ID, e.g. to encode it in a message."""
+        return self._key
 
     def __str__(self):
         return self._value
@@ -26,20 +118,20 @@ class Id:
     def __eq__(self, other: object):
         if type(self) is type(other):
             assert isinstance(other, Id)
-            return self._value == other._value
+            return self._key == other._key
         if isinstance(other, Id):
             raise IncompatibleIdError(self, other)
         return NotImplemented
 
     def __lt__(self, other: Self):
         if type(self) is type(other):
-            return self._value < other._value
+            return self._key < other._key
         if isinstance(other, Id):
             raise IncompatibleIdError(self, other)
         return NotImplemented
     
     def __hash__(self):
-        return hash(self._value)
+        return hash(self._key)
 
 
 class IncompatibleIdError(Exception):
@@ -66,10 +158,32 @@ class IncompatibleIdError(Exception):
 
 
 class MessageId(Id):
-    def __init__(self):
-        super().__init__("message")
+    __slots__ = ()
+
+    def __init__(self, key: None | int = None):
+        super().__init__("message", key)
 
 
 class SwitchId(Id):
-    def __init__(self):
-        super().__init__("switch")
+    """
+    Densely numbered switch ID.
+
+    Switches are numbered at startup so that sets of switches can be encoded as 
+    bitmasks, see `SwitchSet`.
+    Two switch IDs with the same index are equal.
+    """
+    __slots__ = ()
+
+    def __init__(self, index: int):
+        super().__init__("switch", index)
+
+    @property
+    def index(self) -> int:
+        return self._key
+
+
+class BusId(Id):
+    __slots__ = ()
+
+    def __init__(self, key: None | int = None):
+        super().__init__("bus", key)
@@ -0,0 +1,71 @@
+import numpy as np
+from pandapower import pandapowerNet
+
+from core import BusMeasurement
+
+
+class ConnectivitySnapshot:
+    """
+    Connectivity of every bus, read from the power flow results once per epoch.
+
+    A `core.BusMeasurement` looks up `net.res_bus` via a scalar `.loc` on every access,
+    which is slow for busses that are asked many times per wave.
+    The snapshot instead loads the whole `vm_pu` column into an array on the first
+    access of an epoch, every further access is a plain array lookup.
+    Running a new power flow does not update the snapshot, call `invalidate` to start
+    a new epoch.
+    """
+    net: pandapowerNet
+    epoch: int
+    "Incremented on every `invalidate`."
+
+    _connected: None | np.ndarray
+
+    def __init__(self, net: pandapowerNet):
+        self.net = net
+        self.epoch = 0
+        self._connected = None
+
+    def invalidate(self):
+        """Start a new epoch, the results are loaded again on the next access."""
+        self.epoch += 1
+        self._connected = None
+
+    @property
+    def connected(self) -> np.ndarray:
+        """Whether every bus of `net.bus`, in table order, is connected."""
+        if self._connected is None:
+            res_bus = self.net.res_bus
+            vm_pu = res_bus["vm_pu"].to_numpy(dtype=float)
+            positions = res_bus.index.get_indexer(self.net.bus.index)
+            # busses without results are not connected
+            found = positions >= 0
+            self._connected = np.zeros(len(positions), dtype=bool)
+            self._connected[found] = ~np.isnan(vm_pu[positions[found]])
+        return self._connected
+
+    def measurements(self) -> list[BusMeasurement]:
+        """
+        One measurement per bus of `net.bus`, numbered like `core.to_components`.
+        """
+        return [SnapshotBusMeasurement(self, i) for i in range(len(self.net.bus))]
+
+
+class SnapshotBusMeasurement(BusMeasurement):
+    """
+    `BusMeasurement` reading the connectivity from a `ConnectivitySnapshot`.
+    """
+    _snapshot: ConnectivitySnapshot
+    _position: int
+
+    def __init__(self, snapshot: ConnectivitySnapshot, position: int):
+        super().__init__(self._vm_pu)
+        self._snapshot = snapshot
+        self._position = position
+
+    def _vm_pu(self) -> float:
+        return 1.0 if self.connected else np.nan
+
+    @property
+    def connected(self) -> bool:
+        return bool(self._snapshot.connected[self._position])
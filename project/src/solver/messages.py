@@ -1,13 +1,23 @@
-from dataclasses import dataclass
-from .ids import MessageId, SwitchId
+from dataclasses import dataclass, replace
 from typing import Self
 
-@dataclass
+from .ids import BusId, MessageId, SwitchId
+from .switch_set import SwitchSet
+
+
+@dataclass(frozen=True, slots=True)
 class Message:
-    """Base Message class to easily abstract that messages have a message id."""
+    """
+    Base Message class to easily abstract that messages have a message id.
+
+    All messages are immutable, this allows the container to pass them between agents 
+    without copying them.
+    Agents that want to change a message have to create a new one via 
+    `dataclasses.replace`.
+    """
     mid: MessageId
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ReachConnectionRequest(Message):
     """
     Request to reach a connection.
@@ -24,11 +34,10 @@ class ReachConnectionRequest(Message):
     bridged: bool
     "Initially this is set to `False`. When crossing a switch, this is set to `True`."
 
-    switches: set[SwitchId]
+    switches: SwitchSet
     "Switches that were passed in the request chain."
 
-
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ReachConnectionResponse(Message):
     """
     Response to a `ReachConnectionRequest`.
@@ -42,8 +51,13 @@ class ReachConnectionResponse(Message):
     The `switches` describe a set of all options and each option contains all the 
     switches that would need to be switched to reach connection.
     """
-    switches: set[frozenset[SwitchId]]
+    switches: frozenset[SwitchSet]
     reached: bool
+    hops: int = 0
+    """
+    Number of bus agents the request passed on behind the responder, `0` if it was 
+    answered right away, e.g. by a dead end.
+    """
 
     @classmethod
     def from_request(cls, request: ReachConnectionRequest, reached: bool) -> Self:
@@ -52,11 +66,20 @@ class ReachConnectionResponse(Message):
 
         return cls(
             mid=request.mid,
-            switches={frozenset(request.switches)} if reached else set(),
+            switches=frozenset((request.switches,)) if reached else frozenset(),
             reached=reached,
         )
 
-@dataclass
+    def merge(self, other: Self) -> Self:
+        """Merge the options of two responses to the same request."""
+        return replace(
+            self,
+            switches=self.switches | other.switches,
+            reached=self.reached or other.reached,
+            hops=max(self.hops, other.hops),
+        )
+
+@dataclass(frozen=True, slots=True)
 class SwitchRequest(Message):
     """
     A request to switch a switch to connect two busses.
@@ -70,7 +93,7 @@ class SwitchRequest(Message):
     """
     sid: SwitchId
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SwitchMessage(Message):
     """
     A status message that the switch agent has switched its switch.
@@ -84,3 +107,129 @@ class SwitchMessage(Message):
     specify a direct path back to the requester.
     """
     sid: SwitchId
+
+@dataclass(frozen=True, slots=True)
+class RouteAdvertisement(Message):
+    """
+    Distance-vector update announcing the best known route to a connected bus.
+
+    Connected bus agents advertise an empty route to their neighbors.
+    Switch agents add their switch id before passing an advertisement across their 
+    switch, and bus agents only pass an advertisement on if it improved their own route.
+    This way every agent only sends a message if its routing table actually changed.
+    """
+    switches: SwitchSet
+    "Switches that would need to be switched to reach the advertising connected bus."
+
+@dataclass(frozen=True, slots=True)
+class IslandElection(Message):
+    """
+    Candidate for the leader of a disconnected island.
+
+    Disconnected bus agents only pass on candidates smaller than their current leader,
+    while switch agents and connected bus agents drop this message.
+    Therefore the smallest bus id of every island spreads exactly across that island.
+    """
+    leader: BusId
+
+@dataclass(frozen=True, slots=True)
+class IslandDecision(Message):
+    """
+    Option chosen by the leader of a disconnected island.
+
+    The leader broadcasts its decision across its island so that the other bus agents 
+    know which switches to wait for without searching themselves.
+    If `switches` is `None`, no option was found.
+    """
+    leader: BusId
+    switches: None | SwitchSet
+
+@dataclass(frozen=True, slots=True)
+class BackupAdvertisement(Message):
+    """
+    Open switches leading out of the part of the network behind the sender.
+
+    Used to precompute backup routes in steady state: if the line between the sender 
+    and the receiver fails and the part behind the sender is disconnected, closing any 
+    of these switches reconnects it.
+    Switch agents advertise their own switch to both of their busses, bus agents 
+    advertise the symmetric difference of their own switches and what all other 
+    neighbors advertised, as switches with both ends behind the sender cancel out.
+    """
+    switches: SwitchSet
+    from_switch: bool
+    "Whether the sender is a switch agent, bus agents do not advertise back to them."
+
+@dataclass(frozen=True, slots=True)
+class PlanAnnouncement(Message):
+    """
+    Switches a disconnected bus agent committed to, announced to negotiate a joint plan.
+
+    Disconnected bus agents and switch agents pass the announcement on once, connected 
+    bus agents drop it, so it spreads across the disconnected islands and the switches 
+    between them.
+    Nested islands behind the announcing island reuse these switches instead of 
+    searching for their own way to a connected bus.
+    """
+    switches: SwitchSet
+
+@dataclass(frozen=True, slots=True)
+class QuiescenceProbe(Message):
+    """
+    Wave counting the `RouteAdvertisement`s and `IslandElection`s sent to and received 
+    by the agents taking part in the wave.
+
+    Disconnected bus agents pass the probe on to their other neighbors once and answer 
+    with a `QuiescenceReport` when all of them answered, like a 
+    `ReachConnectionRequest`.
+    Switch agents only pass it on if the wave is `bridged`.
+    Connected bus agents and switch agents not passing it on answer right away with the 
+    messages they sent to the prober, so a wave stays within the disconnected part of 
+    the network.
+    Further copies of the same probe are answered right away with nothing counted.
+    """
+    origin: BusId
+    """
+    Bus agent that started the wave, waves of larger origins die out at agents that 
+    passed on a wave of a smaller origin before.
+    """
+    bridged: bool
+    "Whether the wave spreads across switch agents into other islands."
+
+@dataclass(frozen=True, slots=True)
+class QuiescenceReport(Message):
+    """
+    Response to a `QuiescenceProbe`.
+
+    It backtracks to the agent that started the probe, summing up the counters of every 
+    agent the probe passed.
+    """
+    sent: int
+    received: int
+    complete: bool = True
+    "Whether every agent answered in time, incomplete counters prove nothing."
+    outside: bool = False
+    "Whether the sender does not take part in the wave, only set by the sender itself."
+    extinct: bool = False
+    "Whether the wave met an agent that passed on a wave of a smaller origin."
+
+    def merge(self, other: Self) -> Self:
+        """Add the counters of another report to the same probe."""
+        return replace(
+            self,
+            sent=self.sent + other.sent,
+            received=self.received + other.received,
+            complete=self.complete and other.complete,
+            extinct=self.extinct or other.extinct,
+        )
+
+@dataclass(frozen=True, slots=True)
+class RoutesSettled(Message):
+    """
+    Announcement that no `RouteAdvertisement` is on its way anymore.
+
+    Sent by the bus agent whose `QuiescenceProbe`s detected it, disconnected bus agents 
+    and switch agents pass it on once, connected bus agents drop it.
+    Other bus agents waiting for their routes to settle answer from their table once 
+    they received it.
+    """
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Any, Self
+
+import networkx as nx
+from matplotlib.collections import PathCollection
+from matplotlib.figure import Figure
+
+log = logging.getLogger(__name__)
+
+LAYOUT_CACHE = ".layout_cache"
+"Default directory of the cached topology layouts."
+
+Layout = dict[Any, tuple[float, float]]
+Snapshot = tuple[str, list[str]]
+"Path to render to and the color of every node at the time of the snapshot."
+
+
+def node_key(node: Any) -> str:
+    """Stable name of a topology node, e.g. `bus-3`."""
+    return f"{node[0]}-{node[1]}"
+
+
+def node_color(node: Any, nodedata: dict[str, Any]) -> str:
+    """
+    Select a color for every node.
+
+    - Connected busses: green
+    - Disconnected busses: red
+    - Open switches: blue
+    - Closed switches: yellow
+
+    Raises a `ValueError` if the graph contained a node of unknown type.
+    """
+    if node[0] == "bus" and nodedata["bus_measurement"].connected:
+        return "#4CAF50"
+    elif node[0] == "bus":
+        return "#E53935"
+    elif node[0] == "switch" and nodedata["switch"].is_switched():
+        return "#FDD835"
+    elif node[0] == "switch":
+        return "#1E88E5"
+    else:
+        msg = f"unknown node type: {node[0]}"
+        raise ValueError(msg)
+
+
+def topology_fingerprint(topology: nx.Graph) -> str:
+    """
+    Hash of the nodes and edges of a topology, equal topologies get equal layouts.
+    """
+    nodes = sorted(node_key(node) for node in topology.nodes)
+    edges = sorted(sorted((node_key(u), node_key(v))) for u, v in topology.edges)
+    data = json.dumps([nodes, edges], separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def cached_layout(topology: nx.Graph, cache: None | str = LAYOUT_CACHE) -> Layout:
+    """
+    Layout the topology with graphviz, reusing the layout cached for its fingerprint.
+
+    Running graphviz takes far longer than drawing, therefore every layout is cached
+    on disk in `cache`.
+
+    :param cache: directory of the cached layouts, `None` disables caching
+    """
+    if cache is None:
+        return nx.nx_pydot.graphviz_layout(topology)
+
+    path = os.path.join(cache, f"{topology_fingerprint(topology)}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            positions = json.load(f)
+        return {node: tuple(positions[node_key(node)]) for node in topology.nodes}
+
+    layout = nx.nx_pydot.graphviz_layout(topology)
+    os.makedirs(cache, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({node_key(node): pos for node, pos in layout.items()}, f)
+    return layout
+
+
+class TopologyRenderer:
+    """
+    Render snapshots of the communication topology in a background thread.
+
+    Taking a snapshot only reads the current color of every node, layouting and
+    drawing happens in the background so the agents do not have to wait for it.
+    The topology is layouted and drawn only once, every further snapshot just
+    recolors the nodes of the existing figure.
+    Figures are drawn without `pyplot`, which is not thread-safe.
+    """
+    topology: nx.Graph
+    cache: None | str
+    dpi: int
+
+    _snapshots: queue.Queue[None | Snapshot]
+    _figure: None | Figure
+    _nodes: None | PathCollection
+    _worker: None | threading.Thread
+
+    def __init__(
+        self, topology: nx.Graph, *, cache: None | str = LAYOUT_CACHE, dpi: int = 300
+    ):
+        self.topology = topology
+        self.cache = cache
+        self.dpi = dpi
+        self._snapshots = queue.Queue()
+        self._figure = None
+        self._nodes = None
+        self._worker = None
+
+    def snapshot(self, path: str):
+        """Render the current state of the topology to `path`."""
+        colors = [
+            node_color(node, nodedata) for node, nodedata in self.topology.nodes.items()
+        ]
+        self._snapshots.put((path, colors))
+
+    def start(self):
+        """
+        Start the background worker, snapshots taken before are rendered now.
+
+        Forking a process while the worker runs is unsafe, therefore start it only
+        after every process was forked.
+        """
+        self._worker = threading.Thread(target=self._render_loop, daemon=True)
+        self._worker.start()
+
+    def close(self):
+        """
+        Stop the background worker after it rendered every snapshot.
+
+        If the worker was not started yet, it is started to render the snapshots.
+        """
+        if self._worker is None:
+            self.start()
+        assert self._worker is not None
+        self._snapshots.put(None)
+        self._worker.join()
+        self._worker = None
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object):
+        self.close()
+
+    def _render_loop(self):
+        while (snapshot := self._snapshots.get()) is not None:
+            try:
+                self._render(*snapshot)
+            except Exception:
+                log.exception(f"failed to render {snapshot[0]}")
+
+    def _render(self, path: str, colors: list[str]):
+        if self._figure is None or self._nodes is None:
+            self._figure = Figure()
+            ax = self._figure.add_subplot()
+            ax.set_axis_off()
+            pos = cached_layout(self.topology, self.cache)
+            self._nodes = nx.draw_networkx_nodes(
+                self.topology, pos, ax=ax, node_color=colors, node_size=300
+            )
+            nx.draw_networkx_edges(self.topology, pos, ax=ax, edge_color="gray")
+            nx.draw_networkx_labels(
+                self.topology,
+                pos,
+                ax=ax,
+                labels={node: node[1] for node in self.topology.nodes},
+                font_size=10,
+            )
+        else:
+            self._nodes.set_facecolor(colors)
+        # save with high resolution
+        self._figure.savefig(path, dpi=self.dpi, bbox_inches="tight")
@@ -0,0 +1,417 @@
+"""
+Replay a recorded message trace into the agents on a virtual clock.
+
+The trace has to be recorded with payloads, e.g. `solve(..., trace_payload=True)`.
+Run from the `src` directory, with the trace files of all shards:
+
+    python -m solver.replay transfers*.jsonl --profile
+"""
+
+import argparse
+import asyncio
+import contextlib
+import cProfile
+import io
+import json
+import math
+import pstats
+import selectors
+import time
+from collections import Counter, defaultdict, deque
+from collections.abc import Iterable
+from dataclasses import dataclass, replace
+from typing import Any
+
+import mango
+
+from core import BusMeasurement, Switch
+
+from .agents import RESPONSE_TIMEOUT, Agent, BusAgent, SwitchAgent
+from .container import LocalContainer, cancel_handlers
+from .ids import CounterIdSource, MessageId, use_id_source
+from .messages import Message
+from .tracing import load_payload, trace_cause
+
+REPLAY_ADDRESS = ("replay", 0)
+"Address of the replay container, it never opens a socket."
+REPLAY_ID_ORIGIN = 1 << 16
+"Origin of the ids created during a replay, distinct from every recorded origin."
+
+SentMessage = tuple[str, str, str, str]
+"Sender, receiver, message type and message id of a sent message."
+
+
+def stub_bus(connected: bool) -> BusMeasurement:
+    """`BusMeasurement` with a fixed state instead of a pandapower net."""
+    vm_pu = 1.0 if connected else math.nan
+    return BusMeasurement(lambda: vm_pu)
+
+
+def stub_switch(closed: bool) -> Switch:
+    """`Switch` keeping its state itself instead of in a pandapower net."""
+
+    def get() -> bool:
+        return closed
+
+    def set(value: bool):
+        nonlocal closed
+        closed = value
+
+    return Switch((get, set))
+
+
+@dataclass(frozen=True, slots=True)
+class ReplayedMessage:
+    """
+    A recorded message to be delivered during a replay.
+    """
+    id: int
+    parent: None | int
+    time: float
+    sender: str
+    receiver: str
+    message: Message
+
+
+@dataclass(frozen=True, slots=True)
+class ReplayResult:
+    delivered: int
+    "Number of recorded messages delivered to the agents."
+    sent: list[SentMessage]
+    """
+    Messages sent by the agents, with the message ids translated to the recorded ones.
+    """
+    missing: list[SentMessage]
+    "Recorded messages the agents did not send again."
+    extra: list[SentMessage]
+    "Messages the agents sent which were not recorded."
+    truncated: list[SentMessage]
+    """
+    Messages caused by the last recorded messages, the recorded run already ended 
+    before sending them.
+    """
+    virtual_time: float
+    "Duration of the replay on the virtual clock."
+
+    @property
+    def reproduced(self) -> bool:
+        """Whether the agents sent exactly the recorded messages."""
+        return not self.missing and not self.extra
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """
+    Selector which advances the virtual clock instead of waiting.
+    """
+
+    def __init__(self, loop: "VirtualClockEventLoop"):
+        super().__init__()
+        self._loop = loop
+
+    def select(self, timeout: None | float = None):
+        if timeout is None:
+            raise RuntimeError("replay is stuck, no task will ever wake up")
+        self._loop.advance(timeout)
+        return super().select(0)
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose clock jumps to the next timer whenever no task is ready.
+
+    Sleeps and timeouts therefore take no wall time, while everything still happens
+    in the same order as on a real clock.
+    """
+    _virtual_time: float
+
+    def __init__(self):
+        self._virtual_time = 0.0
+        super().__init__(_VirtualSelector(self))
+
+    def time(self) -> float:
+        return self._virtual_time
+
+    def advance(self, seconds: float):
+        self._virtual_time += seconds
+
+
+class ReplayContainer(LocalContainer):
+    """
+    Container which hands every sent message to the replay instead of delivering it.
+    """
+
+    def __init__(self, replay: "Replay"):
+        super().__init__(REPLAY_ADDRESS)
+        self._replay = replay
+
+    async def send_message(
+        self,
+        content: Any,
+        receiver_addr: mango.AgentAddress,
+        sender_id: None | str = None,
+        **kwargs,
+    ) -> bool:
+        self._replay.capture(sender_id, receiver_addr.aid, content)
+        return True
+
+
+class Replay:
+    """
+    Deterministic replay of a recorded trace without a real container or network.
+
+    The agents are recreated from the trace annotations with stub `BusMeasurement`s 
+    and `Switch`es.
+    Every recorded message is delivered to the handlers of its receiver at its 
+    recorded time on a virtual clock, while the messages the agents send are only 
+    collected and compared against the recorded ones.
+    Like a real run, the replay ends as soon as every agent resolved.
+
+    Agents originate messages with fresh ids, therefore the first message an agent 
+    originates of a type is matched to the first recorded message that agent 
+    originated of that type, and so on.
+    Recorded messages are delivered with the matching ids of the replay, a recorded 
+    message is postponed until its originator originated the matching message.
+    """
+    agents: list[dict[str, Any]]
+    messages: list[ReplayedMessage]
+
+    _replayed: dict[str, Agent]
+    _originators: dict[MessageId, str]
+    _originated: dict[tuple[str, str], deque[MessageId]]
+    _to_recorded: dict[MessageId, MessageId]
+    _to_replayed: dict[MessageId, MessageId]
+    _postponed: dict[MessageId, list[ReplayedMessage]]
+    _delivered: int
+    _leaves: set[int]
+    "Trace ids of the recorded messages which caused no recorded message."
+    _sent: list[SentMessage]
+    _truncated: list[SentMessage]
+    _last_sent_at: float
+
+    def __init__(self, agents: list[dict[str, Any]], messages: list[ReplayedMessage]):
+        self.agents = agents
+        self.messages = sorted(messages, key=lambda message: message.time)
+
+    @classmethod
+    def load(cls, paths: Iterable[str]) -> "Replay":
+        """
+        Load a replay from one or more trace files, e.g. of all shards.
+        """
+        agents = []
+        messages = []
+        for path in paths:
+            with open(path) as f:
+                for line in f:
+                    data = json.loads(line)
+                    if "agent" in data:
+                        agents.append(data)
+                        continue
+                    if "payload" not in data:
+                        msg = f"{path} was traced without payloads, cannot replay it"
+                        raise ValueError(msg)
+                    messages.append(
+                        ReplayedMessage(
+                            id=data["id"],
+                            parent=data["parent"],
+                            time=data["time"],
+                            sender=data["sender"],
+                            receiver=data["receiver"],
+                            message=load_payload(data["payload"]),
+                        )
+                    )
+        return cls(agents, messages)
+
+    def run(self) -> ReplayResult:
+        """
+        Replay the trace.
+
+        Ids created during the replay come from a fresh counter, so repeated replays 
+        behave exactly the same.
+        Afterwards the previous id source is used again.
+        """
+        self._originators = {}
+        self._originated = defaultdict(deque)
+        self._to_recorded = {}
+        self._to_replayed = {}
+        self._postponed = defaultdict(list)
+        self._delivered = 0
+        self._leaves = {m.id for m in self.messages} - {
+            m.parent for m in self.messages
+        }
+        self._sent = []
+        self._truncated = []
+        self._last_sent_at = 0.0
+        for message in self.messages:
+            mid = message.message.mid
+            if mid not in self._originators:
+                # the first record of a message id is sent by its originator
+                self._originators[mid] = message.sender
+                key = (message.sender, type(message.message).__name__)
+                self._originated[key].append(mid)
+
+        with (
+            use_id_source(CounterIdSource(origin=REPLAY_ID_ORIGIN)),
+            asyncio.Runner(loop_factory=VirtualClockEventLoop) as runner,
+        ):
+            virtual_time = runner.run(self._run())
+
+        recorded = Counter(
+            (m.sender, m.receiver, type(m.message).__name__, str(m.message.mid))
+            for m in self.messages
+        )
+        sent = Counter(self._sent)
+        return ReplayResult(
+            delivered=self._delivered,
+            sent=self._sent,
+            missing=sorted((recorded - sent).elements()),
+            extra=sorted((sent - recorded).elements()),
+            truncated=self._truncated,
+            virtual_time=virtual_time,
+        )
+
+    def capture(self, sender: None | str, receiver: str, message: Message):
+        """
+        Collect a message sent by an agent, translated to the recorded message id.
+        """
+        assert sender is not None, "replayed agents always send as an agent"
+        mid = message.mid
+        if mid not in self._originators and mid not in self._to_recorded:
+            # the agent originated this message
+            recorded = self._originated.get((sender, type(message).__name__))
+            if recorded:
+                recorded_mid = recorded.popleft()
+                self._to_recorded[mid] = recorded_mid
+                self._to_replayed[recorded_mid] = mid
+                for postponed in self._postponed.pop(recorded_mid, ()):
+                    self._deliver(postponed)
+        recorded_mid = self._to_recorded.get(mid, mid)
+        sent = (sender, receiver, type(message).__name__, str(recorded_mid))
+        if trace_cause.get() in self._leaves:
+            self._truncated.append(sent)
+        else:
+            self._sent.append(sent)
+        self._last_sent_at = asyncio.get_running_loop().time()
+
+    def _create_agents(self) -> dict[str, Agent]:
+        agents: dict[str, Agent] = {}
+        for record in self.agents:
+            neighbors = {
+                mango.AgentAddress(REPLAY_ADDRESS, aid) for aid in record["neighbors"]
+            }
+            match record["kind"]:
+                case "BusAgent":
+                    agents[record["agent"]] = BusAgent(
+                        neighbors=neighbors,
+                        bus=stub_bus(record["connected"]),
+                        bid=load_payload(record["bid"]),
+                        max_in_flight=record["max_in_flight"],
+                        routing=record["routing"],
+                        election=record["election"],
+                        option_limit=record["option_limit"],
+                        adaptive_timeout=record["adaptive_timeout"],
+                        backup_decides=record["backup_decides"],
+                        backup=load_payload(record["backup"]),
+                        negotiate=record["negotiate"],
+                    )
+                case "SwitchAgent":
+                    agents[record["agent"]] = SwitchAgent(
+                        neighbors=neighbors,
+                        switch=stub_switch(record["closed"]),
+                        sid=load_payload(record["sid"]),
+                        max_in_flight=record["max_in_flight"],
+                    )
+                case kind:
+                    raise ValueError(f"cannot replay agent of kind {kind}")
+        return agents
+
+    def _deliver(self, message: ReplayedMessage):
+        content = message.message
+        if content.mid not in self._to_replayed:
+            if self._originators[content.mid] in self._replayed:
+                # the replayed originator did not send this message yet
+                self._postponed[content.mid].append(message)
+                return
+        else:
+            content = replace(content, mid=self._to_replayed[content.mid])
+        meta = {
+            "sender_id": message.sender,
+            "sender_addr": REPLAY_ADDRESS,
+            "receiver_id": message.receiver,
+            "network_protocol": "replay",
+            "trace_id": message.id,
+        }
+        self._replayed[message.receiver].handle_message(content, meta)
+        self._delivered += 1
+
+    async def _run(self) -> float:
+        self._replayed = self._create_agents()
+        container = ReplayContainer(self)
+        for aid, agent in self._replayed.items():
+            container.register(agent, aid)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await container.start()
+        container.on_ready()
+
+        if self.messages:
+            first = self.messages[0].time
+            for message in self.messages:
+                if message.receiver not in self._replayed:
+                    continue
+                delay = start + message.time - first - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._deliver(message)
+
+        # like a real run, stop as soon as every agent resolved, waiting takes no wall 
+        # time on the virtual clock
+        resolved = (agent.resolved.wait() for agent in self._replayed.values())
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(asyncio.gather(*resolved), RESPONSE_TIMEOUT)
+        virtual_time = max(self._last_sent_at - start, 0.0)
+
+        await cancel_handlers(self._replayed.values())
+        await container.shutdown()
+        return virtual_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="trace files, e.g. of all shards")
+    parser.add_argument(
+        "--profile", action="store_true", help="profile the message handlers"
+    )
+    args = parser.parse_args()
+
+    replay = Replay.load(args.paths)
+    profile = cProfile.Profile() if args.profile else None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if profile is not None:
+            profile.enable()
+        result = replay.run()
+        if profile is not None:
+            profile.disable()
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"delivered {result.delivered} messages, agents sent {len(result.sent)} "
+        f"in {elapsed * 1000:.1f}ms wall time, "
+        f"{result.virtual_time * 1000:.1f}ms virtual time"
+    )
+    if result.reproduced:
+        print("agents sent exactly the recorded messages")
+    else:
+        print(f"{len(result.missing)} recorded messages were not sent again")
+        print(f"{len(result.extra)} sent messages were not recorded")
+    if result.truncated:
+        print(f"{len(result.truncated)} sent messages came after the recording ended")
+
+    if profile is not None:
+        stats = pstats.Stats(profile).sort_stats(pstats.SortKey.CUMULATIVE)
+        stats.print_stats("solver", 30)
+
+
+if __name__ == "__main__":
+    main()
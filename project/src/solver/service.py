@@ -0,0 +1,310 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Self
+
+import mango
+import mango.container.core
+from pandapower import pandapowerNet, runpp
+
+from core import Switch, get_value, set_value
+
+from . import ADDRESS, trace_container_messages
+from .agents import Agent, BusAgent, SwitchAgent
+from .container import Transport, create_container, drain
+from .feasibility import FeasibilityCheck
+from .ids import BusId, SwitchId
+from .measurements import ConnectivitySnapshot, SnapshotBusMeasurement
+from .topology import agent_id, cached_topology
+from .tracing import MessageTracer
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceEvent:
+    """
+    Outcome of a single line failure or restoration handled by a `SolverService`.
+    """
+    line: int
+    "Index of the failed or restored line in `net.line`."
+    closed: tuple[int, ...]
+    "Indices in `net.switch` of the switches closed by the agents."
+    opened: tuple[int, ...]
+    "Indices in `net.switch` of the switches opened again on a restoration."
+
+
+class SolverService:
+    """
+    Long-running multi-agent system reacting to a stream of line failures and
+    restorations.
+
+    `solver.solve` builds the topology, creates the agents and starts a container for
+    every single failure.
+    The service instead pays that setup once: the container keeps running and the
+    agents stay registered between events.
+    On every event the network is updated and a power flow is run, then the agents
+    get their new neighbors, e.g. after a switch closed the line behind it joins its
+    two busses directly, forget the last event and react to their refreshed
+    `BusMeasurement`s.
+    Agents for new nodes of the topology are registered on the fly, agents of vanished
+    nodes stay registered without neighbors.
+
+    Restoring a failed line opens the switches closed for its failure again, returning
+    to the configuration before the failure.
+
+    Events are handled one at a time::
+
+        async with SolverService(net) as service:
+            await service.fail_line(3)
+            await service.restore_line(3)
+    """
+    net: pandapowerNet
+    transport: Transport
+    address: tuple[str, int]
+    options: dict[str, Any]
+    "Keyword arguments of every created `BusAgent`, e.g. `routing`."
+    precheck: bool
+    "Whether bus agents share a `FeasibilityCheck` of the current event."
+    max_in_flight: None | int
+    snapshot: ConnectivitySnapshot
+    agents: dict[str, Agent]
+    switches: dict[int, Switch]
+    "Switch of every line switch, by index in `net.switch`."
+    workarounds: dict[int, tuple[int, ...]]
+    "Switches closed for the failure of every failed line."
+    events: list[ServiceEvent]
+    tracer: None | MessageTracer
+
+    _container: None | mango.container.core.Container
+    _outdated: bool
+    "Whether switches changed since the last power flow."
+
+    def __init__(
+        self,
+        net: pandapowerNet,
+        *,
+        routing: bool = False,
+        election: bool = False,
+        option_limit: None | int = None,
+        max_in_flight: None | int = None,
+        adaptive_timeout: bool = False,
+        negotiate: bool = False,
+        precheck: bool = False,
+        transport: Transport = "tcp",
+        address: tuple[str, int] = ADDRESS,
+        trace: None | str = None,
+    ):
+        """
+        See `solver.solve` for the options of the agents.
+
+        :param trace: path of the JSON lines message trace of all events, `None` 
+            disables tracing
+        """
+        self.net = net
+        self.transport = transport
+        self.address = address
+        self.options = {
+            "routing": routing,
+            "election": election,
+            "option_limit": option_limit,
+            "adaptive_timeout": adaptive_timeout,
+            "negotiate": negotiate,
+        }
+        self.precheck = precheck
+        self.max_in_flight = max_in_flight
+        self.snapshot = ConnectivitySnapshot(net)
+        self.agents = {}
+        self.switches = {}
+        self.workarounds = {}
+        self.events = []
+        self.tracer = None if trace is None else MessageTracer(trace)
+        self._container = None
+        self._outdated = False
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether all busses are connected.
+
+        Runs a power flow if the agents switched since the last one, events do not run 
+        it themselves as the next event runs a power flow anyway.
+        """
+        if self._outdated:
+            self._refresh()
+        return bool(self.snapshot.connected.all())
+
+    def _refresh(self):
+        runpp(self.net)
+        self.snapshot.invalidate()
+        self._outdated = False
+
+    async def start(self):
+        """
+        Start the container and resolve the current state of the network.
+        """
+        # messages are immutable, therefore they can be shared instead of copied
+        self._container = create_container(
+            self.transport, self.address, copy_internal_messages=False
+        )
+        if self.tracer is not None:
+            self.tracer.start()
+            trace_container_messages(self._container, self.tracer)
+        await self._container.start()
+        self._container.on_ready()
+        await self._update()
+
+    async def shutdown(self):
+        if self._container is None:
+            return
+        await self._container.shutdown()
+        self._container = None
+        if self.tracer is not None:
+            self.tracer.close()
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object):
+        await self.shutdown()
+
+    async def fail_line(self, line: int) -> ServiceEvent:
+        """
+        Take the line out of service and let the agents reconnect the busses.
+        """
+        self.net.line.loc[line, "in_service"] = False
+        closed = await self._update()
+        self.workarounds[line] = closed
+        return self._record(line, closed, ())
+
+    async def restore_line(self, line: int) -> ServiceEvent:
+        """
+        Put the line back into service and open the switches closed for its failure.
+
+        If opening them disconnects any bus, e.g. because another failure relies on
+        them as well, the agents reconnect it.
+        Switches closed for that are not opened on any later restoration.
+        """
+        self.net.line.loc[line, "in_service"] = True
+        opened = self.workarounds.pop(line, ())
+        for index in opened:
+            self.switches[index].switch(False)
+        closed = await self._update()
+        return self._record(line, closed, opened)
+
+    def _record(
+        self, line: int, closed: tuple[int, ...], opened: tuple[int, ...]
+    ) -> ServiceEvent:
+        event = ServiceEvent(line=line, closed=closed, opened=opened)
+        self.events.append(event)
+        log.info(f"{event}")
+        return event
+
+    async def _update(self) -> tuple[int, ...]:
+        """
+        Refresh the connectivity and the topology and wait until every agent resolved.
+
+        Afterwards all agents are idle until the next event.
+
+        :return: indices of the switches closed by the agents
+        """
+        assert self._container is not None, "service is not started"
+        self._refresh()
+        created = self._update_agents()
+        was_open = {
+            index for index, switch in self.switches.items() if not switch.is_switched()
+        }
+
+        for aid, agent in self.agents.items():
+            if aid in created:
+                continue
+            agent.reset()
+            if agent.neighbors or isinstance(agent, BusAgent):
+                agent.on_ready()
+            else:
+                # not part of the topology anymore
+                agent.resolved.set()
+        for aid in created:
+            # registering a running container calls `on_ready`
+            self._container.register(self.agents[aid], aid)
+
+        async with asyncio.TaskGroup() as tg:
+            for agent in self.agents.values():
+                tg.create_task(agent.resolved.wait())
+        # agents may still forward messages, e.g. a late `SwitchRequest` would close a 
+        # switch opened by the next restoration again
+        await drain(self._container, self.agents.values())
+
+        closed = tuple(
+            index for index in sorted(was_open) if self.switches[index].is_switched()
+        )
+        self._outdated = bool(closed)
+        return closed
+
+    def _update_agents(self) -> list[str]:
+        """
+        Give every agent the neighbors of its node in the current topology.
+
+        :return: ids of the agents created for new nodes, not yet registered
+        """
+        assert self._container is not None, "service is not started"
+        net = self.net
+        topology = cached_topology(net)
+        aids = [agent_id(node) for node in topology.nodes]
+        addresses = [mango.AgentAddress(self._container.addr, aid) for aid in aids]
+        bus_count = len(topology.buses)
+        # the switch components are numbered like `core.to_components`
+        open_switches = net.switch.index[~net.switch.closed.values.astype(bool)]
+        feasibility = None
+        if self.precheck:
+            feasibility = FeasibilityCheck(net, topology.switches)
+
+        created = []
+        for i, aid in enumerate(aids):
+            neighbors = {addresses[neighbor] for neighbor in topology.neighbors(i)}
+            agent = self.agents.get(aid)
+            if i < bus_count:
+                if agent is None:
+                    component = topology.bus_components[i]
+                    agent = BusAgent(
+                        neighbors=neighbors,
+                        bus=SnapshotBusMeasurement(self.snapshot, component),
+                        bid=BusId(),
+                        max_in_flight=self.max_in_flight,
+                        **self.options,
+                    )
+                    created.append(aid)
+                assert isinstance(agent, BusAgent)
+                agent.neighbors = neighbors
+                agent.feasibility = feasibility
+                self.agents[aid] = agent
+                continue
+
+            switch_index = i - bus_count
+            index = int(open_switches[topology.switch_components[switch_index]])
+            if index not in self.switches:
+                self.switches[index] = Switch(
+                    (get_value(net, index), set_value(net, index))
+                )
+            # number switches densely to allow encoding options as bitmasks
+            sid = SwitchId(switch_index)
+            if agent is None:
+                agent = SwitchAgent(
+                    neighbors=neighbors,
+                    switch=self.switches[index],
+                    sid=sid,
+                    max_in_flight=self.max_in_flight,
+                )
+                created.append(aid)
+            assert isinstance(agent, SwitchAgent)
+            agent.neighbors = neighbors
+            agent.switch = self.switches[index]
+            agent.sid = sid
+            self.agents[aid] = agent
+
+        current = set(aids)
+        for aid, agent in self.agents.items():
+            if aid not in current:
+                agent.neighbors = set()
+        return created
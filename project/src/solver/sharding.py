@@ -0,0 +1,54 @@
+from typing import Any
+
+import networkx as nx
+
+
+def partition_topology(
+    topology: nx.Graph, shards: int, seed: int = 0
+) -> list[set[Any]]:
+    """
+    Partition the communication topology into `shards` parts with few edges in between.
+
+    The topology is split recursively by Kernighan-Lin bisections, which minimize the 
+    edges cut between both halves.
+    Every cut edge later becomes a message between two processes, therefore the cut 
+    should be as small as possible.
+    A part meant for `k` shards is split into halves for `k // 2` and `k - k // 2` 
+    shards, sized in that ratio, so all parts are equally large, e.g. three parts of a 
+    third each instead of a half and two quarters.
+
+    :param shards: number of parts, fewer parts are returned if there are less nodes
+    :param seed: seed of the bisection to get reproducible partitions
+    :return: list of node sets, one per shard
+    """
+    return _bisect(topology, set(topology.nodes), shards, seed)
+
+
+def _bisect(
+    topology: nx.Graph, nodes: set[Any], shards: int, seed: int
+) -> list[set[Any]]:
+    shards = min(shards, len(nodes))
+    if shards < 2:
+        return [nodes]
+    left_shards = shards // 2
+    subgraph = topology.subgraph(nodes)
+    # start from a depth-first order, so the initial halves are mostly connected, the 
+    # bisection only swaps pairs of nodes and keeps the sizes of the halves
+    order = list(nx.dfs_preorder_nodes(subgraph))
+    size = round(len(nodes) * left_shards / shards)
+    size = min(max(size, left_shards), len(nodes) - (shards - left_shards))
+    left, right = nx.community.kernighan_lin_bisection(
+        subgraph, partition=(set(order[:size]), set(order[size:])), seed=seed
+    )
+    if len(left) != size:
+        # the halves are not returned in the order of the initial partition
+        left, right = right, left
+    return _bisect(topology, set(left), left_shards, seed) + _bisect(
+        topology, set(right), shards - left_shards, seed
+    )
+
+
+def shard_address(address: tuple[str, int], shard: int) -> tuple[str, int]:
+    """Address of the container of a shard, each shard uses its own port."""
+    host, port = address
+    return (host, port + shard)
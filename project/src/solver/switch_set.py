@@ -0,0 +1,111 @@
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any, Self
+
+from .ids import SwitchId
+
+
+class SwitchSet:
+    """
+    Immutable set of switches encoded as an integer bitmask.
+
+    Switches are numbered densely at startup, the switch with index `i` is represented 
+    by bit `i` of the mask.
+    This makes merging, subset checks and ordering plain integer operations and keeps 
+    copies of messages containing many options cheap.
+    """
+    __slots__ = ("_mask",)
+
+    _mask: int
+
+    def __init__(self, mask: int = 0):
+        self._mask = mask
+
+    @classmethod
+    def of(cls, sids: Iterable[SwitchId]) -> Self:
+        mask = 0
+        for sid in sids:
+            mask |= 1 << sid.index
+        return cls(mask)
+
+    @property
+    def mask(self) -> int:
+        return self._mask
+
+    @property
+    def sort_key(self) -> tuple[int, int]:
+        """
+        Sort key to compare options, smaller keys are better options.
+
+        Options with less switches are preferred, ties are broken by the mask itself.
+        The tie break is arbitrary but the same for every agent.
+        """
+        return (self._mask.bit_count(), self._mask)
+
+    def with_switch(self, sid: SwitchId) -> Self:
+        return type(self)(self._mask | (1 << sid.index))
+
+    def issubset(self, other: Self) -> bool:
+        return self._mask & ~other._mask == 0
+
+    def __or__(self, other: Self) -> Self:
+        return type(self)(self._mask | other._mask)
+
+    def __xor__(self, other: Self) -> Self:
+        return type(self)(self._mask ^ other._mask)
+
+    def __contains__(self, sid: object) -> bool:
+        if not isinstance(sid, SwitchId):
+            return False
+        return bool(self._mask >> sid.index & 1)
+
+    def __iter__(self) -> Iterator[SwitchId]:
+        mask = self._mask
+        while mask:
+            lowest = mask & -mask
+            yield SwitchId(lowest.bit_length() - 1)
+            mask ^= lowest
+
+    def __len__(self) -> int:
+        return self._mask.bit_count()
+
+    def __bool__(self) -> bool:
+        return self._mask != 0
+
+    def __eq__(self, other: object):
+        if isinstance(other, SwitchSet):
+            return self._mask == other._mask
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._mask)
+
+    def __repr__(self):
+        indices = ", ".join(str(sid.index) for sid in self)
+        return f"{self.__class__.__name__}({{{indices}}})"
+
+
+def minimal_options(
+    options: Iterable[SwitchSet],
+    limit: None | int = None,
+    key: None | Callable[[SwitchSet], Any] = None,
+) -> frozenset[SwitchSet]:
+    """
+    Drop all options that are dominated by another option.
+
+    An option is dominated if a better ranked option is a strict subset of it, as 
+    switching the smaller option is always enough.
+    If `limit` is given, only the `limit` best options are kept.
+    The best option according to `key`, by default `SwitchSet.sort_key`, is always 
+    kept.
+    """
+    if key is None:
+        key = lambda option: option.sort_key
+    minimal: list[SwitchSet] = []
+    for option in sorted(set(options), key=key):
+        if limit is not None and len(minimal) >= limit:
+            break
+        # only better ranked options dominate, with the default key these are the 
+        # only possible subsets of this option
+        if not any(kept.issubset(option) for kept in minimal):
+            minimal.append(option)
+    return frozenset(minimal)
@@ -0,0 +1,221 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Any
+
+import networkx as nx
+import numpy as np
+from pandapower import pandapowerNet
+
+from core import BusMeasurement, Switch
+
+Node = tuple[str, int]
+
+TOPOLOGY_CACHE = "_solver_topology"
+"Key of the cached communication topology in the network."
+
+TOPOLOGY_COLUMNS = {
+    "bus": ["in_service"],
+    "line": ["from_bus", "to_bus", "in_service"],
+    "trafo": ["hv_bus", "lv_bus", "in_service"],
+    "trafo3w": ["hv_bus", "mv_bus", "lv_bus", "in_service"],
+    "impedance": ["from_bus", "to_bus", "in_service"],
+    "dcline": ["from_bus", "to_bus", "in_service"],
+    "switch": ["bus", "element", "et", "closed"],
+}
+"Columns of the network tables the communication topology is built from."
+
+
+def agent_id(node: Node) -> str:
+    """Id of the agent placed on a node, e.g. `bus-3-agent`."""
+    return f"{node[0]}-{node[1]}-agent"
+
+
+@dataclass(frozen=True, slots=True)
+class CompactTopology:
+    """
+    Communication topology as compressed sparse row (CSR) adjacency.
+
+    The first nodes are the in service busses, followed by one node per switchable
+    line.
+    The neighbors of node `i` are `indices[indptr[i]:indptr[i + 1]]`.
+    """
+    buses: np.ndarray
+    "Index in `net.bus` of every bus node."
+    bus_components: np.ndarray
+    "Position of every bus node in the list of `BusMeasurement`s."
+    switches: np.ndarray
+    "Index in `net.line` of the switchable line of every switch node."
+    switch_components: np.ndarray
+    "Position of every switch node in the list of `Switch`es."
+    indptr: np.ndarray
+    indices: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.buses) + len(self.switches)
+
+    def node(self, i: int) -> Node:
+        if i < len(self.buses):
+            return ("bus", int(self.buses[i]))
+        return ("switch", int(self.switches[i - len(self.buses)]))
+
+    @property
+    def nodes(self) -> list[Node]:
+        return [self.node(i) for i in range(len(self))]
+
+    def neighbors(self, i: int) -> np.ndarray:
+        return self.indices[self.indptr[i] : self.indptr[i + 1]]
+
+    def to_networkx(
+        self, bus_measurements: list[BusMeasurement], switches: list[Switch]
+    ) -> nx.Graph:
+        """
+        Convert to a networkx graph whose nodes hold their `BusMeasurement` or `Switch`.
+
+        Only needed for partitioning and rendering, the agents are created directly
+        from the CSR adjacency.
+        """
+        nodes = self.nodes
+        graph = nx.Graph()
+        for node, component in zip(nodes[: len(self.buses)], self.bus_components):
+            graph.add_node(node, bus_measurement=bus_measurements[component])
+        for node, component in zip(nodes[len(self.buses) :], self.switch_components):
+            graph.add_node(node, switch=switches[component])
+        sources = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        graph.add_edges_from(
+            (nodes[u], nodes[v]) for u, v in zip(sources, self.indices) if u < v
+        )
+        return graph
+
+
+def build_topology(net: pandapowerNet) -> CompactTopology:
+    """
+    Build the communication topology directly from the columns of the network tables.
+
+    Every in service bus becomes a node, connected along all in service branches, i.e.
+    lines, transformers, impedances, DC lines and closed bus-bus switches.
+    Lines with an open line switch are switchable: each gets its own node between the
+    two busses of the line.
+    Branches with other open switches are left out entirely.
+
+    The components are numbered like `core.to_components` numbers them, i.e. every
+    bus and every open switch in table order.
+    """
+    in_service = net.bus.in_service.values.astype(bool)
+    buses = net.bus.index.values[in_service]
+    bus_components = np.flatnonzero(in_service)
+    # maps the index in `net.bus` to the bus node, -1 for out of service busses
+    lookup = np.full(net.bus.index.max() + 1 if len(net.bus) else 0, -1)
+    lookup[buses] = np.arange(len(buses))
+
+    switch = net.switch
+    open_switch = ~switch.closed.values.astype(bool)
+    et = switch.et.values
+    open_components = np.cumsum(open_switch) - 1
+
+    def open_elements(element_type: str) -> np.ndarray:
+        return switch.element.values[open_switch & (et == element_type)]
+
+    froms, tos = [], []
+
+    def add_branches(table: Any, from_column: str, to_column: str, mask=None):
+        if table is None or not len(table):
+            return
+        selected = table.in_service.values.astype(bool)
+        if mask is not None:
+            selected &= mask
+        froms.append(table[from_column].values[selected])
+        tos.append(table[to_column].values[selected])
+
+    line = net.line
+    switchable = np.isin(line.index.values, open_elements("l"))
+    add_branches(line, "from_bus", "to_bus", ~switchable)
+    trafo = net.get("trafo")
+    if trafo is not None:
+        closed = ~np.isin(trafo.index, open_elements("t"))
+        add_branches(trafo, "hv_bus", "lv_bus", closed)
+    trafo3w = net.get("trafo3w")
+    if trafo3w is not None:
+        closed = ~np.isin(trafo3w.index, open_elements("t3"))
+        add_branches(trafo3w, "hv_bus", "mv_bus", closed)
+        add_branches(trafo3w, "hv_bus", "lv_bus", closed)
+        add_branches(trafo3w, "mv_bus", "lv_bus", closed)
+    add_branches(net.get("impedance"), "from_bus", "to_bus")
+    add_branches(net.get("dcline"), "from_bus", "to_bus")
+    bus_switch = (et == "b") & ~open_switch
+    froms.append(switch.bus.values[bus_switch])
+    tos.append(switch.element.values[bus_switch])
+
+    u = lookup[np.concatenate(froms).astype(int)]
+    v = lookup[np.concatenate(tos).astype(int)]
+    keep = (u >= 0) & (v >= 0) & (u != v)
+    u, v = u[keep], v[keep]
+
+    # one switch node per switchable in service line between two in service busses
+    switch_rows = np.flatnonzero(open_switch & (et == "l"))
+    lines, first = np.unique(switch.element.values[switch_rows], return_index=True)
+    switchable_lines = line.loc[lines]
+    switch_u = lookup[switchable_lines.from_bus.values]
+    switch_v = lookup[switchable_lines.to_bus.values]
+    keep = (
+        switchable_lines.in_service.values.astype(bool)
+        & (switch_u >= 0)
+        & (switch_v >= 0)
+    )
+    switches = lines[keep]
+    switch_components = open_components[switch_rows[first[keep]]]
+    switch_nodes = len(buses) + np.arange(len(switches))
+    u = np.concatenate([u, switch_nodes, switch_nodes])
+    v = np.concatenate([v, switch_u[keep], switch_v[keep]])
+
+    # symmetric adjacency without parallel edges
+    n = len(buses) + len(switches)
+    edges = np.unique(np.concatenate([u * n + v, v * n + u]))
+    sources, indices = np.divmod(edges, n)
+    indptr = np.zeros(n + 1, dtype=int)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+
+    return CompactTopology(
+        buses=buses,
+        bus_components=bus_components,
+        switches=switches,
+        switch_components=switch_components,
+        indptr=indptr,
+        indices=indices,
+    )
+
+
+def topology_key(net: pandapowerNet) -> bytes:
+    """
+    Hash of all columns the communication topology is built from.
+
+    Hashing the raw column buffers is considerably cheaper than building the topology.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name, columns in TOPOLOGY_COLUMNS.items():
+        table = net.get(name)
+        if table is None or not len(table):
+            continue
+        digest.update(name.encode())
+        digest.update(table.index.values.tobytes())
+        for column in columns:
+            values = table[column].values
+            if values.dtype == object:
+                values = values.astype(str)
+            digest.update(values.tobytes())
+    return digest.digest()
+
+
+def cached_topology(net: pandapowerNet) -> CompactTopology:
+    """
+    Build the communication topology or reuse the one cached in the network.
+
+    Repeated solves of the same network skip building the topology again, the cache is 
+    invalidated by any change of the `TOPOLOGY_COLUMNS`, e.g. a switched switch.
+    """
+    key = topology_key(net)
+    cached = net.get(TOPOLOGY_CACHE)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    communication_topology = build_topology(net)
+    net[TOPOLOGY_CACHE] = (key, communication_topology)
+    return communication_topology
@@ -0,0 +1,202 @@
+"""
+Analyze message traces written by `solver.tracing.MessageTracer`.
+
+Run from the `src` directory, with the trace files of all shards:
+
+    python -m solver.trace_analysis transfers*.jsonl
+"""
+
+import argparse
+import json
+import statistics
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class TraceRecord:
+    """
+    A single sent message of a trace.
+    """
+    id: int
+    parent: None | int
+    time: float
+    sender: None | str
+    receiver: str
+    type: str
+    mid: str
+    bytes: int
+
+
+@dataclass(frozen=True, slots=True)
+class WaveReport:
+    """
+    Statistics of a single reach connection wave.
+
+    A wave consists of all requests and responses of one `ReachConnectionRequest`.
+    """
+    mid: str
+    initiator: None | str
+    messages: int
+    depth: int
+    "Number of hops of the longest request chain."
+    max_fan_out: int
+    "Most requests sent while handling a single message."
+    duplicates: int
+    "Requests delivered to an agent which already got this wave's request."
+    hop_latencies: list[float]
+    "Time between receiving a message and sending a message caused by it."
+    critical_path: list[TraceRecord]
+    "Causal chain from the first request to the last response at the initiator."
+
+    @property
+    def duration(self) -> float:
+        if not self.critical_path:
+            return 0.0
+        return self.critical_path[-1].time - self.critical_path[0].time
+
+
+def load_trace(paths: Iterable[str]) -> list[TraceRecord]:
+    """
+    Load the records of one or more trace files, e.g. of all shards, sorted by time.
+    """
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                data = json.loads(line)
+                if "agent" in data:
+                    # annotation describing an agent, only needed for replays
+                    continue
+                data.pop("message", None)
+                data.pop("payload", None)
+                records.append(TraceRecord(**data))
+    records.sort(key=lambda record: record.time)
+    return records
+
+
+def analyze_waves(records: list[TraceRecord]) -> list[WaveReport]:
+    """
+    Reconstruct the fan-out tree and critical path of every reach connection wave.
+    """
+    by_id = {record.id: record for record in records}
+    waves: defaultdict[str, list[TraceRecord]] = defaultdict(list)
+    for record in records:
+        if record.type in ("ReachConnectionRequest", "ReachConnectionResponse"):
+            waves[record.mid].append(record)
+
+    reports = []
+    for mid, wave in waves.items():
+        requests = [r for r in wave if r.type == "ReachConnectionRequest"]
+        responses = [r for r in wave if r.type == "ReachConnectionResponse"]
+        wave_ids = {record.id for record in wave}
+        roots = [r for r in requests if r.parent not in wave_ids]
+        initiator = roots[0].sender if roots else None
+
+        depths: dict[int, int] = {}
+        for request in requests:
+            parent = 0 if request.parent is None else depths.get(request.parent, 0)
+            depths[request.id] = parent + 1
+
+        # roots are all caused by the initiator starting the wave
+        fan_out = Counter(
+            request.parent if request.parent in wave_ids else None
+            for request in requests
+        )
+
+        receivers = Counter(request.receiver for request in requests)
+        duplicates = sum(count - 1 for count in receivers.values())
+
+        hop_latencies = [
+            record.time - by_id[record.parent].time
+            for record in wave
+            if record.parent in wave_ids
+        ]
+
+        critical_path = []
+        final = [r for r in responses if r.receiver == initiator]
+        if final:
+            hop: None | TraceRecord = max(final, key=lambda r: r.time)
+            while hop is not None and hop.id in wave_ids:
+                critical_path.append(hop)
+                hop = None if hop.parent is None else by_id.get(hop.parent)
+            critical_path.reverse()
+
+        reports.append(
+            WaveReport(
+                mid=mid,
+                initiator=initiator,
+                messages=len(wave),
+                depth=max(depths.values(), default=0),
+                max_fan_out=max(fan_out.values(), default=0),
+                duplicates=duplicates,
+                hop_latencies=hop_latencies,
+                critical_path=critical_path,
+            )
+        )
+    return reports
+
+
+def bytes_per_type(records: Iterable[TraceRecord]) -> dict[str, tuple[int, int]]:
+    """
+    :return: number of messages and their total pickled size for every message type
+    """
+    totals: defaultdict[str, tuple[int, int]] = defaultdict(lambda: (0, 0))
+    for record in records:
+        count, size = totals[record.type]
+        totals[record.type] = (count + 1, size + record.bytes)
+    return dict(totals)
+
+
+def print_report(records: list[TraceRecord], slowest: int):
+    reports = sorted(
+        analyze_waves(records), key=lambda report: report.duration, reverse=True
+    )
+    print(f"{len(records)} messages, {len(reports)} waves")
+    print()
+    print(
+        f"{'initiator':>16}  {'msgs':>5}  {'depth':>5}  {'fan-out':>7}  "
+        f"{'dups':>5}  {'hop mean':>9}  {'duration':>9}"
+    )
+    for report in reports:
+        hop = statistics.mean(report.hop_latencies) if report.hop_latencies else 0.0
+        print(
+            f"{report.initiator or '-':>16}  {report.messages:>5}  "
+            f"{report.depth:>5}  {report.max_fan_out:>7}  {report.duplicates:>5}  "
+            f"{hop * 1000:7.2f}ms  {report.duration * 1000:7.2f}ms"
+        )
+
+    for report in reports[:slowest]:
+        print()
+        print(f"critical path of wave {report.mid} ({report.initiator}):")
+        previous = None
+        for record in report.critical_path:
+            delta = record.time - previous.time if previous else 0.0
+            print(
+                f"  +{delta * 1000:6.2f}ms  {record.sender} -> {record.receiver}  "
+                f"{record.type}"
+            )
+            previous = record
+
+    print()
+    print(f"{'type':>24}  {'count':>6}  {'bytes':>9}  {'mean':>6}")
+    for type_name, (count, size) in sorted(bytes_per_type(records).items()):
+        print(f"{type_name:>24}  {count:>6}  {size:>9}  {size // count:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="trace files, e.g. of all shards")
+    parser.add_argument(
+        "--slowest",
+        type=int,
+        default=3,
+        help="number of slowest waves to show the critical path of",
+    )
+    args = parser.parse_args()
+    print_report(load_trace(args.paths), args.slowest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import base64
+import itertools
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Self
+
+from .messages import Message
+
+log = logging.getLogger(__name__)
+
+trace_cause: ContextVar[None | int] = ContextVar("trace_cause", default=None)
+"""
+Trace id of the send that caused the currently running code.
+
+Agents set this when handling a message, every send recorded while handling that 
+message is linked to it as its causal parent.
+"""
+
+TRACE_SAMPLE_MULTIPLIER = 2654435761
+"Knuth's multiplicative hash constant, spreads message ids evenly for sampling."
+
+
+class MessageTracer:
+    """
+    Low-overhead trace of all messages sent in a container.
+
+    Recording a message only appends a tuple to a bounded buffer, everything else 
+    happens in a background writer thread which periodically appends the buffered 
+    records as JSON lines to the trace file.
+    As messages are immutable, the writer can safely serialize them later on.
+    If the buffer is full, new records are dropped and counted instead of blocking the 
+    agents.
+
+    Tracing can be toggled at runtime via `enabled` and sampled via `sample_rate`.
+    Sampling is decided per message id, so either all or none of the messages of a 
+    wave are traced.
+
+    Every record gets a trace id and links to the trace id of its causal parent, the 
+    send of the message the sending agent was handling, see `trace_cause`.
+    """
+    path: str
+    capacity: int
+    sample_rate: float
+    enabled: bool
+    payload: bool
+    """
+    Whether to include every message in the trace, as `repr` and as pickled payload 
+    which allows replaying the trace.
+    """
+    dropped: int
+    "Number of records dropped because the buffer was full."
+
+    origin: int
+    "Distinguishes the trace ids of multiple tracers, e.g. one per shard."
+
+    _buffer: deque[tuple[int, None | int, float, None | str, str, Message]]
+    _annotations: deque[dict[str, Any]]
+    _next_trace_id: itertools.count
+    _flush_interval: float
+    _stop: threading.Event
+    _writer: None | threading.Thread
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        capacity: int = 65536,
+        sample_rate: float = 1.0,
+        enabled: bool = True,
+        payload: bool = False,
+        flush_interval: float = 0.1,
+        origin: int = 0,
+    ):
+        self.path = path
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self.payload = payload
+        self.dropped = 0
+        self.origin = origin
+        self._buffer = deque()
+        self._annotations = deque()
+        self._next_trace_id = itertools.count(origin << 32)
+        self._flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._writer = None
+
+    def record(
+        self, sender: None | str, receiver: str, message: Message
+    ) -> None | int:
+        """
+        Record a sent message.
+
+        :return: trace id of the record, `None` if the message was not recorded
+        """
+        if not self.enabled or not self.sampled(message):
+            return None
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+            return None
+        trace_id = next(self._next_trace_id)
+        parent = trace_cause.get()
+        self._buffer.append((trace_id, parent, time.time(), sender, receiver, message))
+        return trace_id
+
+    def annotate(self, record: dict[str, Any]):
+        """
+        Write a static record to the trace, e.g. describing a traced agent.
+
+        Unlike messages, annotations are neither sampled nor dropped.
+        """
+        self._annotations.append(record)
+
+    def derive(self, path: str, origin: int) -> Self:
+        """Create a tracer with the same settings but another path and origin."""
+        return type(self)(
+            path,
+            capacity=self.capacity,
+            sample_rate=self.sample_rate,
+            enabled=self.enabled,
+            payload=self.payload,
+            flush_interval=self._flush_interval,
+            origin=origin,
+        )
+
+    def sampled(self, message: Message) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        spread = hash(message.mid) * TRACE_SAMPLE_MULTIPLIER % 2**32
+        return spread < self.sample_rate * 2**32
+
+    def start(self):
+        """Truncate the trace file and start the background writer."""
+        open(self.path, "w").close()
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def close(self):
+        """Stop the background writer after it wrote every buffered record."""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        if self.dropped:
+            log.warning(f"trace buffer full, dropped {self.dropped} records")
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object):
+        self.close()
+
+    def _write_loop(self):
+        with open(self.path, "a") as f:
+            while not self._stop.wait(self._flush_interval):
+                self._flush(f)
+            self._flush(f)
+
+    def _flush(self, f):
+        lines = []
+        while self._annotations:
+            record = self._annotations.popleft()
+            lines.append(json.dumps(record, separators=(",", ":")) + "\n")
+        while self._buffer:
+            lines.append(self._encode(*self._buffer.popleft()))
+        if lines:
+            f.write("".join(lines))
+            f.flush()
+
+    def _encode(
+        self,
+        trace_id: int,
+        parent: None | int,
+        timestamp: float,
+        sender: None | str,
+        receiver: str,
+        message: Message,
+    ) -> str:
+        data = pickle.dumps(message)
+        record = {
+            "id": trace_id,
+            "parent": parent,
+            "time": timestamp,
+            "sender": sender,
+            "receiver": receiver,
+            "type": type(message).__name__,
+            "mid": str(message.mid),
+            "bytes": len(data),
+        }
+        if self.payload:
+            record["message"] = repr(message)
+            record["payload"] = base64.b64encode(data).decode()
+        return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def dump_payload(value: Any) -> str:
+    """Encode a value as pickled payload of a trace record."""
+    return base64.b64encode(pickle.dumps(value)).decode()
+
+
+def load_payload(payload: str) -> Any:
+    """Decode the pickled payload of a trace record."""
+    return pickle.loads(base64.b64decode(payload))
+
+
+def shard_trace_path(path: str, shard: int) -> str:
+    """Path of the trace of a single shard, e.g. `transfers-0.jsonl`."""
+    root, extension = os.path.splitext(path)
+    return f"{root}-{shard}{extension}"
@@ -29,3 +29,41 @@ class ZeroBarrier:
 
     async def wait(self):
         await self._event.wait()
+
+
+class RttEstimator:
+    """
+    Adaptive timeout based on measured round trip times.
+
+    This follows the retransmission timeout estimation of TCP (Jacobson/Karels): a 
+    smoothed round trip time and its variation are updated with every sample and the 
+    timeout is the smoothed round trip time plus four times its variation.
+    Until the first sample arrived, `initial` is used as timeout.
+    """
+    _initial: float
+    _minimum: float
+    _maximum: float
+    _smoothed: None | float
+    _variation: float
+
+    def __init__(self, initial: float, minimum: float, maximum: float):
+        self._initial = initial
+        self._minimum = minimum
+        self._maximum = maximum
+        self._smoothed = None
+        self._variation = 0
+
+    def sample(self, rtt: float):
+        if self._smoothed is None:
+            self._smoothed = rtt
+            self._variation = rtt / 2
+            return
+        self._variation = 0.75 * self._variation + 0.25 * abs(self._smoothed - rtt)
+        self._smoothed = 0.875 * self._smoothed + 0.125 * rtt
+
+    @property
+    def timeout(self) -> float:
+        if self._smoothed is None:
+            return self._initial
+        timeout = self._smoothed + 4 * self._variation
+        return min(max(timeout, self._minimum), self._maximum)
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from collections.abc import Iterable
+
+from pandapower import pandapowerNet, runpp
+
+from core import Switch
+
+from .agents import BusAgent
+from .feasibility import FeasibilityCheck
+from .measurements import ConnectivitySnapshot
+
+log = logging.getLogger(__name__)
+
+VERIFY_WINDOW = 0.05
+"Seconds switching actions are collected before verifying them in one power flow."
+
+
+class PowerFlowVerifier:
+    """
+    Verify switching actions with power flows, batched over a short window.
+
+    The first switching action starts a window of `window` seconds, every further
+    switching action in that window joins the same batch.
+    At the end of the window a single power flow is run and the refreshed connectivity
+    is published to the bus agents, see `BusAgent.verify_connection`.
+    This costs one power flow per batch instead of one per switch.
+
+    The power flow runs on the event loop, so no agent switches while it runs.
+    """
+    net: pandapowerNet
+    snapshot: None | ConnectivitySnapshot
+    "Snapshot the bus agents read, invalidated after every power flow."
+    feasibility: None | FeasibilityCheck
+    "Feasibility check of the bus agents, invalidated after every power flow."
+    window: float
+    agents: list[BusAgent]
+    batches: int
+    "Number of power flows run."
+    switched: int
+    "Number of switching actions verified."
+
+    _pending: None | asyncio.Task
+    _batch_size: int
+
+    def __init__(
+        self,
+        net: pandapowerNet,
+        snapshot: None | ConnectivitySnapshot = None,
+        window: float = VERIFY_WINDOW,
+        feasibility: None | FeasibilityCheck = None,
+    ):
+        self.net = net
+        self.snapshot = snapshot
+        self.feasibility = feasibility
+        self.window = window
+        self.agents = []
+        self.batches = 0
+        self.switched = 0
+        self._pending = None
+        self._batch_size = 0
+
+    def wrap(self, switches: Iterable[Switch]) -> list[Switch]:
+        """Wrap the switches, so every switching action is verified."""
+        return [VerifiedSwitch(switch, self) for switch in switches]
+
+    def notify(self):
+        """Add a switching action to the current batch, or start a new batch."""
+        self._batch_size += 1
+        if self._pending is None:
+            self._pending = asyncio.get_running_loop().create_task(self._verify())
+
+    async def flush(self):
+        """Wait until every switching action so far was verified."""
+        while self._pending is not None:
+            await self._pending
+
+    async def _verify(self):
+        await asyncio.sleep(self.window)
+        # switching from now on starts the next batch
+        self._pending = None
+        batch_size, self._batch_size = self._batch_size, 0
+        try:
+            runpp(self.net)
+        except Exception:
+            log.exception(f"power flow verifying {batch_size} switches failed")
+            return
+        self.batches += 1
+        self.switched += batch_size
+        if self.snapshot is not None:
+            self.snapshot.invalidate()
+        if self.feasibility is not None:
+            self.feasibility.invalidate()
+        self.publish()
+
+    def publish(self):
+        """Publish the connectivity of the last power flow to the bus agents."""
+        for agent in self.agents:
+            agent.verify_connection()
+
+
+class VerifiedSwitch(Switch):
+    """
+    `Switch` which reports every switching action to a `PowerFlowVerifier`.
+    """
+    _switch: Switch
+    _verifier: PowerFlowVerifier
+
+    def __init__(self, switch: Switch, verifier: PowerFlowVerifier):
+        super().__init__((switch.is_switched, switch.switch))
+        self._switch = switch
+        self._verifier = verifier
+
+    def switch(self, new_value: bool):
+        # the wrapped switch counts the switching action
+        self._switch.switch(new_value)
+        self._verifier.notify()
@@ -0,0 +1,21 @@
+import pandapower as pp
+import pytest
+from pandapower import pandapowerNet, runpp
+
+from benchmarks.grids import LINE_TYPE, create_radial_network
+
+
+@pytest.fixture
+def nested_islands() -> pandapowerNet:
+    """
+    Radial grid in which failing lines 0 and 2 disconnect busses 1, 4 and bus 3 below 
+    them.
+    Bus 3 is only reachable via bus 4, which in turn is reconnected via bus 5.
+    """
+    net = create_radial_network(depth=2, branching=2, reserve_lines=0)
+    for from_bus, to_bus in [(4, 5), (3, 4)]:
+        line = pp.create_line(net, from_bus, to_bus, 0.5, LINE_TYPE)
+        pp.create_switch(net, to_bus, line, "l", closed=False)
+    net.line.loc[[0, 2], "in_service"] = False
+    runpp(net)
+    return net
@@ -0,0 +1,163 @@
+import asyncio
+
+import mango
+import pytest
+
+from solver import agents
+from solver.agents import RESPONSE_TIMEOUT, BusAgent, SwitchAgent
+from solver.container import cancel_handlers, create_container
+from solver.ids import BusId, MessageId, SwitchId
+from solver.messages import ReachConnectionRequest, ReachConnectionResponse
+from solver.replay import stub_bus, stub_switch
+from solver.switch_set import SwitchSet
+from solver.util import ZeroBarrier
+
+NEIGHBOR = mango.AgentAddress(("localhost", 5555), "bus-1-agent")
+META = {"sender_addr": NEIGHBOR.protocol_addr, "sender_id": NEIGHBOR.aid}
+
+
+def create_bus_agent(**kwargs) -> BusAgent:
+    return BusAgent(neighbors={NEIGHBOR}, bus=stub_bus(False), bid=BusId(), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_adaptive_timeout_ignores_dead_ends():
+    agent = create_bus_agent(adaptive_timeout=True)
+
+    async def respond(hops: int):
+        mid = MessageId()
+        pending = ReachConnectionResponse(mid=mid, switches=frozenset(), reached=False)
+        agent.pending_requests[mid] = (ZeroBarrier(), pending)
+        agent.request_sent_at[mid] = asyncio.get_running_loop().time()
+        await asyncio.sleep(0.01)
+        response = ReachConnectionResponse(
+            mid=mid, switches=frozenset(), reached=False, hops=hops
+        )
+        await agent.handle_reach_connection_response(response, META)
+
+    # answers right away say nothing about requests exploring the network
+    await respond(hops=0)
+    assert agent.response_timeout([NEIGHBOR]) == RESPONSE_TIMEOUT
+
+    await respond(hops=3)
+    timeout = agent.response_timeout([NEIGHBOR])
+    assert timeout < RESPONSE_TIMEOUT
+    # one hop more than ever seen behind the neighbor
+    assert timeout >= 4 * agent.response_times[NEIGHBOR].timeout
+
+
+@pytest.mark.asyncio
+async def test_timed_out_request_is_forgotten():
+    agent = create_bus_agent()
+    agent.response_timeout = lambda targets: 0.01
+
+    async def lose(message, targets):
+        pass
+
+    agent.send_messages = lose
+    request = ReachConnectionRequest(
+        mid=MessageId(), bridged=False, switches=SwitchSet()
+    )
+    response = await agent.send_reach_connection_requests_wait_for_response(
+        request, [NEIGHBOR]
+    )
+
+    assert response.switches == frozenset()
+    assert request.mid not in agent.pending_requests
+    assert request.mid not in agent.request_sent_at
+    # a late response is dropped instead of merged into the answered request
+    late = ReachConnectionResponse(mid=request.mid, switches=frozenset(), reached=False)
+    await agent.handle_reach_connection_response(late, META)
+    assert request.mid not in agent.pending_requests
+
+
+@pytest.mark.asyncio
+async def test_island_elects_single_leader():
+    # a ring of disconnected busses behind a switch to a connected bus
+    container = create_container("local", "island")
+    aids = [f"island-{i}" for i in range(5)] + ["switch", "connected"]
+    address = {aid: mango.AgentAddress(container.addr, aid) for aid in aids}
+    edges = [(f"island-{i}", f"island-{(i + 1) % 5}") for i in range(5)]
+    edges += [("island-2", "switch"), ("switch", "connected")]
+    neighbors = {aid: set() for aid in aids}
+    for a, b in edges:
+        neighbors[a].add(address[b])
+        neighbors[b].add(address[a])
+
+    bids = [BusId(key) for key in [7, 3, 9, 5, 8]]
+    busses = [
+        BusAgent(
+            neighbors=neighbors[f"island-{i}"],
+            bus=stub_bus(False),
+            bid=bid,
+            election=True,
+        )
+        for i, bid in enumerate(bids)
+    ]
+    for i, agent in enumerate(busses):
+        container.register(agent, f"island-{i}")
+    switch = SwitchAgent(
+        neighbors=neighbors["switch"], switch=stub_switch(False), sid=SwitchId(0)
+    )
+    container.register(switch, "switch")
+    connected = BusAgent(
+        neighbors=neighbors["connected"], bus=stub_bus(True), bid=BusId(1)
+    )
+    container.register(connected, "connected")
+
+    async with mango.activate(container):
+        leading = await asyncio.gather(*(agent.elect_leader() for agent in busses))
+        await cancel_handlers([*busses, switch, connected])
+
+    # the connected bus with the smallest id is not part of the island
+    assert leading == [False, True, False, False, False]
+    assert {agent.leader for agent in busses} == {bids[1]}
+    assert connected.leader is None
+
+
+@pytest.mark.asyncio
+async def test_follower_searches_without_decision(monkeypatch):
+    monkeypatch.setattr(agents, "DECISION_TIMEOUT", 0.01)
+    agent = create_bus_agent(election=True)
+    searched = []
+
+    async def elect_leader():
+        return False
+
+    async def find_option():
+        searched.append(agent.bid)
+
+    agent.elect_leader = elect_leader
+    agent.find_option = find_option
+    await agent.resolve()
+
+    # the leader never decided, so the bus searched itself
+    assert searched == [agent.bid]
+    assert agent.found_no_option
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("max_in_flight", "remote", "overlapping"),
+    [(None, True, 4), (2, True, 2), (1, True, 1), (None, False, 1)],
+)
+async def test_fan_out(max_in_flight: None | int, remote: bool, overlapping: int):
+    container = create_container("local", "fan-out")
+    agent = create_bus_agent(max_in_flight=max_in_flight)
+    container.register(agent, "sender")
+    addr = "other" if remote else container.addr
+    targets = [mango.AgentAddress(addr, f"target-{i}") for i in range(4)]
+    in_flight = []
+    sent = []
+
+    async def send_message(message, target):
+        in_flight.append(target)
+        sent.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(target)
+
+    agent.send_message = send_message
+    await agent.send_messages("message", targets)
+
+    assert len(sent) == len(targets)
+    assert max(sent) == overlapping
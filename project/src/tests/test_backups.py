@@ -0,0 +1,53 @@
+import contextlib
+import io
+
+from pandapower import runpp
+
+import solver
+from benchmarks.grids import create_radial_network
+from core import evaluate, reset_switch_count, to_components
+from solver.ids import SwitchId
+from solver.switch_set import SwitchSet
+
+
+def test_precompute_backups():
+    # bus 0 feeds bus 1 to 3, busses 2 and 3 are joined by the reserve line 3
+    net = create_radial_network(depth=1, branching=3, reserve_lines=1)
+    assert list(net.line.loc[3, ["from_bus", "to_bus"]]) == [2, 3]
+    runpp(net)
+    switches, bus_measurements = to_components(net)
+    with contextlib.redirect_stdout(io.StringIO()):
+        backups = solver.precompute_backups(
+            switches, bus_measurements, net, transport="local"
+        )
+
+    assert backups.routes == {
+        "bus-0-agent": {
+            "bus-1-agent": None,
+            "bus-2-agent": "switch-3-agent",
+            "bus-3-agent": "switch-3-agent",
+        },
+        "bus-1-agent": {"bus-0-agent": None},
+        "bus-2-agent": {"bus-0-agent": "switch-3-agent"},
+        "bus-3-agent": {"bus-0-agent": "switch-3-agent"},
+    }
+    sids = {"switch-3-agent": SwitchId(0)}
+    assert backups.backup("bus-2-agent", set(), sids) == SwitchSet.of([SwitchId(0)])
+    assert backups.backup("bus-2-agent", {"bus-0-agent"}, sids) is None
+    assert backups.backup("bus-1-agent", set(), sids) == SwitchSet()
+
+    net.line.loc[1, "in_service"] = False
+    runpp(net)
+    switches, bus_measurements = to_components(net)
+    reset_switch_count()
+    with contextlib.redirect_stdout(io.StringIO()):
+        solver.solve(
+            switches,
+            bus_measurements,
+            net,
+            backups=backups,
+            transport="local",
+        )
+    switch_count, connected = evaluate(net)
+    assert switch_count == 1
+    assert connected
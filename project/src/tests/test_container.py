@@ -0,0 +1,79 @@
+import asyncio
+
+import mango
+import pytest
+from mango.messages.codecs import SerializationError
+
+from solver.container import create_codec, create_container
+from solver.ids import BusId, MessageId, SwitchId
+from solver.messages import IslandDecision, ReachConnectionResponse
+from solver.switch_set import SwitchSet
+
+
+class Inbox(mango.Agent):
+    def __init__(self):
+        super().__init__()
+        self.received = asyncio.Queue()
+
+    def handle_message(self, content, meta):
+        self.received.put_nowait((content, meta))
+
+
+def test_codec_round_trip():
+    codec = create_codec()
+    messages = [
+        ReachConnectionResponse(
+            mid=MessageId(),
+            switches=frozenset([SwitchSet.of([SwitchId(0), SwitchId(2)]), SwitchSet()]),
+            reached=True,
+        ),
+        IslandDecision(mid=MessageId(), leader=BusId(), switches=None),
+    ]
+    for message in messages:
+        assert codec.decode(codec.encode(message)) == message
+
+
+def test_codec_rejects_unknown_types():
+    class Unknown:
+        pass
+
+    with pytest.raises(SerializationError):
+        create_codec().encode(Unknown())
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("transport", "remote"), [("local", False), ("tcp", False), ("tcp", True)]
+)
+async def test_transport_delivers(transport, remote):
+    containers = [create_container(transport, ("localhost", 5677))]
+    if remote:
+        containers.append(create_container(transport, ("localhost", 5678)))
+    sender = containers[0].register(Inbox(), "sender")
+    receiver = containers[-1].register(Inbox(), "receiver")
+    message = ReachConnectionResponse(
+        mid=MessageId(),
+        switches=frozenset([SwitchSet.of([SwitchId(1)])]),
+        reached=True,
+    )
+
+    async with mango.activate(*containers):
+        assert await sender.send_message(message, receiver.addr)
+        content, meta = await asyncio.wait_for(receiver.received.get(), 1)
+
+    # within a container the message is shared, across containers it is encoded
+    assert content == message
+    assert (content is message) != remote
+    # agents answer to the sender address of the meta
+    assert mango.sender_addr(meta) == sender.addr
+    assert receiver.received.empty()
+
+
+@pytest.mark.asyncio
+async def test_local_container_drops_foreign_receivers():
+    container = create_container("local", ("localhost", 5677))
+    sender = container.register(Inbox(), "sender")
+    foreign = mango.AgentAddress(("localhost", 5678), "receiver")
+
+    async with mango.activate(container):
+        assert not await sender.send_message("message", foreign)
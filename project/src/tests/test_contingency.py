@@ -0,0 +1,25 @@
+from benchmarks.contingency import TEST_GRID, Case, case_lines, create_grid, run_case
+
+
+def test_create_grid_keeps_reserve_lines_open():
+    net = create_grid(TEST_GRID)
+    reserve = net.switch.name == "Reserve Line Switch"
+    assert net.line.in_service.all()
+    assert not net.switch.closed[reserve].any()
+    assert net.switch.closed[~reserve].all()
+
+
+def test_reserve_lines_are_no_cases():
+    net = create_grid(TEST_GRID)
+    lines = case_lines(net)
+    # the 9 reserve lines behind an open switch disconnect nothing
+    assert len(lines) == len(net.line) - 9
+    reserve = net.switch.element[net.switch.name == "Reserve Line Switch"]
+    assert not set(lines) & set(reserve)
+
+
+def test_run_case():
+    # line 3 has a reserve line behind it
+    result = run_case(Case(TEST_GRID, 3, port=6900), "local", backups=False)
+    assert result.switches == 1
+    assert result.connected
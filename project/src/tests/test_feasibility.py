@@ -0,0 +1,52 @@
+import pandapower as pp
+from pandapower import pandapowerNet, runpp
+
+import solver
+from benchmarks.grids import LINE_TYPE, create_radial_network
+from core import to_components
+from solver.agents import BusAgent
+from solver.feasibility import FeasibilityCheck
+from solver.ids import SwitchId
+from solver.switch_set import SwitchSet, minimal_options
+from solver.topology import cached_topology
+
+
+def create_failed_network() -> pandapowerNet:
+    # failing line 0 disconnects bus 1, which is reconnected to bus 2 either via a
+    # thin reserve line too weak for its load or via a regular one
+    net = create_radial_network(depth=1, branching=2, reserve_lines=0)
+    thin = pp.create_line_from_parameters(
+        net, 2, 1, 0.5, r_ohm_per_km=0.5, x_ohm_per_km=0.1, c_nf_per_km=0,
+        max_i_ka=0.0001,
+    )
+    pp.create_switch(net, 1, thin, "l", closed=False)
+    line = pp.create_line(net, 2, 1, 0.5, LINE_TYPE)
+    pp.create_switch(net, 1, line, "l", closed=False)
+    net.line.loc[0, "in_service"] = False
+    runpp(net)
+    return net
+
+
+def test_overloaded_reserve_line():
+    net = create_failed_network()
+    topology = cached_topology(net)
+    check = FeasibilityCheck(net, topology.switches)
+    thin, regular = (
+        SwitchSet.of([SwitchId(int(i))]) for i in topology.switches.argsort()
+    )
+    assert not check.feasible(thin)
+    assert check.feasible(regular)
+    # the thin line is preferred by bitmask, but ranked down by the check
+    assert BusAgent.best_option([thin, regular]) == thin
+    assert BusAgent.best_option([thin, regular], check) == regular
+    # responses limited to a single option keep the feasible one
+    rank = BusAgent.rank(check)
+    assert minimal_options([thin, regular], limit=1, key=rank) == {regular}
+
+
+def test_precheck_avoids_overload():
+    net = create_failed_network()
+    switches, bus_measurements = to_components(net)
+    solver.solve(switches, bus_measurements, net, precheck=True, transport="local")
+    closed = net.switch.element[net.switch.closed.astype(bool)]
+    assert list(closed) == [3]
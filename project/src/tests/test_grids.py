@@ -0,0 +1,24 @@
+from pandapower import runpp
+
+from benchmarks.grids import create_radial_network, radial_size
+from core import to_components
+
+
+def test_radial_network():
+    net = create_radial_network(depth=3, branching=3, reserve_lines=5)
+    assert len(net.bus) == radial_size(3, 3) == 40
+    assert len(net.line) == 39 + 5
+    assert not net.switch.closed.any()
+
+    runpp(net)
+    assert not net.res_bus.vm_pu.isna().any()
+    # line 0 feeds bus 1 and its subtree of 13 busses
+    net.line.loc[0, "in_service"] = False
+    runpp(net)
+    assert net.res_bus.vm_pu.isna().sum() == 13
+
+    switches, _ = to_components(net)
+    for switch in switches:
+        switch.switch(True)
+    runpp(net)
+    assert not net.res_bus.vm_pu.isna().any()
@@ -1,7 +1,17 @@
 from copy import copy, deepcopy
 
 import pytest
-from solver.ids import Id, IncompatibleIdError, MessageId, SwitchId
+
+from solver.ids import (
+    SEQUENCE_BITS,
+    CounterIdSource,
+    Id,
+    IncompatibleIdError,
+    MessageId,
+    SwitchId,
+    UuidIdSource,
+    use_id_source,
+)
 
 
 def test_collision_free():
@@ -55,7 +65,7 @@ def test_newtype():
 
 
 def test_incompatibility():
-    switch_id = SwitchId()
+    switch_id = SwitchId(0)
     message_id = MessageId()
 
     with pytest.raises(IncompatibleIdError):
@@ -69,3 +79,29 @@ def test_incompatibility():
     except IncompatibleIdError as e:
         assert e.left == switch_id
         assert e.right == message_id
+
+
+def test_counter_source():
+    source = CounterIdSource(origin=2)
+    first = source()
+    second = source()
+
+    assert first >> SEQUENCE_BITS == 2
+    assert second == first + 1
+
+
+def test_id_sources():
+    before = Id("test")
+    with use_id_source(CounterIdSource(origin=1)):
+        counter_id = Id("test")
+        assert str(counter_id) == "test-1.0"
+
+        with use_id_source(UuidIdSource()):
+            uuid_ids = {Id("test") for _ in range(100)}
+            assert len(uuid_ids) == 100
+
+        # the outer source continues after the inner one
+        assert str(Id("test")) == "test-1.1"
+
+    # the previous source continues afterwards
+    assert Id("test").key == before.key + 1
@@ -0,0 +1,49 @@
+import math
+
+from pandapower import runpp
+
+import solver
+from core import evaluate, reset_switch_count, to_components
+from solver.measurements import ConnectivitySnapshot
+from solver.replay import stub_bus
+from template import create_simple_network
+
+
+def test_connectivity_snapshot():
+    net = create_simple_network()
+    net.res_bus["vm_pu"] = [1.0, 1.0, math.nan, 1.0, math.nan, 1.0]
+    _, bus_measurements = to_components(net)
+
+    snapshot = ConnectivitySnapshot(net)
+    measurements = snapshot.measurements()
+    assert [m.connected for m in measurements] == [
+        m.connected for m in bus_measurements
+    ]
+
+    # new results are only read in a new epoch
+    net.res_bus["vm_pu"] = 1.0
+    assert not measurements[2].connected
+    snapshot.invalidate()
+    assert snapshot.epoch == 1
+    assert all(m.connected for m in measurements)
+
+
+def test_connectivity_snapshot_missing_results():
+    net = create_simple_network()
+    net.res_bus["vm_pu"] = [1.0] * len(net.bus)
+    net.res_bus = net.res_bus.drop(index=3)
+
+    snapshot = ConnectivitySnapshot(net)
+    assert list(snapshot.connected) == [True, True, True, False, True, True]
+
+
+def test_solve_keeps_given_measurements():
+    net = create_simple_network()
+    runpp(net)
+    switches, bus_measurements = to_components(net)
+    # the given measurements claim every bus to be connected, so nothing is switched
+    connected = [stub_bus(True) for _ in bus_measurements]
+
+    reset_switch_count()
+    solver.solve(switches, connected, net, transport="local")
+    assert evaluate(net)[0] == 0
@@ -0,0 +1,36 @@
+from dataclasses import FrozenInstanceError
+
+import pytest
+
+from solver.ids import MessageId, SwitchId
+from solver.messages import ReachConnectionRequest, ReachConnectionResponse
+from solver.switch_set import SwitchSet
+
+
+def test_immutable():
+    request = ReachConnectionRequest(
+        mid=MessageId(), bridged=False, switches=SwitchSet()
+    )
+    with pytest.raises(FrozenInstanceError):
+        request.bridged = True  # type: ignore[misc]
+
+
+def test_response_merge():
+    mid = MessageId()
+    first = ReachConnectionRequest(
+        mid=mid, bridged=True, switches=SwitchSet.of([SwitchId(0)])
+    )
+    second = ReachConnectionRequest(
+        mid=mid, bridged=True, switches=SwitchSet.of([SwitchId(1)])
+    )
+
+    dead_end = ReachConnectionResponse.from_request(first, False)
+    reached = ReachConnectionResponse.from_request(first, True)
+    merged = dead_end.merge(reached).merge(
+        ReachConnectionResponse.from_request(second, True)
+    )
+
+    assert not dead_end.reached
+    assert dead_end.switches == frozenset()
+    assert merged.reached
+    assert merged.switches == {first.switches, second.switches}
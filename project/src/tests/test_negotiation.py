@@ -0,0 +1,82 @@
+import asyncio
+
+import mango
+import pytest
+
+from benchmarks.contingency import TEST_GRID, create_grid
+from benchmarks.nk import run_case
+from core import evaluate, reset_switch_count, to_components
+from solver import create_agents, run_container
+from solver.agents import BusAgent
+from solver.ids import BusId, MessageId, SwitchId
+from solver.messages import (
+    IslandDecision,
+    ReachConnectionRequest,
+    ReachConnectionResponse,
+)
+from solver.replay import stub_bus
+from solver.switch_set import SwitchSet
+from solver.topology import cached_topology
+
+NEIGHBOR = mango.AgentAddress(("localhost", 5555), "switch-1-agent")
+META = {"sender_addr": NEIGHBOR.protocol_addr, "sender_id": NEIGHBOR.aid}
+
+
+def test_one_plan_per_island(nested_islands):
+    net = nested_islands
+    switches, bus_measurements = to_components(net)
+    agents = create_agents(
+        cached_topology(net), bus_measurements, switches, negotiate=True
+    )
+
+    reset_switch_count()
+    asyncio.run(run_container(agents, transport="local"))
+
+    plans = {
+        aid: agent.plan
+        for aid, agent in agents.items()
+        if isinstance(agent, BusAgent) and agent.plan is not None
+    }
+    # busses 1 and 4 commit to the plan of their leader, bus 3 reuses its switch
+    island, nested = plans["bus-1-agent"], plans["bus-3-agent"]
+    assert plans.keys() == {"bus-1-agent", "bus-3-agent", "bus-4-agent"}
+    assert plans["bus-4-agent"] == island
+    assert len(island) == 1
+    assert island.issubset(nested)
+    assert len(nested) == 2
+    # the shared switch is only switched once
+    assert evaluate(net) == (2, True)
+
+
+@pytest.mark.asyncio
+async def test_follower_commits_to_decision():
+    follower = BusAgent(
+        neighbors={NEIGHBOR}, bus=stub_bus(False), bid=BusId(), negotiate=True
+    )
+    sent = []
+
+    async def send_message(message, target):
+        sent.append(message)
+
+    follower.send_message = send_message
+    plan = SwitchSet().with_switch(SwitchId(7))
+    decision = IslandDecision(mid=MessageId(), leader=BusId(), switches=plan)
+    await follower.handle_island_decision(decision, META)
+
+    # a nested island searches through the follower before its resolve task accepted 
+    # the decision
+    request = ReachConnectionRequest(
+        mid=MessageId(), bridged=True, switches=SwitchSet()
+    )
+    await follower.handle_reach_connection_request(request, META)
+
+    (response,) = sent
+    assert isinstance(response, ReachConnectionResponse)
+    assert response.reached
+    assert response.switches == {plan}
+
+
+def test_nested_island_behind_follower():
+    # bus 4 is only reachable through a follower of the island disconnected by line 2
+    result = run_case(create_grid(TEST_GRID), (2, 24, 26), "local", "negotiated")
+    assert result.connected
@@ -0,0 +1,66 @@
+import json
+
+import networkx as nx
+
+from solver.rendering import (
+    TopologyRenderer,
+    cached_layout,
+    node_key,
+    topology_fingerprint,
+)
+from solver.replay import stub_bus, stub_switch
+
+
+def create_topology():
+    topology = nx.Graph()
+    topology.add_node(("bus", 0), bus_measurement=stub_bus(True))
+    topology.add_node(("bus", 1), bus_measurement=stub_bus(False))
+    topology.add_node(("switch", 2), switch=stub_switch(False))
+    topology.add_edges_from([(("bus", 0), ("switch", 2)), (("switch", 2), ("bus", 1))])
+    return topology
+
+
+def seed_cache(cache, topology):
+    # graphviz is not needed if the layout is cached
+    cache.mkdir(exist_ok=True)
+    layout = {node_key(node): [i, 0.0] for i, node in enumerate(topology.nodes)}
+    path = cache / f"{topology_fingerprint(topology)}.json"
+    path.write_text(json.dumps(layout))
+
+
+def test_topology_fingerprint():
+    topology = create_topology()
+    reversed_topology = nx.Graph()
+    edges = reversed(list(topology.edges))
+    reversed_topology.add_edges_from((v, u) for u, v in edges)
+    assert topology_fingerprint(topology) == topology_fingerprint(reversed_topology)
+
+    topology.add_edge(("bus", 0), ("bus", 1))
+    assert topology_fingerprint(topology) != topology_fingerprint(reversed_topology)
+
+
+def test_cached_layout(tmp_path):
+    topology = create_topology()
+    seed_cache(tmp_path, topology)
+    assert cached_layout(topology, str(tmp_path)) == {
+        ("bus", 0): (0, 0.0),
+        ("bus", 1): (1, 0.0),
+        ("switch", 2): (2, 0.0),
+    }
+
+
+def test_renderer(tmp_path):
+    topology = create_topology()
+    seed_cache(tmp_path, topology)
+    before = tmp_path / "before.png"
+    after = tmp_path / "after.png"
+
+    renderer = TopologyRenderer(topology, cache=str(tmp_path), dpi=10)
+    renderer.snapshot(str(before))
+    topology.nodes["switch", 2]["switch"].switch(True)
+    renderer.snapshot(str(after))
+    renderer.close()
+
+    assert before.exists()
+    assert after.exists()
+    assert before.read_bytes() != after.read_bytes()
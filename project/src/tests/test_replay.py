@@ -0,0 +1,48 @@
+import asyncio
+
+import mango
+
+from solver import ADDRESS, annotate_agents, run_container
+from solver.agents import BusAgent, SwitchAgent
+from solver.ids import SEQUENCE_BITS, BusId, MessageId, SwitchId
+from solver.replay import REPLAY_ID_ORIGIN, Replay, stub_bus, stub_switch
+from solver.tracing import MessageTracer
+
+
+def create_agents():
+    # a disconnected bus reaches the connected bus across an open switch
+    address = {aid: mango.AgentAddress(ADDRESS, aid) for aid in "abs"}
+    switch = stub_switch(False)
+    agents = {
+        "a": BusAgent(neighbors={address["s"]}, bus=stub_bus(False), bid=BusId()),
+        "b": BusAgent(neighbors={address["s"]}, bus=stub_bus(True), bid=BusId()),
+        "s": SwitchAgent(
+            neighbors={address["a"], address["b"]}, switch=switch, sid=SwitchId(0)
+        ),
+    }
+    return agents, switch
+
+
+def test_replay(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    agents, switch = create_agents()
+    tracer = MessageTracer(path, payload=True)
+    annotate_agents(tracer, agents)
+    with tracer:
+        asyncio.run(run_container(agents, transport="local", tracer=tracer))
+    assert switch.is_switched()
+
+    replay = Replay.load([path])
+    assert len(replay.agents) == 3
+    first = replay.run()
+    assert first.reproduced
+    assert first.delivered == len(replay.messages)
+    assert first.sent
+
+    # replays are deterministic
+    second = replay.run()
+    assert second.sent == first.sent
+    assert second.virtual_time == first.virtual_time
+
+    # ids created after a replay do not continue the replay origin
+    assert MessageId().key >> SEQUENCE_BITS != REPLAY_ID_ORIGIN
@@ -0,0 +1,72 @@
+import pytest
+from pandapower import runpp
+
+import solver
+from benchmarks.grids import create_radial_network
+from core import to_components
+from solver.topology import agent_id
+from solver.trace_analysis import TraceRecord, load_trace
+
+
+def closed_switches(seed: int, routing: bool) -> list[int]:
+    # failing line 0 disconnects the first subtree of the root, the reserve lines
+    # offer several ways back
+    net = create_radial_network(depth=3, branching=2, reserve_lines=4, seed=seed)
+    net.line.loc[0, "in_service"] = False
+    runpp(net)
+    switches, bus_measurements = to_components(net)
+    solver.solve(switches, bus_measurements, net, routing=routing, transport="local")
+    return list(net.switch.index[net.switch.closed.astype(bool)])
+
+
+def trace_failure(path: str, **kwargs) -> tuple[set[str], list[TraceRecord]]:
+    """
+    Solve the failure of line 0 of a radial grid with 121 busses.
+
+    :return: agents of the disconnected busses and the trace of the solve
+    """
+    net = create_radial_network(depth=4, branching=3)
+    net.line.loc[0, "in_service"] = False
+    runpp(net)
+    disconnected = {
+        agent_id(("bus", int(bus))) for bus in net.bus.index[net.res_bus.vm_pu.isna()]
+    }
+    switches, bus_measurements = to_components(net)
+    solver.solve(
+        switches, bus_measurements, net, transport="local", trace=path, **kwargs
+    )
+    return disconnected, load_trace([path])
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_routing_matches_flooding(seed: int):
+    closed = closed_switches(seed, routing=False)
+    assert closed
+    assert closed_switches(seed, routing=True) == closed
+
+
+def test_routing_sends_fewer_messages(tmp_path):
+    _, flooding = trace_failure(str(tmp_path / "flooding.jsonl"))
+    disconnected, routing = trace_failure(str(tmp_path / "routing.jsonl"), routing=True)
+    assert len(routing) < len(flooding) / 2
+
+    # the waves detecting settled routes never pass a connected bus
+    probes = [record for record in routing if record.type == "QuiescenceProbe"]
+    assert probes
+    senders = {record.sender for record in probes}
+    assert all(
+        sender in disconnected or sender.startswith("switch-") for sender in senders
+    )
+
+
+def test_election_sends_fewer_messages(tmp_path):
+    _, flooding = trace_failure(str(tmp_path / "flooding.jsonl"))
+    disconnected, election = trace_failure(
+        str(tmp_path / "election.jsonl"), election=True
+    )
+    assert len(election) < len(flooding) / 2
+
+    # the waves detecting the end of the election stay within the island
+    probes = [record for record in election if record.type == "QuiescenceProbe"]
+    assert probes
+    assert {record.sender for record in probes} <= disconnected
@@ -0,0 +1,42 @@
+import asyncio
+import contextlib
+import io
+
+from benchmarks.grids import create_radial_network
+from solver.service import ServiceEvent, SolverService
+
+
+def test_failures_and_restorations():
+    # bus 0 feeds bus 1 to 3, busses 2 and 3 are joined by the reserve line 3
+    net = create_radial_network(depth=1, branching=3, reserve_lines=1)
+
+    async def run() -> list[tuple[ServiceEvent, bool]]:
+        async with SolverService(net, transport="local") as service:
+            assert service.connected
+            agents = dict(service.agents)
+            events = []
+            for event, line in [
+                (service.fail_line, 1),
+                (service.restore_line, 1),
+                (service.fail_line, 2),
+                (service.fail_line, 0),
+                (service.restore_line, 2),
+                (service.restore_line, 0),
+            ]:
+                events.append((await event(line), service.connected))
+            # the agents of the first event are still registered
+            assert all(service.agents[aid] is agent for aid, agent in agents.items())
+            return events
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        events = asyncio.run(run())
+    assert events == [
+        (ServiceEvent(line=1, closed=(0,), opened=()), True),
+        (ServiceEvent(line=1, closed=(), opened=(0,)), True),
+        (ServiceEvent(line=2, closed=(0,), opened=()), True),
+        # nothing reconnects bus 1
+        (ServiceEvent(line=0, closed=(), opened=()), False),
+        (ServiceEvent(line=2, closed=(), opened=(0,)), False),
+        (ServiceEvent(line=0, closed=(), opened=()), True),
+    ]
+    assert not net.switch.closed.any()
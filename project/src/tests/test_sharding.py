@@ -0,0 +1,88 @@
+import copy
+import multiprocessing
+import sys
+
+import networkx as nx
+import pandapower as pp
+import pytest
+
+import solver
+from benchmarks.contingency import TEST_GRID, create_grid
+from core import to_components
+from solver import collect_shard_reports
+from solver.sharding import partition_topology, shard_address
+
+
+@pytest.fixture(scope="module")
+def test_grid() -> pp.pandapowerNet:
+    return create_grid(TEST_GRID)
+
+
+def test_partition_covers_all_nodes():
+    topology = nx.grid_2d_graph(6, 6)
+    parts = partition_topology(topology, 3)
+
+    assert len(parts) == 3
+    assert set().union(*parts) == set(topology.nodes)
+    assert sum(len(part) for part in parts) == topology.number_of_nodes()
+
+
+def test_partition_balanced():
+    topology = nx.grid_2d_graph(6, 6)
+    for shards in [2, 3, 4]:
+        sizes = [len(part) for part in partition_topology(topology, shards)]
+        assert sizes == [36 // shards] * shards
+
+
+def test_partition_cuts_few_edges():
+    # two dense clusters connected by a single edge should be split at that edge
+    topology = nx.union(nx.complete_graph(range(8)), nx.complete_graph(range(8, 16)))
+    topology.add_edge(0, 8)
+    left, right = partition_topology(topology, 2)
+
+    assert {frozenset(left), frozenset(right)} == {
+        frozenset(range(8)),
+        frozenset(range(8, 16)),
+    }
+
+
+def test_partition_small_topology():
+    topology = nx.path_graph(2)
+    assert len(partition_topology(topology, 1)) == 1
+    assert len(partition_topology(topology, 4)) == 2
+
+
+def test_shard_address():
+    assert shard_address(("localhost", 5555), 0) == ("localhost", 5555)
+    assert shard_address(("localhost", 5555), 3) == ("localhost", 5558)
+
+
+@pytest.mark.parametrize("line", [3, 6, 24])
+def test_sharded_solve(test_grid: pp.pandapowerNet, line: int):
+    closed = {}
+    for shards in [1, 3]:
+        net = copy.deepcopy(test_grid)
+        net.line.loc[line, "in_service"] = False
+        pp.runpp(net)
+        switches, bus_measurements = to_components(net)
+        solver.solve(
+            switches,
+            bus_measurements,
+            net,
+            shards=shards,
+            transport="tcp",
+            address=("localhost", 5655),
+        )
+        closed[shards] = set(net.switch.index[net.switch.closed.astype(bool)])
+
+    assert closed[3] == closed[1]
+    assert closed[1] > set(test_grid.switch.index[test_grid.switch.closed.astype(bool)])
+
+
+def test_failed_shard_process():
+    context = multiprocessing.get_context("fork")
+    process = context.Process(target=sys.exit, args=(1,))
+    process.start()
+    with pytest.raises(RuntimeError, match="exit codes"):
+        collect_shard_reports([process], context.Queue(), timeout=10)
+    process.join()
@@ -0,0 +1,68 @@
+from copy import deepcopy
+
+from solver.ids import SwitchId
+from solver.switch_set import SwitchSet, minimal_options
+
+
+def test_of():
+    sids = [SwitchId(0), SwitchId(3), SwitchId(5)]
+    switch_set = SwitchSet.of(sids)
+    assert switch_set.mask == 0b101001
+    assert len(switch_set) == 3
+    assert list(switch_set) == sids
+
+
+def test_with_switch():
+    empty = SwitchSet()
+    assert not empty
+
+    switch_set = empty.with_switch(SwitchId(2))
+    assert not empty
+    assert switch_set
+    assert SwitchId(2) in switch_set
+    assert SwitchId(1) not in switch_set
+
+
+def test_merge_and_subset():
+    left = SwitchSet.of([SwitchId(0), SwitchId(1)])
+    right = SwitchSet.of([SwitchId(1), SwitchId(4)])
+    merged = left | right
+
+    assert list(merged) == [SwitchId(0), SwitchId(1), SwitchId(4)]
+    assert left.issubset(merged)
+    assert right.issubset(merged)
+    assert not merged.issubset(left)
+
+
+def test_sort_key():
+    short = SwitchSet.of([SwitchId(7)])
+    long = SwitchSet.of([SwitchId(0), SwitchId(1)])
+    assert short.sort_key < long.sort_key
+    assert min([long, short], key=lambda s: s.sort_key) == short
+
+
+def test_hash_and_copy():
+    switch_set = SwitchSet.of([SwitchId(1), SwitchId(2)])
+    assert deepcopy(switch_set) == switch_set
+    assert len({switch_set, SwitchSet(0b110), deepcopy(switch_set)}) == 1
+
+
+def test_minimal_options():
+    a = SwitchSet.of([SwitchId(0)])
+    b = SwitchSet.of([SwitchId(1)])
+    ab = SwitchSet.of([SwitchId(0), SwitchId(1)])
+    bc = SwitchSet.of([SwitchId(1), SwitchId(2)])
+    cd = SwitchSet.of([SwitchId(2), SwitchId(3)])
+
+    assert minimal_options([]) == set()
+    assert minimal_options([ab, a, bc, cd]) == {a, bc, cd}
+    assert minimal_options([ab, a, b, bc, cd]) == {a, b, cd}
+    assert minimal_options([ab, a, b, bc, cd], limit=1) == {a}
+    assert minimal_options([ab, cd, bc], limit=2) == {ab, bc}
+
+    # a worse ranked subset does not dominate its supersets
+    def key(option: SwitchSet) -> tuple[bool, tuple[int, int]]:
+        return option == a, option.sort_key
+
+    assert minimal_options([ab, a], key=key) == {ab, a}
+    assert minimal_options([ab, a], limit=1, key=key) == {ab}
@@ -0,0 +1,79 @@
+from pandapower import topology
+
+from core import to_components
+from solver.topology import agent_id, build_topology, cached_topology
+from template import create_simple_network
+
+
+def test_build_topology():
+    net = create_simple_network()
+    net.res_bus["vm_pu"] = 1.0
+    switches, bus_measurements = to_components(net)
+
+    communication_topology = build_topology(net)
+    assert communication_topology.nodes == [
+        ("bus", 0),
+        ("bus", 1),
+        ("bus", 2),
+        ("bus", 3),
+        ("bus", 4),
+        ("bus", 5),
+        ("switch", 1),
+        ("switch", 2),
+        ("switch", 4),
+    ]
+    assert list(communication_topology.switch_components) == [0, 1, 2]
+
+    graph = communication_topology.to_networkx(bus_measurements, switches)
+    assert {frozenset(edge) for edge in graph.edges} == {
+        frozenset(edge)
+        for edge in [
+            (("bus", 0), ("bus", 1)),
+            (("bus", 1), ("bus", 2)),
+            (("bus", 2), ("switch", 1)),
+            (("switch", 1), ("bus", 3)),
+            (("bus", 3), ("switch", 2)),
+            (("switch", 2), ("bus", 4)),
+            (("bus", 4), ("switch", 4)),
+            (("switch", 4), ("bus", 5)),
+        ]
+    }
+    assert graph.nodes["bus", 3]["bus_measurement"] is bus_measurements[3]
+    assert graph.nodes["switch", 2]["switch"] is switches[1]
+
+
+def test_build_topology_matches_pandapower():
+    # switch edges are the edges only present if switches are ignored
+    net = create_simple_network()
+    net.res_bus["vm_pu"] = 1.0
+    switches, bus_measurements = to_components(net)
+    open_network = topology.create_nxgraph(net)
+    closed_network = topology.create_nxgraph(net, respect_switches=False)
+    switch_lines = {key[1] for _, _, key in closed_network.edges - open_network.edges}
+
+    communication_topology = build_topology(net)
+    assert set(communication_topology.switches) == switch_lines
+    graph = communication_topology.to_networkx(bus_measurements, switches)
+    bus_edges = {
+        frozenset((u, v))
+        for u, v in graph.edges
+        if u[0] == v[0] == "bus"
+    }
+    assert bus_edges == {
+        frozenset((("bus", u), ("bus", v))) for u, v in open_network.edges()
+    }
+
+
+def test_agent_id():
+    assert agent_id(("switch", 3)) == "switch-3-agent"
+
+
+def test_cached_topology():
+    net = create_simple_network()
+    communication_topology = cached_topology(net)
+    assert cached_topology(net) is communication_topology
+
+    net.switch.loc[0, "closed"] = True
+    switched_topology = cached_topology(net)
+    assert switched_topology is not communication_topology
+    assert len(switched_topology.switches) == len(communication_topology.switches) - 1
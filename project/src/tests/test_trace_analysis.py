@@ -0,0 +1,40 @@
+from solver.trace_analysis import TraceRecord, analyze_waves, bytes_per_type
+
+REQUEST = "ReachConnectionRequest"
+RESPONSE = "ReachConnectionResponse"
+
+
+def record(id, parent, time, sender, receiver, type=REQUEST, mid="message-0"):
+    return TraceRecord(id, parent, time, sender, receiver, type, mid, 100)
+
+
+def test_analyze_wave():
+    # a floods b and c, both forward to d, d answers both, b and c answer a
+    records = [
+        record(0, None, 0.0, "a", "b"),
+        record(1, None, 0.0, "a", "c"),
+        record(2, 0, 1.0, "b", "d"),
+        record(3, 1, 1.5, "c", "d"),
+        record(4, 2, 2.0, "d", "b", RESPONSE),
+        record(5, 3, 2.5, "d", "c", RESPONSE),
+        record(6, 4, 3.0, "b", "a", RESPONSE),
+        record(7, 5, 4.0, "c", "a", RESPONSE),
+        record(8, 7, 4.5, "a", "b", "SwitchRequest", mid="message-1"),
+    ]
+
+    [report] = analyze_waves(records)
+    assert report.mid == "message-0"
+    assert report.initiator == "a"
+    assert report.messages == 8
+    assert report.depth == 2
+    assert report.max_fan_out == 2
+    assert report.duplicates == 1
+    assert sorted(report.hop_latencies) == [1.0, 1.0, 1.0, 1.0, 1.5, 1.5]
+    assert [r.id for r in report.critical_path] == [1, 3, 5, 7]
+    assert report.duration == 4.0
+
+    assert bytes_per_type(records) == {
+        REQUEST: (4, 400),
+        RESPONSE: (4, 400),
+        "SwitchRequest": (1, 100),
+    }
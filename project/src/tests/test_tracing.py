@@ -0,0 +1,84 @@
+import json
+
+from solver.ids import MessageId, SwitchId
+from solver.messages import SwitchRequest
+from solver.tracing import MessageTracer, shard_trace_path, trace_cause
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_trace(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    request = SwitchRequest(mid=MessageId(), sid=SwitchId(0))
+
+    with MessageTracer(path, payload=True) as tracer:
+        tracer.record("bus-0-agent", "switch-0-agent", request)
+        tracer.record("switch-0-agent", "bus-1-agent", request)
+
+    records = read_records(path)
+    assert [record["sender"] for record in records] == [
+        "bus-0-agent",
+        "switch-0-agent",
+    ]
+    assert all(record["type"] == "SwitchRequest" for record in records)
+    assert all(record["mid"] == str(request.mid) for record in records)
+    assert records[0]["message"] == repr(request)
+
+
+def test_toggle_and_sampling(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    requests = [SwitchRequest(mid=MessageId(), sid=SwitchId(0)) for _ in range(1000)]
+
+    with MessageTracer(path, enabled=False) as tracer:
+        tracer.record("a", "b", requests[0])
+        tracer.enabled = True
+        tracer.record("a", "b", requests[0])
+        tracer.sample_rate = 0.25
+        for request in requests:
+            tracer.record("a", "b", request)
+            # sampling is decided by message id
+            tracer.record("b", "c", request)
+
+    records = read_records(path)
+    sampled = len(records) - 1
+    assert sampled % 2 == 0
+    assert 150 * 2 < sampled < 350 * 2
+
+
+def test_bounded_buffer(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    request = SwitchRequest(mid=MessageId(), sid=SwitchId(0))
+
+    # writer is not started, so nothing is flushed
+    tracer = MessageTracer(path, capacity=3)
+    for _ in range(5):
+        tracer.record("a", "b", request)
+    assert tracer.dropped == 2
+
+    with tracer:
+        pass
+    assert len(read_records(path)) == 3
+
+
+def test_shard_trace_path():
+    assert shard_trace_path("transfers.jsonl", 2) == "transfers-2.jsonl"
+
+
+def test_causal_links(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    request = SwitchRequest(mid=MessageId(), sid=SwitchId(0))
+
+    with MessageTracer(path, origin=1) as tracer:
+        root = tracer.record("a", "b", request)
+        token = trace_cause.set(root)
+        child = tracer.record("b", "c", request)
+        trace_cause.reset(token)
+
+    records = read_records(path)
+    assert root == 1 << 32
+    assert [record["id"] for record in records] == [root, child]
+    assert [record["parent"] for record in records] == [None, root]
+    assert all(record["bytes"] > 0 for record in records)
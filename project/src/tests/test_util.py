@@ -1,7 +1,8 @@
 import asyncio
 
 import pytest
-from solver.util import ZeroBarrier
+
+from solver.util import RttEstimator, ZeroBarrier
 
 
 @pytest.mark.asyncio
@@ -65,3 +66,23 @@ async def test_concurrent_waiters():
     await asyncio.gather(*tasks)
     assert len(results) == 3
     assert sorted(results) == [0, 1, 2]
+
+
+def test_rtt_estimator():
+    estimator = RttEstimator(initial=10, minimum=0.1, maximum=10)
+
+    # no samples yet
+    assert estimator.timeout == 10
+
+    # first sample initializes the variation with half the round trip time
+    estimator.sample(1)
+    assert estimator.timeout == 1 + 4 * 0.5
+
+    # stable round trip times shrink the timeout down to the minimum
+    for _ in range(100):
+        estimator.sample(0.01)
+    assert estimator.timeout == 0.1
+
+    # outliers raise the timeout but never above the maximum
+    estimator.sample(100)
+    assert estimator.timeout == 10
@@ -0,0 +1,121 @@
+import asyncio
+
+import mango
+from pandapower import runpp
+
+import solver
+from core import evaluate, reset_switch_count, to_components
+from solver import ADDRESS
+from solver.agents import VERIFY_RETRIES, BusAgent
+from solver.container import LocalContainer
+from solver.ids import BusId, MessageId
+from solver.measurements import ConnectivitySnapshot
+from solver.messages import ReachConnectionRequest
+from solver.switch_set import SwitchSet
+from solver.verification import PowerFlowVerifier
+from template import create_simple_network
+
+
+def test_batched_verification():
+    # busses 3 and 4 are reconnected by closing the switches of line 2 and 3
+    net = create_simple_network()
+    runpp(net)
+    switches, _ = to_components(net)
+    snapshot = ConnectivitySnapshot(net)
+    measurements = snapshot.measurements()
+    assert not measurements[3].connected
+
+    verifier = PowerFlowVerifier(net, snapshot, window=0.01)
+    agent = BusAgent(neighbors=set(), bus=measurements[3], bid=BusId())
+    verifier.agents = [agent]
+    first, second, _ = verifier.wrap(switches)
+
+    async def switch():
+        first.switch(True)
+        second.switch(True)
+        await verifier.flush()
+
+    asyncio.run(switch())
+    assert first.is_switched()
+    assert verifier.batches == 1
+    assert verifier.switched == 2
+    assert snapshot.epoch == 1
+    assert measurements[3].connected
+    assert agent.resolved.is_set()
+
+
+def test_retry_after_failed_verification():
+    net = create_simple_network()
+    runpp(net)
+    snapshot = ConnectivitySnapshot(net)
+    agent = BusAgent(neighbors=set(), bus=snapshot.measurements()[5], bid=BusId())
+    agent.switched_option = True
+    agent.resolved.set()
+
+    async def verify():
+        container = LocalContainer(ADDRESS)
+        container.register(agent, "bus-5-agent")
+        async with mango.activate(container):
+            agent.verify_connection()
+            assert not agent.resolved.is_set()
+            # no neighbors, so searching again finds nothing
+            await agent.resolved.wait()
+
+    asyncio.run(verify())
+    assert agent.retries == 0
+    assert not agent.switched_option
+
+
+def test_retry_after_switching_elsewhere():
+    net = create_simple_network()
+    runpp(net)
+    snapshot = ConnectivitySnapshot(net)
+    agent = BusAgent(neighbors=set(), bus=snapshot.measurements()[5], bid=BusId())
+    agent.found_no_option = True
+    agent.resolved.set()
+
+    async def verify():
+        container = LocalContainer(ADDRESS)
+        container.register(agent, "bus-5-agent")
+        async with mango.activate(container):
+            agent.verify_connection()
+            assert not agent.resolved.is_set()
+            await agent.resolved.wait()
+
+    asyncio.run(verify())
+    # searching without switching elsewhere does not use up the retries
+    assert agent.retries == VERIFY_RETRIES
+    assert agent.found_no_option
+
+
+def test_request_overtaken_by_power_flow():
+    net = create_simple_network()
+    runpp(net)
+    snapshot = ConnectivitySnapshot(net)
+    agent = BusAgent(neighbors=set(), bus=snapshot.measurements()[0], bid=BusId())
+    sent = []
+
+    async def send_message(message, target):
+        sent.append(message)
+
+    agent.send_message = send_message
+    # the request was sent across a line before a power flow connected both busses
+    request = ReachConnectionRequest(
+        mid=MessageId(), bridged=False, switches=SwitchSet()
+    )
+    sender = mango.AgentAddress(ADDRESS, "bus-1-agent")
+    meta = {"sender_addr": sender.protocol_addr, "sender_id": sender.aid}
+    asyncio.run(agent.handle_reach_connection_request(request, meta))
+
+    (response,) = sent
+    assert not response.reached
+
+
+def test_nested_islands(nested_islands):
+    net = nested_islands
+    switches, bus_measurements = to_components(net)
+
+    # bus 3 only finds an option once the power flow confirmed busses 1 and 4
+    reset_switch_count()
+    solver.solve(switches, bus_measurements, net, verify=True, transport="local")
+    assert evaluate(net) == (2, True)